@@ -0,0 +1,49 @@
+"""Benchmarks for LadderBacktest
+
+Run from the repository root:
+
+    python -m benchmarks.bench_backtest --n 525600
+"""
+import argparse
+import numpy as np
+from quantstools.order import Symbol, OrderManager
+from quantstools.backtest import LadderBacktest
+from benchmarks.bench_order_history_collection import timeit
+
+
+def build_minute_bars(n: int, seed: int = 0) -> tuple:
+    """Returns (mili_unixtimes, closes, lows, highs) of a random walk of minute bars"""
+    rng = np.random.default_rng(seed)
+    closes = 40000 * np.exp(np.cumsum(rng.normal(0, 0.0008, n)))
+    lows = closes * (1 - np.abs(rng.normal(0, 0.0005, n)))
+    highs = closes * (1 + np.abs(rng.normal(0, 0.0005, n)))
+    mili_unixtimes = 1650000000000 + 60 * 1000 * np.arange(n, dtype=np.int64)
+    return mili_unixtimes, closes, lows, highs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n', type=int, default=365 * 24 * 60)
+    parser.add_argument('--n-orders', type=int, default=10)
+    args = parser.parse_args()
+    bars = build_minute_bars(args.n)
+    symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+
+    def run():
+        backtest = LadderBacktest(
+            OrderManager(symbol, 12, 6),
+            0.001,
+            n_orders=args.n_orders,
+            price_decrement_rate=0.005,
+            take_profit_rate=0.005,
+            requote_rate=0.01,
+            fee=0.001,
+            )
+        return backtest.run(*bars)
+
+    timeit(f"LadderBacktest.run() {args.n} bars", run)
+    print(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Benchmarks for OrderHistoryCollection.deserialize_parallel
+
+Every path is timed with N workers against 1 worker (the same chunks built
+in the calling process), so the speed-up printed is the one of the
+parallelism only:
+
+- columnar: the chunks are built by the workers and only merged in the
+  calling process, so this path scales with the number of workers;
+- objects (the default `columnar=False`): the OrderHistory objects are
+  still created one by one in the calling process after the merge, which
+  dominates the time, so this path does not scale.
+
+`deserialize()` is timed once as a reference.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_deserialize_parallel --n 1000000 --workers 2 4 8
+"""
+import os
+import argparse
+import time
+from benchmarks.bench_order_history_collection import build_collection, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n', type=int, default=10**6)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--workers', type=int, nargs='+', default=None)
+    args = parser.parse_args()
+    workers = [w for w in (args.workers or sorted({2, 4, os.cpu_count() or 1})) if w > 1]
+    start = time.perf_counter()
+    ohc = build_collection(args.n)
+    serialized_data = ohc.serialize()
+    print(f"built {len(ohc)} order histories in {time.perf_counter() - start:.2f} s")
+    timeit("deserialize() (reference)", lambda: ohc.deserialize(serialized_data), repeat=1)
+    for label, columnar in [('columnar', True), ('objects', False)]:
+
+        def run(n_workers):
+            return ohc.deserialize_parallel(
+                serialized_data,
+                max_workers=n_workers,
+                chunk_size=args.chunk_size,
+                columnar=columnar,
+                )
+
+        single = timeit(f"deserialize_parallel({label}) x1", lambda: run(1), repeat=1)
+        for n_workers in workers:
+            best = timeit(f"deserialize_parallel({label}) x{n_workers}", lambda: run(n_workers), repeat=1)
+            print(f"speed-up of x{n_workers} over x1".ljust(40) + f" | {single / best:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
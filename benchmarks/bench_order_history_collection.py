@@ -0,0 +1,138 @@
+"""Benchmarks for OrderHistoryCollection
+
+Run from the repository root:
+
+    python -m benchmarks.bench_order_history_collection --n 1000000
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+    CumulativeSortedIndex,
+)
+
+
+def build_collection(n: int) -> OrderHistoryCollection:
+    symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+    ohc = OrderHistoryCollection(symbol)
+    for i in range(n):
+        ohc.add_order_history(
+            OrderHistory(
+                id_=str(i),
+                symbol=symbol,
+                side='BUY' if i % 3 else 'SELL',
+                price=Price(20000 + (i % 1000), symbol.digits, symbol.precision),
+                amount=Amount(0.001 * (1 + i % 7), symbol.amount_digits, symbol.amount_precision),
+                mili_unixtime=1650000000000 + i,
+                is_active=False,
+                is_cancelled=False,
+            )
+        )
+    return ohc
+
+
+def timeit(label: str, func, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label}".ljust(40) + f" | {best:.4f} s")
+    return best
+
+
+def bench_get_total_value(ohc: OrderHistoryCollection) -> None:
+    timeit("get_total_value()", ohc.get_total_value)
+
+
+def bench_as_of_total_profit(ohc: OrderHistoryCollection, n_queries: int = 1440) -> None:
+    first = min(o.mili_unixtime for o in ohc.done_orders)
+    last = max(o.mili_unixtime for o in ohc.done_orders)
+    step = max(1, (last - first) // n_queries)
+    times = range(first, last + 1, step)
+
+    def run():
+        for t in times:
+            ohc.get_total_profit(sell_price=20000.0, mili_unixtime_lte=t)
+
+    timeit(f"get_total_profit() as-of x{len(times)}", run)
+
+
+def bench_upsert_poll(ohc: OrderHistoryCollection, n_rows: int = 10000, changed_ratio: float = 0.05) -> None:
+    """A poll of the newest `n_rows` orders where `changed_ratio` of them changed"""
+    orders = ohc.after(1650000000000 + len(ohc) - n_rows - 1).to_list()
+    n_changed = int(n_rows * changed_ratio)
+    rows = [
+        {'id_': o.id_, 'is_active': i < n_changed, 'is_cancelled': False}
+        for i, o in enumerate(orders)
+    ]
+    reset_rows = [dict(row, is_active=False) for row in rows[:n_changed]]
+
+    def run():
+        ohc.upsert_rows(rows, None)
+        ohc.upsert_rows(reset_rows, None)
+
+    timeit(f"upsert_rows() x{len(rows)} ({changed_ratio:.0%} changed)", run)
+
+
+def bench_to_bars(ohc: OrderHistoryCollection) -> None:
+    timeit("to_bars(interval_ms=60000)", lambda: ohc.to_bars(interval_ms=60 * 1000))
+    timeit("to_bars(tz='America/Montreal')", lambda: ohc.to_bars(tz='America/Montreal'))
+
+
+def bench_insert_scaling(sizes=(50000, 200000, 800000), n_inserts: int = 20000) -> None:
+    """Times inserts into a CumulativeSortedIndex of growing sizes.
+
+    An insert in key order should cost the same at every size; an insert
+    out of order also shifts the end of the sorted lists of keys and orders.
+    """
+    measures = {
+        'value': lambda o: o.value,
+        'amount': lambda o: o.amount,
+        'position': lambda o: o.position,
+    }
+
+    def make_order(mili_unixtime):
+        return SimpleNamespace(mili_unixtime=mili_unixtime, value=1.0, amount=1.0, position=1.0)
+
+    rng = random.Random(0)
+    for n in sizes:
+        for label, get_key in [
+            ('in order', lambda i: n + i),
+            ('out of order', lambda i: rng.randrange(n)),
+        ]:
+            index = CumulativeSortedIndex(measures)
+            index.extend(make_order(i) for i in range(n))
+            orders = [make_order(get_key(i)) for i in range(n_inserts)]
+            start = time.perf_counter()
+            for order in orders:
+                index.insert(order)
+            elapsed = time.perf_counter() - start
+            print(
+                f"insert {label} at n={n}".ljust(40)
+                + f" | {elapsed / n_inserts * 1e6:.2f} us per insert"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n', type=int, default=10**6)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    ohc = build_collection(args.n)
+    print(f"built {len(ohc)} order histories in {time.perf_counter() - start:.2f} s")
+    bench_get_total_value(ohc)
+    bench_as_of_total_profit(ohc)
+    bench_upsert_poll(ohc)
+    bench_to_bars(ohc)
+    bench_insert_scaling()
+
+
+if __name__ == '__main__':
+    main()
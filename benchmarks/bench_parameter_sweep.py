@@ -0,0 +1,53 @@
+"""Benchmarks for run_parameter_sweep
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parameter_sweep --n 525600 --workers 1 2 4 8
+"""
+import os
+import argparse
+from quantstools.order import Symbol
+from quantstools.backtest import run_parameter_sweep
+from benchmarks.bench_order_history_collection import timeit
+from benchmarks.bench_backtest import build_minute_bars
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n', type=int, default=365 * 24 * 60)
+    parser.add_argument('--workers', type=int, nargs='+', default=None)
+    args = parser.parse_args()
+    workers = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    mili_unixtimes, closes, lows, highs = build_minute_bars(args.n)
+    symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+    param_grid = {
+        'n_orders': [5, 10, 20],
+        'price_decrement_rate': [0.003, 0.005, 0.01],
+        'amount_increment_rate': [0.0, 0.04],
+        'take_profit_rate': [0.005, 0.01],
+    }
+    n_backtests = 1
+    for values in param_grid.values():
+        n_backtests *= len(values)
+    for n_workers in workers:
+        timeit(
+            f"{n_backtests} backtests x{n_workers}",
+            lambda: run_parameter_sweep(
+                symbol,
+                12,
+                6,
+                mili_unixtimes,
+                closes,
+                param_grid,
+                lows=lows,
+                highs=highs,
+                max_workers=n_workers,
+                min_amount=0.001,
+                requote_rate=0.01,
+                ),
+            repeat=1,
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+from .engine import find_first_crossing, LadderBacktest
+from .sweep import run_parameter_sweep
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""A module to backtest OrderManager ladders against price series
+"""
+import numpy as np
+from ..order.order_manager import OrderManager
+from ..order.order import Order
+from ..order.order_history import OrderHistory
+from ..order.lot_matcher import LotMatcher
+from ..order.price import Price
+from ..order.amount import Amount
+
+# number of bars scanned by the first window of `find_first_crossing`
+FIRST_WINDOW = 1024
+REPORT_FIELDS = [
+    'realized_pnl',
+    'unrealized_pnl',
+    'fees',
+    'total_pnl',
+    'position',
+    'max_position',
+    'n_fills',
+    'n_cycles',
+    'n_ladders',
+    ]
+
+
+def find_first_crossing(values, threshold: float, start: int = 0, below: bool = True) -> int:
+    """Returns the index of the first value at or beyond a threshold.
+
+    The values are scanned from `start` with numpy in windows which double
+    in size, so a crossing close to `start` costs little and a far one costs
+    O(distance).
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+    threshold : float
+    start : int
+        Default value is 0.
+    below : bool
+        Default value is True.
+        If True the first value `<= threshold` is looked for, otherwise the
+        first value `>= threshold`.
+
+    Returns
+    -------
+        : int
+        The index of the crossing, or `len(values)` if there is none.
+    """
+    n = len(values)
+    window = FIRST_WINDOW
+    while start < n:
+        stop = min(n, start + window)
+        chunk = values[start:stop]
+        hits = chunk <= threshold if below else chunk >= threshold
+        i = int(hits.argmax())
+        if hits[i]:
+            return start + i
+        start = stop
+        window *= 2
+    return n
+
+
+class LadderBacktest:
+
+    """Class to replay a price series against buy ladders of an OrderManager.
+
+    A cycle places a ladder of `OrderManager.generate_buy_limit_orders_triangle`
+    below the close of a bar, starting one `price_decrement_rate` below it.
+    From the next bar on, a buy order fills at its price on the first bar
+    whose low reaches it (all the orders reached by the same bar fill
+    together). Once the ladder has fills, the whole position is sold at
+    `take_profit_rate` above its average price on the first later bar whose
+    high reaches that price, which ends the cycle; the next ladder is then
+    placed below the close of that bar. When `requote_rate` is given, a
+    ladder without fills is also replaced once the high rises
+    `requote_rate` above the close it was placed at.
+
+    The bars are only looked at around the events (fills and re-quotes),
+    each time with a vectorized search, so a year of minute bars takes a
+    few seconds.
+
+    The fills are added as done OrderHistory objects, with the times of
+    their bars, to the OrderHistoryCollection of the OrderManager.
+
+    Example
+    -------
+    >>> backtest = LadderBacktest(manager, min_amount=0.001, n_orders=10)
+    >>> report = backtest.run(mili_unixtimes, closes, lows=lows, highs=highs)
+    >>> report['total_pnl']
+
+    """
+
+    def __init__(
+        self,
+        order_manager: OrderManager,
+        min_amount: float,
+        n_orders: int = 10,
+        price_decrement_rate: float = 0.01,
+        amount_increment_rate: float = 0.04,
+        take_profit_rate: float = 0.01,
+        requote_rate: float = None,
+        fee: float = 0.0,
+        ):
+        """
+        Parameters
+        ----------
+        order_manager : OrderManager
+        min_amount : float
+            Amount of the first order of the ladders.
+        n_orders : int
+            Default value is 10.
+        price_decrement_rate : float
+            Default value is 0.01.
+        amount_increment_rate : float
+            Default value is 0.04.
+        take_profit_rate : float
+            Default value is 0.01.
+        requote_rate : float
+            Default value is None.
+        fee : float
+            Default value is 0.0.
+            Fee rate paid on the notional value of every fill.
+        """
+        if not isinstance(order_manager, OrderManager):
+            raise TypeError(
+                "Expected order_manager of type 'OrderManager' "
+                f"but got of type '{order_manager.__class__.__name__}'"
+                )
+        if type(n_orders) != int or n_orders <= 0:
+            raise ValueError(f"Expected n_orders to be a positive int but got '{n_orders}'")
+        if take_profit_rate <= 0:
+            raise ValueError(f"Expected take_profit_rate to be positive but got '{take_profit_rate}'")
+        if requote_rate is not None and requote_rate <= 0:
+            raise ValueError(f"Expected requote_rate to be None or positive but got '{requote_rate}'")
+        self._order_manager = order_manager
+        self._min_amount = min_amount
+        self._n_orders = n_orders
+        self._price_decrement_rate = price_decrement_rate
+        self._amount_increment_rate = amount_increment_rate
+        self._take_profit_rate = take_profit_rate
+        self._requote_rate = requote_rate
+        self._fee = fee
+
+    @property
+    def order_manager(self) -> OrderManager:
+        return self._order_manager
+
+    def _generate_ladder(self, price: float) -> list:
+        return self._order_manager.generate_buy_limit_orders_triangle(
+            max_price=price * (1 - self._price_decrement_rate),
+            min_amount=self._min_amount,
+            n_orders=self._n_orders,
+            price_decrement_rate=self._price_decrement_rate,
+            amount_increment_rate=self._amount_increment_rate,
+            ).orders
+
+    def run(
+        self,
+        mili_unixtimes,
+        prices,
+        lows=None,
+        highs=None,
+        id_prefix: str = 'backtest',
+        ) -> dict:
+        """Replays a price series.
+
+        Parameters
+        ----------
+        mili_unixtimes : array_like
+            The sorted times of the bars.
+        prices : array_like
+            The close prices of the bars.
+        lows : array_like
+            Default value is None.
+            The low prices of the bars; the close prices when None.
+        highs : array_like
+            Default value is None.
+            The high prices of the bars; the close prices when None.
+        id_prefix : str
+            Default value is 'backtest'.
+            The ids of the fills are `f'{id_prefix}-{i}'`.
+
+        Returns
+        -------
+            : dict
+            Dictionary with the keys of REPORT_FIELDS: 'realized_pnl',
+            'unrealized_pnl' (at the last close), 'fees', 'total_pnl' (net of
+            fees), 'position', 'max_position', 'n_fills', 'n_cycles'
+            (completed take-profits) and 'n_ladders'.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when the arrays are not of the same length.
+        """
+        times = np.asarray(mili_unixtimes, dtype=np.int64)
+        closes = np.asarray(prices, dtype=float)
+        lows = closes if lows is None else np.asarray(lows, dtype=float)
+        highs = closes if highs is None else np.asarray(highs, dtype=float)
+        n = len(closes)
+        if not len(times) == len(lows) == len(highs) == n:
+            raise ValueError("Expected mili_unixtimes, prices, lows and highs of the same length")
+        manager = self._order_manager
+        symbol = manager.symbol
+        matcher = LotMatcher('AVG')
+        fills = []
+        fees = 0.0
+        max_position = 0.0
+        n_cycles = 0
+        n_ladders = 0
+
+        def add_fill(order, i):
+            nonlocal fees
+            fill = OrderHistory.from_order(
+                f'{id_prefix}-{len(fills)}',
+                order,
+                int(times[i]),
+                is_active=False,
+                is_cancelled=False,
+                )
+            fills.append(fill)
+            matcher.add_order(fill)
+            fees += self._fee * fill.price.number * fill.amount.number
+
+        t = 0
+        while t < n - 1:
+            ladder = self._generate_ladder(float(closes[t]))
+            n_ladders += 1
+            ladder_prices = np.array([order.price.number for order in ladder])
+            requote_price = np.inf
+            if self._requote_rate is not None:
+                requote_price = closes[t] * (1 + self._requote_rate)
+            n_filled = 0
+            position = 0.0
+            cost = 0.0
+            target = np.inf
+            t += 1
+            while t < n:
+                if n_filled == 0:
+                    exit_price = requote_price
+                else:
+                    exit_price = target
+                exit_i = n
+                if exit_price != np.inf:
+                    exit_i = find_first_crossing(highs, exit_price, start=t, below=False)
+                fill_i = n
+                if n_filled < len(ladder):
+                    fill_i = find_first_crossing(lows, ladder_prices[n_filled], start=t, below=True)
+                if exit_i < n and exit_i <= fill_i:
+                    if n_filled > 0:
+                        order = Order(
+                            symbol=symbol,
+                            side='SELL',
+                            price=Price(target, manager.digits, manager.precision),
+                            amount=Amount(position, manager.amount_digits, manager.amount_precision),
+                            type_='LIMIT',
+                            )
+                        add_fill(order, exit_i)
+                        n_cycles += 1
+                    t = exit_i
+                    break
+                if fill_i == n:
+                    t = n
+                    break
+                # the ladder prices are decreasing
+                last = int(np.searchsorted(-ladder_prices, -lows[fill_i], side='right'))
+                for order in ladder[n_filled:last]:
+                    add_fill(order, fill_i)
+                    position += order.amount.number
+                    cost += order.amount.number * order.price.number
+                n_filled = last
+                position = round(position, manager.amount_precision)
+                max_position = max(max_position, position)
+                target = round(cost / position * (1 + self._take_profit_rate), manager.precision)
+                t = fill_i + 1
+        manager.ohc.add_order_histories(fills)
+        last_price = float(closes[-1]) if n else 0.0
+        unrealized_pnl = matcher.get_unrealized_pnl(last_price)
+        return {
+            'realized_pnl': matcher.realized_pnl,
+            'unrealized_pnl': unrealized_pnl,
+            'fees': fees,
+            'total_pnl': matcher.realized_pnl + unrealized_pnl - fees,
+            'position': matcher.position,
+            'max_position': max_position,
+            'n_fills': len(fills),
+            'n_cycles': n_cycles,
+            'n_ladders': n_ladders,
+        }
@@ -0,0 +1,159 @@
+"""A module to sweep ladder parameters with parallel backtests
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from ..order.symbol import Symbol
+from ..order.order_manager import OrderManager
+from .engine import LadderBacktest, REPORT_FIELDS
+
+SWEEP_PARAMS = [
+    'min_amount',
+    'n_orders',
+    'price_decrement_rate',
+    'amount_increment_rate',
+    'take_profit_rate',
+    'requote_rate',
+    'fee',
+    ]
+# the bars shared with the workers: mili_unixtimes, closes, lows and highs
+N_SERIES = 4
+
+# state of a worker process, set by `_init_worker`
+_worker = {}
+
+
+def _get_series(buffer, n: int) -> tuple:
+    """Returns the numpy views of the bars stored in a buffer of 4 * n 8-byte items"""
+    times = np.ndarray((n,), dtype=np.int64, buffer=buffer)
+    closes, lows, highs = np.ndarray((3, n), dtype=float, buffer=buffer, offset=8 * n)
+    return times, closes, lows, highs
+
+
+def _init_worker(shm_name: str, n: int, symbol: Symbol, amount_digits: int, amount_precision: int) -> None:
+    shm = SharedMemory(name=shm_name)
+    # the shared memory must stay open while the views are used
+    _worker['shm'] = shm
+    _worker['series'] = _get_series(shm.buf, n)
+    _worker['manager_args'] = (symbol, amount_digits, amount_precision)
+
+
+def _run_backtests(series: tuple, manager_args: tuple, params_list: list) -> list:
+    reports = []
+    for params in params_list:
+        backtest = LadderBacktest(OrderManager(*manager_args), **params)
+        report = backtest.run(*series)
+        reports.append([report[field] for field in REPORT_FIELDS])
+    return reports
+
+
+def _run_worker_backtests(params_list: list) -> list:
+    return _run_backtests(_worker['series'], _worker['manager_args'], params_list)
+
+
+def run_parameter_sweep(
+    symbol: Symbol,
+    amount_digits: int,
+    amount_precision: int,
+    mili_unixtimes,
+    prices,
+    param_grid: dict,
+    lows=None,
+    highs=None,
+    max_workers: int = None,
+    chunk_size: int = 1,
+    **fixed_params,
+    ) -> dict:
+    """Backtests every combination of a grid of ladder parameters.
+
+    The combinations are run with `LadderBacktest` by a
+    ProcessPoolExecutor. The bars are copied once into a shared memory
+    block which the worker processes map when they start, so only the
+    parameters and the reports are pickled for every task.
+
+    Parameters
+    ----------
+    symbol : Symbol
+    amount_digits : int
+    amount_precision : int
+        The arguments of the OrderManager of every backtest.
+    mili_unixtimes : array_like
+    prices : array_like
+        The close prices of the bars.
+    param_grid : dict
+        Dictionary of parameter name (one of SWEEP_PARAMS) to the list of
+        values to sweep.
+    lows : array_like
+        Default value is None.
+    highs : array_like
+        Default value is None.
+    max_workers : int
+        Default value is None.
+        Number of processes; the default of ProcessPoolExecutor (the
+        number of CPUs) is used when None. With a single worker or a single
+        combination no process is started.
+    chunk_size : int
+        Default value is 1.
+        Number of combinations sent to a process at a time.
+    **fixed_params
+        The parameters of SWEEP_PARAMS which are the same for all the
+        backtests, e.g. `min_amount`.
+
+    Returns
+    -------
+        : dict
+        Columnar table of the results, with one numpy array per swept
+        parameter and per field of REPORT_FIELDS, in the order of
+        `itertools.product` over the values of `param_grid`.
+
+    Raises
+    ------
+    ValueError
+        Raises ValueError for a parameter which is not in SWEEP_PARAMS, is
+        both swept and fixed, or when the bars are not of the same length.
+    """
+    for name in itertools.chain(param_grid, fixed_params):
+        if name not in SWEEP_PARAMS:
+            raise ValueError(f"Expected parameters in {SWEEP_PARAMS} but got '{name}'")
+    if set(param_grid) & set(fixed_params):
+        raise ValueError("Expected a parameter to be either swept or fixed, not both")
+    assert type(chunk_size) == int and chunk_size > 0
+    times = np.asarray(mili_unixtimes, dtype=np.int64)
+    closes = np.asarray(prices, dtype=float)
+    lows = closes if lows is None else np.asarray(lows, dtype=float)
+    highs = closes if highs is None else np.asarray(highs, dtype=float)
+    n = len(closes)
+    if not len(times) == len(lows) == len(highs) == n:
+        raise ValueError("Expected mili_unixtimes, prices, lows and highs of the same length")
+    names = list(param_grid)
+    combinations = list(itertools.product(*[param_grid[name] for name in names]))
+    params_list = [dict(fixed_params, **dict(zip(names, values))) for values in combinations]
+    chunks = [params_list[i:i + chunk_size] for i in range(0, len(params_list), chunk_size)]
+    manager_args = (symbol, amount_digits, amount_precision)
+    if len(params_list) <= 1 or max_workers == 1:
+        rows = _run_backtests((times, closes, lows, highs), manager_args, params_list)
+    else:
+        shm = SharedMemory(create=True, size=max(1, N_SERIES * 8 * n))
+        try:
+            shared_times, shared_closes, shared_lows, shared_highs = _get_series(shm.buf, n)
+            shared_times[:] = times
+            shared_closes[:] = closes
+            shared_lows[:] = lows
+            shared_highs[:] = highs
+            del shared_times, shared_closes, shared_lows, shared_highs
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(shm.name, n) + manager_args,
+                ) as executor:
+                rows = list(itertools.chain.from_iterable(executor.map(_run_worker_backtests, chunks)))
+        finally:
+            shm.close()
+            shm.unlink()
+    table = {}
+    for i, name in enumerate(names):
+        table[name] = np.array([values[i] for values in combinations])
+    for i, field in enumerate(REPORT_FIELDS):
+        table[field] = np.array([row[i] for row in rows])
+    return table
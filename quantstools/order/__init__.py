@@ -5,5 +5,13 @@ from .price import Price
 from .order import Order
 from .order_history import OrderHistory
 from .order_collection import OrderCollection
+from .sorted_index import SortedIndex, SortedIndexView, CumulativeSortedIndex
+from .journal import OrderHistoryJournal
+from .columnar import ColumnarOrderHistory
+from .retention import RetentionPolicy
+from .lot_matcher import LotMatcher
+from .rolling import RollingWindowAggregator, RollingWindowMetrics
+from .risk import RiskLimits
 from .order_history_collection import OrderHistoryCollection
+from .sqlite_order_history_collection import SQLiteOrderHistoryCollection
 from .order_manager import OrderManager
\ No newline at end of file
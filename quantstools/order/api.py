@@ -54,6 +54,21 @@ class OrderAPI:
             logging.error(f"Could not delete order with id ='{order_id}' ")
             return None
 
+    def cancel_orders_by_ids(self, orders_ids) -> list:
+        """Cancels the orders with the given ids.
+
+        Returns
+        -------
+            : list
+            The ids of the orders which were cancelled; failures are logged
+            by `cancel_order_by_id` and left out.
+        """
+        cancelled_ids = []
+        for order_id in orders_ids:
+            if self.cancel_order_by_id(order_id) is not None:
+                cancelled_ids.append(order_id)
+        return cancelled_ids
+
     def get_order_by_id(self, order_id: str):
         data = getattr(
             self.api_client,
@@ -115,6 +130,26 @@ class OrderAPI:
             )(**d)
         return result[rp_params['order_id']]
 
+    def send_limit_orders_list(self, orders_data_list: list) -> list:
+        """Sends limit orders one by one.
+
+        Returns
+        -------
+            : list
+            The id of every order in the order of `orders_data_list`, or
+            None for the orders which could not be sent (the errors are
+            logged).
+        """
+        orders_ids = []
+        for order_data in orders_data_list:
+            try:
+                orders_ids.append(self.send_limit_order(order_data))
+            except Exception as e:
+                logging.error(str(e))
+                logging.error(order_data)
+                orders_ids.append(None)
+        return orders_ids
+
     def send_limit_orders(
         self,
         orders_data_list,
@@ -0,0 +1,85 @@
+"""A module to aggregate fills into OHLCV bars
+"""
+import numpy as np
+from .order_history import get_day_starts_in_timezone
+
+BAR_FIELDS = ['mili_unixtime', 'open', 'high', 'low', 'close', 'volume', 'vwap', 'n_fills']
+
+
+def aggregate_bars(
+    mili_unixtimes,
+    prices,
+    amounts,
+    interval_ms: int = None,
+    tz=None,
+    ) -> dict:
+    """Aggregates fills into open/high/low/close/volume/vwap bars.
+
+    The fills are sorted by time (if they are not already) and split at the
+    bucket boundaries, and every field is computed for all the bars at once
+    with `numpy.ufunc.reduceat`. Only buckets which have fills are returned.
+
+    Parameters
+    ----------
+    mili_unixtimes : array_like
+    prices : array_like
+    amounts : array_like
+        The amounts of the fills; their absolute value is the volume.
+    interval_ms : int
+        Default value is None.
+        Length of the bars in milliseconds, aligned to the unix epoch.
+    tz : str or tzinfo
+        Default value is None.
+        If given, daily bars starting at the local midnight of `tz` are
+        returned instead (see `get_day_starts_in_timezone`).
+
+    Returns
+    -------
+        : dict
+        Dictionary of arrays with the keys of BAR_FIELDS, one item per bar.
+        'mili_unixtime' is the start of the bucket of each bar.
+
+    Raises
+    ------
+    ValueError
+        Raises ValueError unless exactly one of `interval_ms` and `tz` is
+        given, or when `interval_ms` is not a positive int.
+    """
+    if (interval_ms is None) == (tz is None):
+        raise ValueError("Expected exactly one of interval_ms and tz")
+    if interval_ms is not None and (type(interval_ms) != int or interval_ms <= 0):
+        raise ValueError(f"Expected interval_ms to be a positive int but got '{interval_ms}'")
+    times = np.asarray(mili_unixtimes, dtype=np.int64)
+    prices = np.asarray(prices, dtype=float)
+    amounts = np.abs(np.asarray(amounts, dtype=float))
+    if len(times) == 0:
+        return dict(
+            (field, np.array([], dtype=np.int64 if field in ['mili_unixtime', 'n_fills'] else float))
+            for field in BAR_FIELDS
+            )
+    if np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind='stable')
+        times, prices, amounts = times[order], prices[order], amounts[order]
+    if interval_ms is not None:
+        bucket_starts = times // interval_ms * interval_ms
+    else:
+        day_starts = np.asarray(
+            get_day_starts_in_timezone(int(times[0]), int(times[-1]), tz),
+            dtype=np.int64,
+            )
+        bucket_starts = day_starts[np.searchsorted(day_starts, times, side='right') - 1]
+    # index of the first fill of every bar
+    firsts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_starts)) + 1))
+    lasts = np.concatenate((firsts[1:], [len(times)])) - 1
+    volume = np.add.reduceat(amounts, firsts)
+    notional = np.add.reduceat(prices * amounts, firsts)
+    return {
+        'mili_unixtime': bucket_starts[firsts],
+        'open': prices[firsts],
+        'high': np.maximum.reduceat(prices, firsts),
+        'low': np.minimum.reduceat(prices, firsts),
+        'close': prices[lasts],
+        'volume': volume,
+        'vwap': np.divide(notional, volume, out=np.full(len(firsts), np.nan), where=volume != 0),
+        'n_fills': lasts - firsts + 1,
+    }
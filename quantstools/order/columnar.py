@@ -0,0 +1,393 @@
+"""A module for columnar (memory-mapped) order history snapshots
+"""
+import os
+import json
+import numpy as np
+from .price import Price
+from .amount import Amount
+from .symbol import Symbol
+from .order_history import OrderHistory
+from .bars import aggregate_bars
+
+SIDES = {'BUY': 1, 'SELL': -1}
+TYPES = {'LIMIT': 0, 'MARKET': 1}
+COLUMNS = [
+    'id_',
+    'side',
+    'type_',
+    'is_active',
+    'is_cancelled',
+    'price_ticks',
+    'amount_ticks',
+    'mili_unixtime',
+    ]
+FORMAT_VERSION = 1
+
+
+class ColumnarOrderHistory:
+
+    """Class to hold order histories as fixed-width columns.
+
+    Every attribute of the orders is kept in its own NumPy array, with the
+    rows sorted by `mili_unixtime`. Prices and amounts are stored as integer
+    ticks of 10 ** -precision. When the columns are opened from disk with
+    `open` they are memory-mapped, so no parsing is done and aggregations
+    run directly over the mapped arrays. OrderHistory objects are only
+    created when a row is accessed.
+
+    Attributes
+    ----------
+    symbol : Symbol
+    price_precision : int
+        Number of decimals of the price ticks.
+    amount_precision : int
+        Number of decimals of the amount ticks.
+    carried : dict
+        The carried-forward aggregates of the archived orders of the
+        collection the columns were built from (see
+        `OrderHistoryCollection.get_carried_aggregates`), or None. They are
+        added to the totals, which are then only available at or after the
+        horizon.
+
+    Example
+    -------
+    >>> ohc.save_columnar('history')
+    >>> columns = OrderHistoryCollection.open_columnar('history')
+    >>> columns.get_total_value(mili_unixtime__lte=1650000000000)
+
+    """
+
+    def __init__(
+        self,
+        symbol: Symbol,
+        columns: dict,
+        price_precision: int,
+        amount_precision: int,
+        carried: dict = None,
+        ):
+        assert set(columns.keys()) == set(COLUMNS)
+        self._symbol = symbol
+        self._columns = columns
+        self._price_precision = price_precision
+        self._amount_precision = amount_precision
+        self._carried = carried
+
+    @property
+    def symbol(self) -> Symbol:
+        return self._symbol
+
+    @property
+    def price_precision(self) -> int:
+        return self._price_precision
+
+    @property
+    def amount_precision(self) -> int:
+        return self._amount_precision
+
+    @property
+    def columns(self) -> dict:
+        return self._columns
+
+    @property
+    def carried(self) -> dict:
+        return self._carried
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._columns['price_ticks'] / 10 ** self._price_precision
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self._columns['amount_ticks'] / 10 ** self._amount_precision
+
+    @property
+    def done_mask(self) -> np.ndarray:
+        return self._done_mask(None)
+
+    def _done_mask(self, stop: int = None) -> np.ndarray:
+        c = self._columns
+        return ~(c['is_active'][:stop] | c['is_cancelled'][:stop])
+
+    def __len__(self) -> int:
+        return len(self._columns['mili_unixtime'])
+
+    @classmethod
+    def from_orders(cls, symbol: Symbol, orders, carried: dict = None):
+        """Builds the columns from an iterable of OrderHistory objects.
+        """
+        orders = sorted(orders, key=lambda o: o.mili_unixtime)
+        price_precision = max(
+            [o.price.precision for o in orders] + [symbol.precision]
+            )
+        amount_precision = max(
+            [o.amount.precision for o in orders] + [symbol.amount_precision]
+            )
+        id_width = max([len(o.id_.encode()) for o in orders] + [1])
+        columns = {
+            'id_': np.array([o.id_.encode() for o in orders], dtype=f'S{id_width}'),
+            'side': np.array([SIDES[o.side] for o in orders], dtype=np.int8),
+            'type_': np.array([TYPES[o.type_] for o in orders], dtype=np.int8),
+            'is_active': np.array([o.is_active for o in orders], dtype=bool),
+            'is_cancelled': np.array([o.is_cancelled for o in orders], dtype=bool),
+            'price_ticks': np.array(
+                [round(o.price.number * 10 ** price_precision) for o in orders],
+                dtype=np.int64,
+                ),
+            'amount_ticks': np.array(
+                [round(o.amount.number * 10 ** amount_precision) for o in orders],
+                dtype=np.int64,
+                ),
+            'mili_unixtime': np.array([o.mili_unixtime for o in orders], dtype=np.int64),
+        }
+        return cls(symbol, columns, price_precision, amount_precision, carried=carried)
+
+    @classmethod
+    def from_records(cls, symbol: Symbol, records: list):
+        """Builds the columns from serialized orders (see OrderHistory.serialize).
+
+        The values are converted column by column with NumPy, without
+        creating Price, Amount or OrderHistory objects. The rows are sorted
+        by `mili_unixtime`, keeping the order of the records on ties.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when a record has another symbol.
+        AssertionError
+            Raises AssertionError when a price or an amount has more integer
+            digits than the symbol allows, like Price and Amount do.
+        """
+        for data in records:
+            if data['symbol'] != symbol.symbol:
+                raise ValueError(
+                    f"Could not build columns of symbol = {symbol.symbol} "
+                    f"from a record of symbol = {data['symbol']}"
+                    )
+        price_precision = symbol.precision
+        amount_precision = symbol.amount_precision
+        prices = np.array([float(data['price']) for data in records], dtype=float)
+        amounts = np.array([float(data['amount']) for data in records], dtype=float)
+        for name, values, digits, precision in [
+            ('price', prices, symbol.digits, price_precision),
+            ('amount', amounts, symbol.amount_digits, amount_precision),
+            ]:
+            if np.any(np.abs(values) >= 10 ** (digits - precision)):
+                raise AssertionError(
+                    f"The integer part of a {name} could not be bigger than "
+                    f"{digits - precision} digits"
+                    )
+        ids = [data['id_'].encode() for data in records]
+        id_width = max([len(id_) for id_ in ids] + [1])
+        columns = {
+            'id_': np.array(ids, dtype=f'S{id_width}'),
+            'side': np.array([SIDES[data['side']] for data in records], dtype=np.int8),
+            'type_': np.array([TYPES[data['type_']] for data in records], dtype=np.int8),
+            'is_active': np.array([bool(data['is_active']) for data in records], dtype=bool),
+            'is_cancelled': np.array([bool(data['is_cancelled']) for data in records], dtype=bool),
+            'price_ticks': np.round(prices * 10 ** price_precision).astype(np.int64),
+            'amount_ticks': np.round(amounts * 10 ** amount_precision).astype(np.int64),
+            'mili_unixtime': np.array(
+                [int(data['mili_unixtime']) for data in records],
+                dtype=np.int64,
+                ),
+        }
+        return cls(symbol, columns, price_precision, amount_precision)._sorted()
+
+    @classmethod
+    def concatenate(cls, symbol: Symbol, chunks: list):
+        """Merges columnar chunks of the same symbol into one, sorted by time.
+
+        The chunks are rescaled to the largest price and amount precision.
+        """
+        chunks = list(chunks)
+        if not chunks:
+            return cls.from_records(symbol, [])
+        price_precision = max([c.price_precision for c in chunks] + [symbol.precision])
+        amount_precision = max([c.amount_precision for c in chunks] + [symbol.amount_precision])
+        columns = {}
+        for name in COLUMNS:
+            arrays = []
+            for chunk in chunks:
+                array = chunk.columns[name]
+                if name == 'price_ticks':
+                    array = array * 10 ** (price_precision - chunk.price_precision)
+                elif name == 'amount_ticks':
+                    array = array * 10 ** (amount_precision - chunk.amount_precision)
+                arrays.append(array)
+            columns[name] = np.concatenate(arrays)
+        return cls(symbol, columns, price_precision, amount_precision)._sorted()
+
+    def _sorted(self):
+        """Sorts the rows by mili_unixtime in place and returns self"""
+        times = self._columns['mili_unixtime']
+        if len(times) > 1 and np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind='stable')
+            for name in COLUMNS:
+                self._columns[name] = self._columns[name][order]
+        return self
+
+    def save(self, path: str) -> None:
+        """Saves the columns as .npy files in the directory `path`.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in COLUMNS:
+            np.save(os.path.join(path, f'{name}.npy'), self._columns[name])
+        meta = {
+            'version': FORMAT_VERSION,
+            'symbol': self._symbol.serialize(),
+            'price_precision': self._price_precision,
+            'amount_precision': self._amount_precision,
+            'n_rows': len(self),
+            'carried': self._carried,
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, path: str, mode: str = 'r'):
+        """Opens columns saved with `save` as memory-mapped arrays.
+
+        Parameters
+        ----------
+        path : str
+            The directory which the columns were saved in.
+        mode : str
+            Default value is 'r'.
+            The `mmap_mode` passed to numpy.load.
+        """
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta['version'] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported columnar format version {meta['version']} in '{path}'"
+                )
+        symbol = Symbol(**meta['symbol'])
+        columns = dict(
+            (name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode))
+            for name in COLUMNS
+            )
+        return cls(
+            symbol,
+            columns,
+            meta['price_precision'],
+            meta['amount_precision'],
+            carried=meta.get('carried'),
+            )
+
+    def _base(self, name: str) -> float:
+        return self._carried[name] if self._carried is not None else 0.0
+
+    def _stop(self, mili_unixtime__lte=None) -> int:
+        if mili_unixtime__lte is None:
+            return len(self)
+        horizon = self._carried['horizon'] if self._carried is not None else None
+        if horizon is not None and mili_unixtime__lte < horizon:
+            raise ValueError(
+                f"The sums before {horizon} are not available because "
+                "the orders before it were archived"
+                )
+        return int(np.searchsorted(self._columns['mili_unixtime'], mili_unixtime__lte, side='right'))
+
+    def get_values(self, stop: int = None) -> np.ndarray:
+        """Returns the signed value of the rows like OrderHistory.get_value"""
+        c = self._columns
+        values = (
+            c['side'][:stop] *
+            (c['price_ticks'][:stop] / 10 ** self._price_precision) *
+            (c['amount_ticks'][:stop] / 10 ** self._amount_precision)
+            )
+        return np.round(values, self._price_precision)
+
+    def get_total_value(self, mili_unixtime__lte=None) -> float:
+        stop = self._stop(mili_unixtime__lte)
+        return self._base('value') + float(self.get_values(stop)[self._done_mask(stop)].sum())
+
+    def get_total_amount(self, mili_unixtime__lte=None) -> float:
+        stop = self._stop(mili_unixtime__lte)
+        amounts = self._columns['amount_ticks'][:stop][self._done_mask(stop)]
+        return self._base('amount') + float(amounts.sum() / 10 ** self._amount_precision)
+
+    def get_avg_price(self, mili_unixtime_lte=None) -> float:
+        total_value = self.get_total_value(mili_unixtime__lte=mili_unixtime_lte)
+        total_amount = self.get_total_amount(mili_unixtime__lte=mili_unixtime_lte)
+        if total_amount == 0:
+            return 0
+        return total_value / total_amount
+
+    def get_total_profit(self, sell_price: float = None, mili_unixtime_lte: int = None):
+        total_value = self.get_total_value(mili_unixtime__lte=mili_unixtime_lte)
+        total_amount = self.get_total_amount(mili_unixtime__lte=mili_unixtime_lte)
+        if total_amount == 0.0:
+            return total_value
+        else:
+            if sell_price is None:
+                raise ValueError("Sell Price must be provided when total amount is not zero")
+            return sell_price * total_amount - total_value
+
+    def to_bars(self, interval_ms: int = None, tz=None, side: str = None) -> dict:
+        """Returns OHLCV bars of the done rows (see OrderHistoryCollection.to_bars)"""
+        assert side in [None, 'BUY', 'SELL']
+        mask = self.done_mask
+        if side is not None:
+            mask = mask & (self._columns['side'] == SIDES[side])
+        return aggregate_bars(
+            self._columns['mili_unixtime'][mask],
+            self.prices[mask],
+            self.amounts[mask],
+            interval_ms=interval_ms,
+            tz=tz,
+            )
+
+    def _materialize(self, start: int, stop: int):
+        """Yields the OrderHistory objects of the rows in [start, stop)"""
+        c = self._columns
+        symbol = self._symbol
+        price_digits = symbol.digits - symbol.precision + self._price_precision
+        amount_digits = symbol.amount_digits - symbol.amount_precision + self._amount_precision
+        # plain Python values are much faster to access than NumPy scalars
+        rows = zip(
+            c['id_'][start:stop].tolist(),
+            c['side'][start:stop].tolist(),
+            (c['price_ticks'][start:stop] / 10 ** self._price_precision).tolist(),
+            (c['amount_ticks'][start:stop] / 10 ** self._amount_precision).tolist(),
+            c['mili_unixtime'][start:stop].tolist(),
+            c['is_active'][start:stop].tolist(),
+            c['is_cancelled'][start:stop].tolist(),
+            c['type_'][start:stop].tolist(),
+            )
+        for id_, side, price, amount, mili_unixtime, is_active, is_cancelled, type_ in rows:
+            yield OrderHistory(
+                id_=id_.decode(),
+                symbol=symbol,
+                side='BUY' if side > 0 else 'SELL',
+                price=Price(price, price_digits, self._price_precision),
+                amount=Amount(amount, amount_digits, self._amount_precision),
+                mili_unixtime=mili_unixtime,
+                is_active=is_active,
+                is_cancelled=is_cancelled,
+                type_='LIMIT' if type_ == TYPES['LIMIT'] else 'MARKET',
+            )
+
+    def __getitem__(self, i: int) -> OrderHistory:
+        """Materializes the OrderHistory object of row `i`"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("ColumnarOrderHistory index out of range")
+        return next(self._materialize(i, i + 1))
+
+    def __iter__(self):
+        # materialized in blocks, so a memory-mapped file is not read at once
+        for start in range(0, len(self), 1 << 16):
+            yield from self._materialize(start, start + (1 << 16))
+
+    def to_collection(self):
+        """Materializes all rows into a new OrderHistoryCollection"""
+        from .order_history_collection import OrderHistoryCollection
+        ohc = OrderHistoryCollection(self._symbol)
+        ohc._add_order_histories(iter(self))
+        # after the rows, which are not archived even when they are before
+        # the archived cutoff
+        if self._carried is not None:
+            ohc._add_carried_aggregates(self._carried)
+        return ohc
@@ -0,0 +1,208 @@
+"""A module for append-only journals of order history changes
+"""
+import os
+import json
+import logging
+from .snapshot import write_text_atomic
+
+
+class OrderHistoryJournal:
+
+    """Class to write and read a JSON lines journal of order changes.
+
+    Every change of an OrderHistoryCollection is appended to the journal
+    file as one JSON object on its own line, so the cost of saving a change
+    does not depend on the size of the collection. Each entry has an `op`
+    key and an increasing sequence number `seq`:
+
+        {"seq": 1, "op": "add", "order": {...serialized OrderHistory...}}
+        {"seq": 2, "op": "status", "id_": "...", "is_active": false, "is_cancelled": true}
+        {"seq": 3, "op": "clean"}
+        {"seq": 4, "op": "archive", "ids": ["...", ...], "cutoff": null}
+        {"seq": 5, "op": "checkpoint"}
+
+    A `checkpoint` entry is written when the journal is truncated, so the
+    sequence numbers keep increasing across truncations and restarts.
+
+    Attributes
+    ----------
+    filepath : str
+        Path of the journal file.
+    snapshot_filepath : str
+        Path of the JSON snapshot which the journal is compacted into.
+    compact_every : int
+        Number of entries after which the journal should be compacted.
+    seq : int
+        Sequence number of the last entry written to the journal.
+
+    """
+
+    def __init__(
+        self,
+        filepath: str = 'order_history_collection.jsonl',
+        snapshot_filepath: str = 'order_history_collection.json',
+        compact_every: int = None,
+        fsync: bool = False,
+        ):
+        """
+        Parameters
+        ----------
+        filepath : str
+            Path of the journal file. The file is created on the first write
+            and appended to if it already exists.
+        snapshot_filepath : str
+            Path of the JSON snapshot which the journal is compacted into.
+        compact_every : int
+            Default value is None.
+            If given, `needs_compaction` becomes True after this many
+            entries are written since the last truncate.
+        fsync : bool
+            Default value is False.
+            If True every entry is flushed to disk with os.fsync, otherwise
+            entries are only flushed to the operating system.
+
+        """
+        self._filepath = filepath
+        self._snapshot_filepath = snapshot_filepath
+        self._compact_every = compact_every
+        self._fsync = fsync
+        self._file = None
+        self._seq = self._read_last_seq()
+        self._n_entries = 0
+
+    @property
+    def filepath(self) -> str:
+        return self._filepath
+
+    @property
+    def snapshot_filepath(self) -> str:
+        return self._snapshot_filepath
+
+    @property
+    def compact_every(self) -> int:
+        return self._compact_every
+
+    @property
+    def needs_compaction(self) -> bool:
+        return (
+            self._compact_every is not None and
+            self._n_entries >= self._compact_every
+            )
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def n_entries(self) -> int:
+        """Returns the number of entries written since the last truncate"""
+        return self._n_entries
+
+    def _read_last_seq(self) -> int:
+        if not os.path.exists(self._filepath):
+            return 0
+        with open(self._filepath, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            tail = b''
+            # read backwards until a complete line is found
+            while position > 0:
+                size = min(4096, position)
+                position -= size
+                f.seek(position)
+                tail = f.read(size) + tail
+                lines = tail.splitlines()
+                complete = lines if position == 0 else lines[1:]
+                for line in reversed(complete):
+                    try:
+                        return int(json.loads(line)['seq'])
+                    except (ValueError, KeyError):
+                        # a partially written last line
+                        continue
+        return 0
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self._filepath, 'a')
+        return self._file
+
+    def append(self, entry: dict) -> int:
+        """Appends an entry to the journal and returns its sequence number.
+        """
+        self._seq += 1
+        entry = dict(entry, seq=self._seq)
+        f = self._open()
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        if self._fsync:
+            os.fsync(f.fileno())
+        self._n_entries += 1
+        return self._seq
+
+    def log_add(self, order) -> int:
+        return self.append({'op': 'add', 'order': order.serialize()})
+
+    def log_status(self, id_: str, is_active: bool, is_cancelled: bool) -> int:
+        return self.append(
+            {
+                'op': 'status',
+                'id_': id_,
+                'is_active': is_active,
+                'is_cancelled': is_cancelled,
+            }
+        )
+
+    def log_clean(self) -> int:
+        return self.append({'op': 'clean'})
+
+    def log_archive(self, ids: list, cutoff: int = None) -> int:
+        return self.append({'op': 'archive', 'ids': list(ids), 'cutoff': cutoff})
+
+    def read(self):
+        """Yields the entries of the journal in the order they were written.
+
+        A partially written last line (e.g. after a crash) is skipped.
+        """
+        if not os.path.exists(self._filepath):
+            return
+        if self._file is not None:
+            self._file.flush()
+        with open(self._filepath, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logging.warning(
+                        f"Skipped an incomplete line in journal '{self._filepath}'"
+                        )
+
+    def advance_seq(self, seq: int) -> None:
+        """Makes the next entries be numbered after `seq`.
+
+        The sequence number is only moved forward, e.g. to the sequence
+        number of a snapshot when the journal file lost its last entries.
+        """
+        self._seq = max(self._seq, seq)
+
+    def truncate(self) -> None:
+        """Removes all entries from the journal.
+
+        Only a checkpoint entry with the current sequence number is kept,
+        so the sequence numbers keep increasing after truncation. The
+        checkpoint is written to a temporary file which is renamed over the
+        journal, so a crash leaves either the old entries or the checkpoint.
+        """
+        self.close()
+        write_text_atomic(
+            self._filepath,
+            json.dumps({'op': 'checkpoint', 'seq': self._seq}) + '\n',
+            fsync=self._fsync,
+            )
+        self._n_entries = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
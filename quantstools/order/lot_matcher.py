@@ -0,0 +1,146 @@
+"""A module for realized profit and loss with lot matching
+"""
+from collections import deque
+from .order_history import OrderHistory
+
+METHODS = ['FIFO', 'LIFO', 'AVG']
+# amounts closer to zero than this are left-overs of float arithmetic
+AMOUNT_TOLERANCE = 1e-12
+
+
+class LotMatcher:
+
+    """Class to compute the realized profit of fills by lot matching.
+
+    Every fill opens a lot or closes lots of the opposite side. Closing a
+    long lot with a SELL realizes `(sell_price - lot_price) * amount` and
+    closing a short lot with a BUY realizes `(lot_price - buy_price) *
+    amount`. The lots to close are chosen by `method`:
+
+    - 'FIFO' closes the oldest lots first,
+    - 'LIFO' closes the newest lots first,
+    - 'AVG' keeps a single lot at the average cost of the position.
+
+    The open lots are kept in a deque, so each fill costs O(1) amortized
+    whatever the length of the history. Fills are matched in the order
+    they are added.
+
+    Attributes
+    ----------
+    method : str
+    realized_pnl : float
+        Sum of the realized profit of all fills.
+    position : float
+        Signed amount of the open lots (positive when long).
+
+    Example
+    -------
+    >>> matcher = ohc.lot_matcher('FIFO')
+    >>> matcher.realized_pnl
+    >>> matcher.get_unrealized_pnl(mark_price=41000.0)
+
+    """
+
+    def __init__(self, method: str = 'FIFO'):
+        if method not in METHODS:
+            raise ValueError(f"Expected method to be one of {METHODS} but got '{method}'")
+        self._method = method
+        # [signed amount, price] of the open lots, oldest first; all lots
+        # have the sign of the position
+        self._lots = deque()
+        self._realized_pnl = 0.0
+        self._n_fills = 0
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    @property
+    def realized_pnl(self) -> float:
+        return self._realized_pnl
+
+    @property
+    def n_fills(self) -> int:
+        return self._n_fills
+
+    @property
+    def position(self) -> float:
+        return sum(lot[0] for lot in self._lots)
+
+    @property
+    def open_lots(self) -> list:
+        """Returns the open lots as (signed amount, price) tuples, oldest first"""
+        return [tuple(lot) for lot in self._lots]
+
+    def get_avg_cost(self) -> float:
+        """Returns the average price of the open lots, or 0 without a position"""
+        position = self.position
+        if abs(position) <= AMOUNT_TOLERANCE:
+            return 0
+        return sum(lot[0] * lot[1] for lot in self._lots) / position
+
+    def get_unrealized_pnl(self, mark_price: float) -> float:
+        """Returns the profit of closing the open lots at `mark_price`"""
+        return sum(lot[0] * (mark_price - lot[1]) for lot in self._lots)
+
+    def add_fill(self, side: str, amount: float, price: float) -> float:
+        """Matches a fill against the open lots.
+
+        Parameters
+        ----------
+        side : str
+            'BUY' or 'SELL'.
+        amount : float
+            The unsigned filled amount.
+        price : float
+
+        Returns
+        -------
+            : float
+            The profit realized by this fill.
+        """
+        assert side in ['BUY', 'SELL']
+        amount = abs(amount)
+        sign = 1 if side == 'BUY' else -1
+        lots = self._lots
+        realized_pnl = 0.0
+        # close lots of the opposite side
+        while amount > AMOUNT_TOLERANCE and lots and lots[0][0] * sign < 0:
+            lot = lots[-1] if self._method == 'LIFO' else lots[0]
+            matched = min(amount, abs(lot[0]))
+            # a long lot (lot[0] > 0) is closed by a SELL and vice versa
+            realized_pnl += matched * (price - lot[1]) * (1 if lot[0] > 0 else -1)
+            amount -= matched
+            lot[0] += matched * sign
+            if abs(lot[0]) <= AMOUNT_TOLERANCE:
+                if self._method == 'LIFO':
+                    lots.pop()
+                else:
+                    lots.popleft()
+        # open a lot with the rest
+        if amount > AMOUNT_TOLERANCE:
+            if self._method == 'AVG' and lots:
+                lot = lots[0]
+                total = lot[0] + sign * amount
+                lot[1] = (lot[0] * lot[1] + sign * amount * price) / total
+                lot[0] = total
+            else:
+                lots.append([sign * amount, price])
+        self._realized_pnl += realized_pnl
+        self._n_fills += 1
+        return realized_pnl
+
+    def add_order(self, order: OrderHistory) -> float:
+        """Matches a done order (see `add_fill`)"""
+        assert isinstance(order, OrderHistory)
+        return self.add_fill(order.side, order.amount.number, order.price.number)
+
+    def __call__(self, order: OrderHistory) -> None:
+        # a LotMatcher can be used directly as a fill listener
+        self.add_order(order)
+
+    def __repr__(self) -> str:
+        return (
+            f"LotMatcher(method='{self._method}', realized_pnl={self._realized_pnl}, "
+            f"position={self.position})"
+            )
@@ -10,6 +10,20 @@ class NumberString:
         self.precision = precision
         self.number = number
 
+    @classmethod
+    def _from_validated(cls, number: float, digits: int, precision: int):
+        """Creates an object without running the setters.
+
+        It is only meant for bulk builders which have already rounded the
+        numbers to `precision` and checked them against `digits` for a
+        whole array at once.
+        """
+        obj = cls.__new__(cls)
+        obj._digits = digits
+        obj._precision = precision
+        obj._number = number
+        return obj
+
     @property
     def number(self) -> float:
         """Returns the number attribute"""
@@ -59,6 +59,28 @@ class Order:
         self.amount = amount
         self.type_ = type_
 
+    @classmethod
+    def _from_validated(
+        cls,
+        symbol: Symbol,
+        side: str,
+        price: Price,
+        amount: Amount,
+        type_: str = 'LIMIT',
+        ):
+        """Creates an Order without running the setters.
+
+        It is only meant for bulk builders which have already validated the
+        arguments (see NumberString._from_validated).
+        """
+        order = cls.__new__(cls)
+        order._symbol = symbol
+        order._side = side
+        order._price = price
+        order._amount = amount
+        order._type_ = type_
+        return order
+
 
     @property
     def symbol(self) -> Symbol:
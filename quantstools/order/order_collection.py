@@ -117,6 +117,40 @@ class OrderCollection:
             )
         self._orders.append(order)
 
+    def add_orders(self, orders) -> None:
+        """Adds many orders to the collection at once.
+
+        The orders are checked like in `add_order` and then appended with a
+        single list extend.
+
+        Parameters
+        ----------
+        orders : iterable
+            Iterable of Order objects.
+
+        Raises
+        ------
+        TypeError:
+            Raises TypeError when an item of `orders` is not of type Order.
+        ValueError:
+            Raises ValueError when the `symbol` of an order is not same as
+            the `self.symbol` attribute.
+        """
+        orders = list(orders)
+        for order in orders:
+            if not isinstance(order, Order):
+                raise TypeError(
+                    "Expecd order of type 'Order' "
+                    f"but got of type '{order.__class__.__name__}'"
+                    )
+            if order.symbol is not self.symbol and not order.symbol == self.symbol:
+                raise ValueError(
+                    f"Expected the give order's symbol to be "
+                    f"'{self.symbol.symbol}' "
+                    f"but got an order with symbol = '{order.symbol.symbol}'"
+                )
+        self._orders.extend(orders)
+
     def reset(self) -> None:
         """Resets the collection to initial state.
         
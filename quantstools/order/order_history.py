@@ -1,6 +1,6 @@
 """A module for order history
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 from pytz import timezone
 from pytz import utc
 from .price import Price
@@ -9,6 +9,35 @@ from .order import Order
 from .exception import OrderCancelError
 from .symbol import Symbol
 
+
+def get_date_in_timezone(mili_unixtime: int, tz='America/Montreal') -> datetime:
+    """Returns the aware datetime in `tz` of a mili_unixtime (truncated to seconds)"""
+    utc_dt = datetime.utcfromtimestamp(int(mili_unixtime / 1000))
+    aware_utc_dt = utc_dt.replace(tzinfo=utc)
+    if isinstance(tz, str):
+        tz = timezone(tz)
+    return aware_utc_dt.astimezone(tz)
+
+
+def get_day_starts_in_timezone(first_mili_unixtime: int, last_mili_unixtime: int, tz='America/Montreal') -> list:
+    """Returns the mili_unixtime of each local midnight in `tz` from the day
+    of `first_mili_unixtime` up to the day of `last_mili_unixtime`.
+
+    The days are built on `get_date_in_timezone`, so days of 23 or 25 hours
+    (daylight saving time changes) are handled by the timezone.
+    """
+    if isinstance(tz, str):
+        tz = timezone(tz)
+    date = get_date_in_timezone(first_mili_unixtime, tz).date()
+    last_date = get_date_in_timezone(last_mili_unixtime, tz).date()
+    day_starts = []
+    while date <= last_date:
+        midnight = tz.localize(datetime(date.year, date.month, date.day))
+        day_starts.append(int(midnight.timestamp()) * 1000)
+        date += timedelta(days=1)
+    return day_starts
+
+
 class OrderHistory(Order):
 
     def __init__(
@@ -106,10 +135,15 @@ class OrderHistory(Order):
 
     def get_value(self, rounding: int = None) -> float:
         if rounding is None:
-            rounding = self.price.precision
+            rounding = self._price.precision
         else:
             assert rounding >= 0 and type(rounding) == int
-        return self.order.get_value(rounding=rounding)
+        # same result as ``self.order.get_value(rounding=rounding)`` but
+        # computed from the fields directly, without a temporary Order
+        amount = abs(self._amount.number)
+        if self._side == 'SELL':
+            amount = -amount
+        return round(amount * self._price.number, rounding)
 
     def get_mili_unixtime(self) -> int:
         return self.mili_unixtime
@@ -125,11 +159,7 @@ class OrderHistory(Order):
             return datetime.utcfromtimestamp(self.get_unixtime())
 
     def get_date_in_timezone(self, tz='America/Montreal'):
-        utc_dt = self.get_utcdatetime()
-        aware_utc_dt = utc_dt.replace(tzinfo=utc)
-        tz = timezone(tz)
-        dt = aware_utc_dt.astimezone(tz)
-        return dt
+        return get_date_in_timezone(self.mili_unixtime, tz)
 
     def to_dict(self, numeric=False) -> dict:
         d = super().to_dict(numeric=numeric)
@@ -2,14 +2,57 @@
 """
 import os
 import json
+import heapq
 import logging
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter, methodcaller
 from typing import OrderedDict
+import numpy as np
 from quantstools.order.amount import Amount
 from .order import Order
 from .order_history import OrderHistory
 from .order_collection import OrderCollection
 from .price import Price
 from .symbol import Symbol
+from .sorted_index import SortedIndex, SortedIndexView, CumulativeSortedIndex
+from .journal import OrderHistoryJournal
+from .streaming import SerializedOrderHistoryReader
+from .columnar import ColumnarOrderHistory
+from .snapshot import write_json_atomic, write_snapshot, read_snapshot
+from .retention import RetentionPolicy, archive_orders
+from .lot_matcher import LotMatcher
+from .rolling import RollingWindowMetrics
+from .bars import aggregate_bars
+
+# the most advanced status wins when the same order is merged with two
+# different statuses; a fill can not be undone so done wins over cancelled
+STATUS_RANK_ACTIVE = 0
+STATUS_RANK_CANCELLED = 1
+STATUS_RANK_DONE = 2
+STATUSES = ['active', 'done', 'cancelled']
+# building the price index costs about as much as a scan of the collection,
+# so a query only builds it when its other candidates are at least this
+# fraction of the collection
+PRICE_INDEX_MIN_FRACTION = 0.5
+# the changes of the collection are applied to the price index at its next
+# use; above this many it is dropped, since rebuilding it is then cheaper
+# than as many inserts in the middle of its lists
+PRICE_INDEX_MAX_CHANGES = 1024
+
+
+def _get_price_number(order: OrderHistory) -> float:
+    return order.price.number
+
+
+def _get_status_rank(order: OrderHistory) -> int:
+    if order.is_active:
+        return STATUS_RANK_ACTIVE
+    elif order.is_cancelled:
+        return STATUS_RANK_CANCELLED
+    else:
+        return STATUS_RANK_DONE
+
 
 class OrderHistoryCollection:
 
@@ -21,6 +64,36 @@ class OrderHistoryCollection:
         self._active_orders = set()
         self._done_orders = set()
         self._cancelled_orders = set()
+        # id_ -> OrderHistory for every order in the three buckets above
+        self._orders_by_id = {}
+        # all orders of the collection sorted by mili_unixtime
+        self._time_index = SortedIndex()
+        # done orders sorted by mili_unixtime with prefix sums of the
+        # value, amount and signed amount used by the as-of aggregates
+        self._done_index = CumulativeSortedIndex(
+            {
+                'value': OrderHistory.get_value,
+                'amount': methodcaller('get_amount', numeric=True),
+                'position': methodcaller('get_numeric_amount', signed=True),
+            }
+        )
+        # ids of the orders moved out by `apply_retention` with their
+        # mili_unixtime; orders with these ids are not added again, since the
+        # done ones are already counted in the carried-forward sums. The ids
+        # of orders older than the cutoff are forgotten, and finished orders
+        # older than it are not added any more
+        self._archived_ids = {}
+        self._archived_cutoff = None
+        self._journal = None
+        # sequence number of the last snapshot saved or loaded, the journal
+        # numbering never goes back below it
+        self._snapshot_seq = 0
+        # callables called with every order which becomes done
+        self._fill_listeners = []
+        # all orders sorted by price, built by `query` when it is needed, and
+        # the (order, is_added) changes not applied to it yet
+        self._price_index = None
+        self._price_index_changes = []
 
     @property
     def symbol(self) -> Symbol:
@@ -38,60 +111,409 @@ class OrderHistoryCollection:
     def cancelled_orders(self) -> set:
         return self._cancelled_orders
 
-    def _add_order_history(self, order):
-        assert isinstance(order, OrderHistory)
-        if order.is_active:
-            self.active_orders.add(order)
+    @property
+    def journal(self) -> OrderHistoryJournal:
+        return self._journal
+
+    @property
+    def archived_ids(self):
+        """Returns the ids of the archived orders which are remembered (read only)"""
+        return self._archived_ids.keys()
+
+    @property
+    def archived_cutoff(self) -> int:
+        """Returns the mili_unixtime before which finished orders are not added, or None"""
+        return self._archived_cutoff
+
+    def _is_archived(self, order) -> bool:
+        """Returns True if `order` is an archived order which must not be added again"""
+        if order.id_ in self._archived_ids:
+            return True
+        # the ids of the orders before the cutoff are forgotten, so a
+        # finished order before it which is not known is taken as archived
+        return (
+            self._archived_cutoff is not None and
+            not order.is_active and
+            order.mili_unixtime < self._archived_cutoff and
+            order.id_ not in self._orders_by_id
+            )
+
+    def _get_bucket(self, is_active: bool, is_cancelled: bool) -> set:
+        if is_active:
+            return self._active_orders
+        elif is_cancelled:
+            return self._cancelled_orders
         else:
-            self.active_orders.discard(order)
-            if order.is_cancelled:
-                self.cancelled_orders.add(order)
+            return self._done_orders
+
+    def _find_bucket(self, order) -> set:
+        """Returns the bucket which currently holds `order`.
+
+        The status flags of an order may have been changed outside of the
+        collection (e.g. by `OrderHistory.cancel`), so the bucket is found
+        by membership rather than by the flags.
+        """
+        for bucket in (self._active_orders, self._done_orders, self._cancelled_orders):
+            if order in bucket:
+                return bucket
+        return None
+
+    def _put_in_bucket(self, order, bucket: set, notify: bool = True) -> None:
+        bucket.add(order)
+        if bucket is self._done_orders:
+            self._done_index.insert(order)
+            if notify:
+                self._notify_fills([order])
+
+    def _remove_from_bucket(self, order, bucket: set) -> None:
+        bucket.discard(order)
+        if bucket is self._done_orders:
+            self._done_index.remove(order)
+
+    def _add_order_history(self, order) -> bool:
+        """Adds or replaces an order; returns False for an archived order"""
+        assert isinstance(order, OrderHistory)
+        if self._is_archived(order):
+            return False
+        existing = self._orders_by_id.get(order.id_)
+        was_done = False
+        if existing is not None:
+            old_bucket = self._find_bucket(existing)
+            was_done = old_bucket is self._done_orders
+            self._remove_from_bucket(existing, old_bucket)
+            self._time_index.remove(existing)
+            self._track_price_index([(existing, False)])
+        self._orders_by_id[order.id_] = order
+        self._time_index.insert(order)
+        self._track_price_index([(order, True)])
+        self._put_in_bucket(
+            order,
+            self._get_bucket(order.is_active, order.is_cancelled),
+            notify=not was_done,
+            )
+        return True
+
+    def _add_order_histories(self, orders) -> None:
+        """Adds many orders at once.
+
+        New orders are put in the buckets directly and the time indexes are
+        extended once for the whole batch instead of once per order. Orders
+        with archived ids are skipped.
+        """
+        new_orders = {}
+        for order in orders:
+            assert isinstance(order, OrderHistory)
+            if self._is_archived(order):
+                continue
+            if order.id_ in self._orders_by_id:
+                self._add_order_history(order)
             else:
-                self.done_orders.add(order)
+                new_orders[order.id_] = order
+        new_done_orders = []
+        for order in new_orders.values():
+            bucket = self._get_bucket(order.is_active, order.is_cancelled)
+            bucket.add(order)
+            if bucket is self._done_orders:
+                new_done_orders.append(order)
+        self._orders_by_id.update(new_orders)
+        self._time_index.extend(new_orders.values())
+        self._track_price_index((order, True) for order in new_orders.values())
+        self._done_index.extend(new_done_orders)
+        if self._fill_listeners:
+            self._notify_fills(sorted(new_done_orders, key=attrgetter('mili_unixtime')))
+
+    def _notify_fills(self, orders: list) -> None:
+        for listener in self._fill_listeners:
+            for order in orders:
+                listener(order)
+
+    def add_fill_listener(self, listener, replay: bool = True) -> None:
+        """Registers a callable which is called with every order that becomes done.
+
+        The listener is called when a done order is added and when the
+        status of an order is changed to done. A done order which replaces
+        a done order of the same id is not reported again.
+
+        Parameters
+        ----------
+        listener : callable
+            Called as `listener(order)` with an OrderHistory.
+        replay : bool
+            Default value is True.
+            If True the listener is first called with the done orders which
+            are already in the collection, in time order. Archived orders
+            (see `apply_retention`) are not replayed.
+        """
+        if replay:
+            for order in self._done_index:
+                listener(order)
+        self._fill_listeners.append(listener)
+
+    def remove_fill_listener(self, listener) -> None:
+        self._fill_listeners.remove(listener)
+
+    def lot_matcher(self, method: str = 'FIFO') -> LotMatcher:
+        """Returns a LotMatcher kept up to date with the done orders.
+
+        The matcher is fed with the done orders of the collection in time
+        order and then with every new fill, so its `realized_pnl` is updated
+        incrementally.
+
+        Parameters
+        ----------
+        method : str
+            Default value is 'FIFO'.
+            One of 'FIFO', 'LIFO' or 'AVG'.
+
+        Returns
+        -------
+            : LotMatcher
+        """
+        matcher = LotMatcher(method)
+        self.add_fill_listener(matcher)
+        return matcher
+
+    def rolling_metrics(self, windows_ms, side: str = None) -> RollingWindowMetrics:
+        """Returns rolling-window volume and VWAP kept up to date with the done orders.
+
+        Parameters
+        ----------
+        windows_ms : iterable
+            The window lengths in milliseconds.
+        side : str
+            Default value is None.
+            If 'BUY' or 'SELL' only the fills of that side are counted.
+
+        Returns
+        -------
+            : RollingWindowMetrics
+        """
+        metrics = RollingWindowMetrics(windows_ms, side=side)
+        self.add_fill_listener(metrics)
+        return metrics
 
     def __len__(self):
         return len(self._active_orders) + len(self._done_orders) + len(self._cancelled_orders)
 
     def __iter__(self):
-        for order in self._active_orders.union(self._done_orders):
-            yield order
+        """Iterates over the active and done orders (see `iter_all` for all)"""
+        return itertools.chain(self._active_orders, self._done_orders)
+
+    def iter_active(self):
+        return iter(self._active_orders)
+
+    def iter_done(self):
+        return iter(self._done_orders)
+
+    def iter_cancelled(self):
+        return iter(self._cancelled_orders)
+
+    def iter_all(self):
+        """Iterates over the orders of every status without copying the buckets"""
+        return itertools.chain(self._active_orders, self._done_orders, self._cancelled_orders)
+
+    def iter_by_time(self, done_only: bool = False):
+        """Iterates over the orders in time order using the time indexes.
+
+        Parameters
+        ----------
+        done_only : bool
+            Default value is False.
+            If True only the done orders are yielded, otherwise the orders
+            of every status.
+
+        Raises
+        ------
+        RuntimeError
+            Raises RuntimeError when the collection is changed while the
+            iteration is in progress.
+        """
+        if done_only:
+            return iter(self._done_index)
+        return iter(self._time_index)
 
     def add_order_history(self, order):
         if isinstance(order, OrderHistory):
-            self._add_order_history(order)
+            if self._add_order_history(order):
+                self._log('log_add', order)
         else:
             # if it is not OrderHistory
             # it must be iterable of OrderHistory objects
             for order_ in set(order):
-                self._add_order_history(order_)
+                if self._add_order_history(order_):
+                    self._log('log_add', order_)
+
+    def add_order_histories(self, orders) -> None:
+        """Adds many orders as one batch.
+
+        It has the same result as calling `add_order_history` for every
+        order, but the new orders are added to the indexes at once (see
+        `_add_order_histories`). Orders with archived ids are skipped.
+
+        Parameters
+        ----------
+        orders : iterable
+            Iterable of OrderHistory objects.
+        """
+        orders = [order for order in orders if not self._is_archived(order)]
+        self._add_order_histories(orders)
+        if self._journal is not None:
+            for order in orders:
+                self._log('log_add', order)
+
+    def get(self, id_: str, default=None) -> OrderHistory:
+        """Returns the order with the given id or `default` if there is none.
+        """
+        return self._orders_by_id.get(id_, default)
+
+    def contains(self, id_: str) -> bool:
+        """Returns whether an order with the given id is in the collection.
+        """
+        return id_ in self._orders_by_id
+
+    def update_status(self, id_: str, is_active: bool, is_cancelled: bool) -> OrderHistory:
+        """Updates the status of the order with the given id in place.
+
+        The order object is kept and only moved between the active, done
+        and cancelled buckets, so no new objects are created.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of an order which is already in the collection.
+        is_active : bool
+        is_cancelled : bool
+
+        Returns
+        -------
+            : OrderHistory
+            The updated order.
+
+        Raises
+        ------
+        KeyError
+            Raises KeyError when there is no order with the given id.
+        """
+        order = self._orders_by_id[id_]
+        old_bucket = self._find_bucket(order)
+        order.is_active = is_active
+        order.is_cancelled = is_cancelled
+        new_bucket = self._get_bucket(is_active, is_cancelled)
+        if new_bucket is not old_bucket:
+            self._remove_from_bucket(order, old_bucket)
+            self._put_in_bucket(order, new_bucket)
+        self._log('log_status', id_, is_active, is_cancelled)
+        return order
+
+    def upsert_rows(
+        self,
+        rows,
+        to_order_history,
+        id_key: str = 'id_',
+        is_active_key: str = 'is_active',
+        is_cancelled_key: str = 'is_cancelled',
+        ) -> set:
+        """Inserts new orders and updates the status of known ones from raw rows.
+
+        Each row is compared with the order of the same id by its status
+        flags only. Unchanged rows are skipped and rows of known orders with
+        a new status are applied with `update_status`, so in both cases no
+        objects are created. `to_order_history` is only called for the rows
+        of new orders, which are then added as one batch. Rows of archived
+        orders are skipped.
+
+        Parameters
+        ----------
+        rows : iterable
+            Iterable of mappings, e.g. the rows of an order history poll.
+        to_order_history : callable
+            Called as `to_order_history(row)` and returns an OrderHistory.
+        id_key : str
+            Default value is 'id_'.
+        is_active_key : str
+            Default value is 'is_active'.
+        is_cancelled_key : str
+            Default value is 'is_cancelled'.
+
+        Returns
+        -------
+            : set
+            The ids of the orders which were added or changed.
+        """
+        changed_ids = set()
+        new_orders = []
+        orders_by_id = self._orders_by_id
+        archived_ids = self._archived_ids
+        for row in rows:
+            id_ = row[id_key]
+            if id_ in archived_ids:
+                continue
+            is_active = row[is_active_key]
+            is_cancelled = row[is_cancelled_key]
+            existing = orders_by_id.get(id_)
+            if existing is None:
+                if id_ not in changed_ids:
+                    order = to_order_history(row)
+                    if self._is_archived(order):
+                        continue
+                    new_orders.append(order)
+                    changed_ids.add(id_)
+            elif existing.is_active != is_active or existing.is_cancelled != is_cancelled:
+                self.update_status(id_, is_active, is_cancelled)
+                changed_ids.add(id_)
+        self.add_order_histories(new_orders)
+        return changed_ids
 
     def filter_by_mili_unixtime(self, mili_unixtime__lte=None):
         if mili_unixtime__lte is None:
             return self
         else:
             new_ohc = OrderHistoryCollection(self.symbol)
-            for order in self.done_orders:
-                if order.mili_unixtime <= mili_unixtime__lte:
-                    new_ohc.add_order_history(order)
-            for order in self.active_orders:
-                if order.mili_unixtime <= mili_unixtime__lte:
-                    new_ohc.add_order_history(order)
-            for order in self.cancelled_orders:
-                if order.mili_unixtime <= mili_unixtime__lte:
-                    new_ohc.add_order_history(order)
+            for order in self.before(mili_unixtime__lte):
+                new_ohc._add_order_history(order)
             return new_ohc
 
+    def between(self, mili_unixtime__gte: int, mili_unixtime__lte: int) -> SortedIndexView:
+        """Returns a view of the orders with time in the given closed range.
+
+        The view is found by binary search over the time index and does not
+        copy the orders. It includes orders of every status and must not be
+        used after the collection is changed.
+        """
+        return self._time_index.between(mili_unixtime__gte, mili_unixtime__lte)
+
+    def before(self, mili_unixtime__lte: int) -> SortedIndexView:
+        """Returns a view of the orders with mili_unixtime <= the given time.
+        """
+        return self._time_index.before(mili_unixtime__lte)
+
+    def after(self, mili_unixtime__gt: int) -> SortedIndexView:
+        """Returns a view of the orders with mili_unixtime > the given time.
+        """
+        return self._time_index.after(mili_unixtime__gt)
+
     def get_total_value(self, mili_unixtime__lte=None):
+        # prefix sums over the done orders in time order
         if mili_unixtime__lte is None:
-            return sum(order.get_value() for order in self._done_orders)
+            return self._done_index.total('value')
         else:
-            return self.filter_by_mili_unixtime(mili_unixtime__lte=mili_unixtime__lte).get_total_value(mili_unixtime__lte=None)
+            return self._done_index.sum_before(mili_unixtime__lte, 'value')
 
     def get_total_amount(self, mili_unixtime__lte=None):
         if mili_unixtime__lte is None:
-            return sum(order.get_amount(numeric=True) for order in self._done_orders)
+            return self._done_index.total('amount')
         else:
-            return self.filter_by_mili_unixtime(mili_unixtime__lte=mili_unixtime__lte).get_total_amount(mili_unixtime__lte=None)
+            return self._done_index.sum_before(mili_unixtime__lte, 'amount')
+
+    def get_position(self, mili_unixtime__lte=None) -> float:
+        """Returns the signed amount of the done orders (BUY minus SELL)
+
+        Archived done orders are included through the carried-forward sums.
+        """
+        if mili_unixtime__lte is None:
+            return self._done_index.total('position')
+        else:
+            return self._done_index.sum_before(mili_unixtime__lte, 'position')
 
     def get_avg_price(self, mili_unixtime_lte=None) -> float:
         total_value = self.get_total_value(mili_unixtime__lte=mili_unixtime_lte)
@@ -110,21 +532,391 @@ class OrderHistoryCollection:
                 raise ValueError("Sell Price must be provided when total amount is not zero")
             return sell_price * total_amount - total_value
 
+    def pnl_curve(self, timestamps, prices=None) -> np.ndarray:
+        """Returns the total profit over a grid of times and prices.
+
+        The result is the same as calling `get_total_profit` for every pair
+        of time and price, but it is computed in one pass with the prefix
+        sums of the done orders.
+
+        Parameters
+        ----------
+        timestamps : array_like
+            The mili_unixtime of each point of the curve. It is used the same
+            way as `mili_unixtime_lte` in `get_total_profit`.
+        prices : array_like
+            Default value is None.
+            The sell (mark) price at each point of the curve. A price is only
+            needed where the total amount is not zero; NaN can be used
+            elsewhere.
+
+        Returns
+        -------
+            : np.ndarray
+            Array of floats with one profit per timestamp.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when the price is missing (None or NaN) at a
+            point where the total amount is not zero.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if prices is None:
+            prices = np.full(timestamps.shape, np.nan)
+        prices = np.asarray(prices, dtype=float)
+        if prices.shape != timestamps.shape:
+            raise ValueError(
+                "Expected prices with the same shape as timestamps "
+                f"{timestamps.shape} but got shape {prices.shape}"
+                )
+        index = self._done_index
+        if index.horizon is not None and np.any(timestamps < index.horizon):
+            raise ValueError(
+                f"The profit before {index.horizon} is not available because "
+                "the orders before it were archived"
+                )
+        positions = np.searchsorted(
+            np.asarray(index.keys, dtype=np.int64),
+            timestamps,
+            side='right',
+            )
+        # position 0 means no done orders (other than archived ones) before
+        # the timestamp
+        total_value = np.concatenate(([index.base('value')], index.cumsums('value')))[positions]
+        total_amount = np.concatenate(([index.base('amount')], index.cumsums('amount')))[positions]
+        has_amount = total_amount != 0.0
+        if np.any(has_amount & np.isnan(prices)):
+            raise ValueError("Sell Price must be provided when total amount is not zero")
+        return np.where(has_amount, prices * total_amount - total_value, total_value)
+
+    def to_bars(self, interval_ms: int = None, tz=None, side: str = None) -> dict:
+        """Returns OHLCV bars of the done orders.
+
+        The price and amount of the done orders are read once in time order
+        from the done index and the bars are computed with NumPy (see
+        `aggregate_bars`). Only buckets with fills are returned.
+
+        Parameters
+        ----------
+        interval_ms : int
+            Default value is None.
+            Length of the bars in milliseconds, aligned to the unix epoch.
+        tz : str
+            Default value is None.
+            If given, daily bars starting at the local midnight of `tz` are
+            returned instead.
+        side : str
+            Default value is None.
+            If 'BUY' or 'SELL' only the done orders of that side are used.
+
+        Returns
+        -------
+            : dict
+            Dictionary of arrays with the keys 'mili_unixtime' (start of the
+            bucket), 'open', 'high', 'low', 'close', 'volume', 'vwap' and
+            'n_fills'.
+        """
+        assert side in [None, 'BUY', 'SELL']
+        orders = self._done_index.view(0, len(self._done_index)).to_list()
+        if side is not None:
+            orders = [o for o in orders if o.side == side]
+        return aggregate_bars(
+            [o.mili_unixtime for o in orders],
+            [o.price.number for o in orders],
+            [o.amount.number for o in orders],
+            interval_ms=interval_ms,
+            tz=tz,
+            )
+
+    def _track_price_index(self, changes) -> None:
+        """Records orders added to or removed from the collection for the price index"""
+        if self._price_index is None:
+            return
+        self._price_index_changes.extend(changes)
+        if len(self._price_index_changes) > PRICE_INDEX_MAX_CHANGES:
+            self._price_index = None
+            self._price_index_changes = []
+
+    def _get_price_index(self) -> SortedIndex:
+        """Returns the price index, built or brought up to date"""
+        if self._price_index is None:
+            self._price_index = SortedIndex(key=_get_price_number)
+            self._price_index.extend(self.iter_all())
+        else:
+            for order, is_added in self._price_index_changes:
+                if is_added:
+                    self._price_index.insert(order)
+                else:
+                    self._price_index.remove(order)
+        self._price_index_changes = []
+        return self._price_index
+
+    def _plan_query(self, statuses: list, price_between, time_between) -> tuple:
+        """Returns the name and the candidate orders of the most selective index.
+
+        The number of candidates of every usable index is found without
+        visiting the orders: the sizes of the status buckets, or a binary
+        search in the time, done and price indexes. The price index is only
+        used when it is built, or built when the other indexes would leave
+        at least PRICE_INDEX_MIN_FRACTION of the collection to scan.
+        """
+        plans = [('all', len(self), self.iter_all)]
+        if statuses is not None:
+            buckets = [self._get_bucket(s == 'active', s == 'cancelled') for s in statuses]
+            plans.append(
+                ('status', sum(len(b) for b in buckets), lambda: itertools.chain(*buckets))
+                )
+        if time_between is not None:
+            if statuses == ['done']:
+                view = self._done_index.between(*time_between)
+                plans.append(('done_time', len(view), lambda: view))
+            else:
+                view = self._time_index.between(*time_between)
+                plans.append(('time', len(view), lambda: view))
+        if price_between is not None and (
+            self._price_index is not None or
+            min(plan[1] for plan in plans) >= PRICE_INDEX_MIN_FRACTION * len(self)
+            ):
+            price_view = self._get_price_index().between(*price_between)
+            plans.append(('price', len(price_view), lambda: price_view))
+        name, n_candidates, candidates = min(plans, key=lambda plan: plan[1])
+        return name, n_candidates, candidates
+
+    def explain_query(
+        self,
+        side: str = None,
+        status=None,
+        price_between: tuple = None,
+        time_between: tuple = None,
+        ) -> dict:
+        """Returns the index `query` would use and its number of candidates.
+
+        Returns
+        -------
+            : dict
+            Dictionary with the keys 'index' (one of 'all', 'status', 'time',
+            'done_time' or 'price') and 'n_candidates'.
+        """
+        statuses, price_between, time_between = self._check_query(
+            side, status, price_between, time_between
+            )
+        name, n_candidates, _ = self._plan_query(statuses, price_between, time_between)
+        return {'index': name, 'n_candidates': n_candidates}
+
+    @staticmethod
+    def _check_query(side, status, price_between, time_between) -> tuple:
+        if side not in [None, 'BUY', 'SELL']:
+            raise ValueError(f"Expected side to be None, 'BUY' or 'SELL' but got '{side}'")
+        statuses = None
+        if status is not None:
+            statuses = sorted(set([status] if isinstance(status, str) else status))
+            for s in statuses:
+                if s not in STATUSES:
+                    raise ValueError(f"Expected status to be one of {STATUSES} but got '{s}'")
+        bounds = []
+        for name, between in [('price_between', price_between), ('time_between', time_between)]:
+            if between is not None:
+                if len(between) != 2:
+                    raise ValueError(f"Expected {name} to be a (low, high) pair but got '{between}'")
+                low, high = between
+                between = (
+                    float('-inf') if low is None else low,
+                    float('inf') if high is None else high,
+                    )
+            bounds.append(between)
+        return statuses, bounds[0], bounds[1]
+
+    def query(
+        self,
+        side: str = None,
+        status=None,
+        price_between: tuple = None,
+        time_between: tuple = None,
+        columnar: bool = False,
+        ):
+        """Returns the orders which match all the given predicates.
+
+        The candidates are taken from the most selective index (the status
+        buckets, the time index, the done index or a price index) and only
+        they are checked against the other predicates. The price index is
+        built by a query by price which the other indexes do not narrow down
+        to less than half of the collection; the orders added after that are
+        inserted into it by the next query by price, and it is dropped when
+        orders are removed in bulk (`clean`, `apply_retention`). See
+        `explain_query` for the chosen index.
+
+        Parameters
+        ----------
+        side : str
+            Default value is None.
+            'BUY' or 'SELL'.
+        status : str or iterable
+            Default value is None.
+            One or more of 'active', 'done' and 'cancelled'.
+        price_between : tuple
+            Default value is None.
+            Closed range (low, high) of the price; None is an open end.
+        time_between : tuple
+            Default value is None.
+            Closed range (low, high) of mili_unixtime; None is an open end.
+        columnar : bool
+            Default value is False.
+            If True the result is returned as a ColumnarOrderHistory.
+
+        Returns
+        -------
+            : SortedIndexView, list or ColumnarOrderHistory
+            When the candidates of the chosen index need no more filtering
+            they are returned as a view of the time or done index; otherwise
+            as a list. Both are sorted by mili_unixtime.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when a predicate is not valid.
+        """
+        statuses, price_between, time_between = self._check_query(
+            side, status, price_between, time_between
+            )
+        name, _, candidates = self._plan_query(statuses, price_between, time_between)
+        candidates = candidates()
+        if (
+            name in ['time', 'done_time']
+            and side is None
+            and price_between is None
+            and (statuses is None or name == 'done_time')
+            ):
+            result = candidates
+        else:
+            buckets = None
+            if statuses is not None and name != 'status':
+                buckets = [self._get_bucket(s == 'active', s == 'cancelled') for s in statuses]
+            result = []
+            for order in candidates:
+                if side is not None and order.side != side:
+                    continue
+                if buckets is not None and not any(order in b for b in buckets):
+                    continue
+                if price_between is not None and not price_between[0] <= order.price.number <= price_between[1]:
+                    continue
+                if time_between is not None and not time_between[0] <= order.mili_unixtime <= time_between[1]:
+                    continue
+                result.append(order)
+            if name not in ['time', 'done_time']:
+                result.sort(key=attrgetter('mili_unixtime'))
+        if columnar:
+            return ColumnarOrderHistory.from_orders(self.symbol, result)
+        return result
+
     def clean(self):
         """Removes cancelled orders"""
+        for order in self._cancelled_orders:
+            del self._orders_by_id[order.id_]
+        self._time_index.remove_all(self._cancelled_orders)
         self._cancelled_orders = set()
+        self._price_index = None
+        self._log('log_clean')
 
-    def serialize(self):
-        serialized_data = {}
-        serialized_data["active_orders"] = [order.serialize() for order in self._active_orders]
-        serialized_data["done_orders"] = [order.serialize() for order in self._done_orders]
-        serialized_data["cancelled_orders"] = [order.serialize() for order in self._cancelled_orders]
-        return serialized_data
+    def enable_journal(
+        self,
+        filepath: str = 'order_history_collection.jsonl',
+        snapshot_filepath: str = 'order_history_collection.json',
+        compact_every: int = None,
+        fsync: bool = False,
+        ) -> OrderHistoryJournal:
+        """Starts appending every change of the collection to a journal.
 
-    def deserialize(self, serialized_data, inplace=False):
+        After this call each `add_order_history`, `update_status` and
+        `clean` appends one JSON line to the journal file instead of the
+        whole collection being rewritten. When `compact_every` is given the
+        journal is compacted into `snapshot_filepath` after that many
+        entries (see `compact_journal`).
+
+        The sequence numbers continue after the last entry of the journal
+        file and after the last snapshot saved or loaded by the collection,
+        so a journal emptied by a crash is not numbered again from 1.
+
+        Returns
+        -------
+            : OrderHistoryJournal
+        """
+        self.disable_journal()
+        self._journal = OrderHistoryJournal(
+            filepath=filepath,
+            snapshot_filepath=snapshot_filepath,
+            compact_every=compact_every,
+            fsync=fsync,
+            )
+        self._journal.advance_seq(self._snapshot_seq)
+        return self._journal
+
+    def disable_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _log(self, method: str, *args) -> None:
+        if self._journal is not None:
+            getattr(self._journal, method)(*args)
+            if self._journal.needs_compaction:
+                self.compact_journal()
+
+    def compact_journal(self) -> None:
+        """Writes the collection to the journal snapshot and empties the journal.
+
+        The snapshot is written atomically together with the sequence number
+        of the last journal entry, so a crash at any point of the compaction
+        is recovered by `load_journal`.
+        """
+        assert self._journal is not None, "The journal is not enabled"
+        self.save_snapshot(self._journal.snapshot_filepath)
+        self._journal.truncate()
+
+    def save_snapshot(self, filepath: str = 'order_history_collection.json') -> int:
+        """Atomically writes the collection with the current journal sequence number.
+
+        Returns
+        -------
+            : int
+            The sequence number stored in the snapshot (0 without a journal).
+        """
+        seq = self._journal.seq if self._journal is not None else 0
+        write_snapshot(
+            filepath,
+            seq,
+            self.serialize(),
+            carried=self.get_carried_aggregates(),
+            fsync=True,
+            )
+        self._snapshot_seq = max(self._snapshot_seq, seq)
+        return seq
+
+    def load_snapshot(self, filepath: str = 'order_history_collection.json') -> int:
+        """Adds the orders of a snapshot to this collection.
+
+        Returns
+        -------
+            : int
+            The sequence number stored in the snapshot.
+        """
+        seq, serialized_data, carried = read_snapshot(filepath)
         assert {"active_orders", "done_orders", "cancelled_orders"} == set(serialized_data.keys())
-        oc = OrderHistoryCollection(self.symbol)
-        o = OrderHistory(
+        o = self._order_history_template()
+        self._add_order_histories(
+            o.deserialize(data)
+            for order_category in ["active_orders", "done_orders", "cancelled_orders"]
+            for data in serialized_data[order_category]
+            )
+        # added after the orders, whose old finished orders are not archived
+        # even when they are before the archived cutoff
+        if carried is not None:
+            self._add_carried_aggregates(carried)
+        self._snapshot_seq = max(self._snapshot_seq, seq)
+        return seq
+
+    def _order_history_template(self) -> OrderHistory:
+        return OrderHistory(
             id_='FAKE',
             symbol=self.symbol,
             side='BUY',
@@ -132,6 +924,229 @@ class OrderHistoryCollection:
             amount=Amount(0),
             mili_unixtime=0,
             )
+
+    def replay_journal(self, filepath: str = 'order_history_collection.jsonl', after_seq: int = 0):
+        """Applies the entries of a journal file to this collection.
+
+        Only the entries with a sequence number bigger than `after_seq` are
+        applied. The entries are not written to the journal of this
+        collection again.
+
+        Returns
+        -------
+        self : OrderHistoryCollection
+        """
+        o = self._order_history_template()
+        journal, self._journal = self._journal, None
+        try:
+            for entry in OrderHistoryJournal(filepath).read():
+                op = entry['op']
+                if entry['seq'] <= after_seq or op == 'checkpoint':
+                    continue
+                if op == 'add':
+                    self._add_order_history(o.deserialize(entry['order']))
+                elif op == 'status':
+                    if self.contains(entry['id_']):
+                        self.update_status(entry['id_'], entry['is_active'], entry['is_cancelled'])
+                    else:
+                        logging.warning(
+                            f"journal entry {entry['seq']} changes the status "
+                            f"of unknown order id = '{entry['id_']}'"
+                            )
+                elif op == 'clean':
+                    self.clean()
+                elif op == 'archive':
+                    self._retire(
+                        [self._orders_by_id[id_] for id_ in entry['ids'] if id_ in self._orders_by_id]
+                        )
+                    self._set_archived_cutoff(entry.get('cutoff'))
+                else:
+                    raise ValueError(f"Unknown journal operation '{op}'")
+        finally:
+            self._journal = journal
+        return self
+
+    def load_journal(
+        self,
+        filepath: str = 'order_history_collection.jsonl',
+        snapshot_filepath: str = 'order_history_collection.json',
+        ):
+        """Loads the journal snapshot (if it exists) and replays the journal.
+
+        This is the journal equivalent of `load_json`. Only the journal
+        entries written after the snapshot are replayed, so the time to
+        start depends on the recent activity rather than on the size of the
+        whole history.
+
+        If a journal is enabled, its next entries are numbered after the
+        sequence number of the loaded snapshot.
+
+        Returns
+        -------
+        self : OrderHistoryCollection
+        """
+        journal, self._journal = self._journal, None
+        try:
+            seq = 0
+            if snapshot_filepath is not None and os.path.exists(snapshot_filepath):
+                seq = self.load_snapshot(snapshot_filepath)
+            if os.path.exists(filepath):
+                self.replay_journal(filepath, after_seq=seq)
+        finally:
+            self._journal = journal
+        if journal is not None:
+            journal.advance_seq(self._snapshot_seq)
+        return self
+
+    def apply_retention(
+        self,
+        policy: RetentionPolicy,
+        archive_filepath: str = 'order_history_archive.jsonl',
+        now_mili_unixtime: int = None,
+        ) -> int:
+        """Moves expired done and cancelled orders out of the collection.
+
+        The expired orders are appended to `archive_filepath` (unless it is
+        None) and removed from memory. The value and amount of archived done
+        orders are carried forward, so `get_total_value`, `get_total_amount`,
+        `get_avg_price` and `get_total_profit` stay exact for every time at
+        or after the newest archived done order. Asking for a time before it
+        raises ValueError. The ids of the archived orders are kept (see
+        `archived_ids`), so polling or loading the same orders again does
+        not count them twice. When the policy has `max_archived_id_age_ms`,
+        the ids of the orders which are older than that before the newest
+        archived order are forgotten, and finished orders older than that
+        (see `archived_cutoff`) are not added to the collection any more.
+
+        Parameters
+        ----------
+        policy : RetentionPolicy
+        archive_filepath : str
+            Default value is 'order_history_archive.jsonl'.
+        now_mili_unixtime : int
+            Default value is None.
+            The current time, needed when the policy has a maximum age.
+
+        Returns
+        -------
+            : int
+            Number of archived orders.
+        """
+        done = self._done_index
+        n_done = policy.n_expired_done(done.keys, now_mili_unixtime)
+        expired = done.view(0, n_done).to_list()
+        cancelled = sorted(self._cancelled_orders, key=attrgetter('mili_unixtime'))
+        n_cancelled = policy.n_expired_cancelled(
+            [o.mili_unixtime for o in cancelled],
+            now_mili_unixtime,
+            )
+        expired += cancelled[:n_cancelled]
+        if not expired:
+            return 0
+        if archive_filepath is not None:
+            archive_orders(archive_filepath, expired)
+        self._retire(expired)
+        if policy.max_archived_id_age_ms is not None:
+            self._set_archived_cutoff(max(self._archived_ids.values()) - policy.max_archived_id_age_ms)
+        self._log('log_archive', [o.id_ for o in expired], self._archived_cutoff)
+        return len(expired)
+
+    def _retire(self, orders: list) -> None:
+        """Removes finished orders, carrying forward the done ones"""
+        done = []
+        for order in orders:
+            bucket = self._find_bucket(order)
+            assert bucket is not self._active_orders, "Active orders could not be archived"
+            bucket.discard(order)
+            del self._orders_by_id[order.id_]
+            self._archived_ids[order.id_] = order.mili_unixtime
+            if bucket is self._done_orders:
+                done.append(order)
+        self._done_index.carry_forward(done)
+        self._time_index.remove_all(orders)
+        self._price_index = None
+
+    def _set_archived_cutoff(self, cutoff: int) -> None:
+        """Moves the archived cutoff forward and forgets the ids of the older orders"""
+        if cutoff is None or (self._archived_cutoff is not None and cutoff <= self._archived_cutoff):
+            return
+        self._archived_cutoff = cutoff
+        self._archived_ids = dict(
+            (id_, mili_unixtime)
+            for id_, mili_unixtime in self._archived_ids.items()
+            if mili_unixtime >= cutoff
+            )
+
+    def get_carried_aggregates(self) -> dict:
+        """Returns the carried-forward aggregates of archived done orders.
+
+        Returns
+        -------
+            : dict
+            Dictionary with the keys 'value', 'amount', 'position' (the
+            signed amount), 'horizon' (the newest mili_unixtime of the
+            archived done orders, or None), 'archived_ids' (the ids of the
+            remembered archived orders with their mili_unixtime) and
+            'archived_cutoff' (see `archived_cutoff`).
+        """
+        return {
+            'value': self._done_index.base('value'),
+            'amount': self._done_index.base('amount'),
+            'position': self._done_index.base('position'),
+            'horizon': self._done_index.horizon,
+            'archived_ids': dict(sorted(self._archived_ids.items())),
+            'archived_cutoff': self._archived_cutoff,
+        }
+
+    def _add_carried_aggregates(self, carried: dict) -> None:
+        """Adds the carried-forward aggregates of `get_carried_aggregates`.
+
+        The orders of this collection with one of the archived ids are
+        dropped without being counted, since they are counted in the
+        carried-forward sums.
+        """
+        archived_ids = carried.get('archived_ids', {})
+        self._drop([self._orders_by_id[id_] for id_ in archived_ids if id_ in self._orders_by_id])
+        self._archived_ids.update(archived_ids)
+        self._set_archived_cutoff(carried.get('archived_cutoff'))
+        self._done_index.add_base(
+            {
+                'value': carried['value'],
+                'amount': carried['amount'],
+                'position': carried.get('position', 0.0),
+            },
+            carried['horizon'],
+            )
+
+    def _drop(self, orders: list) -> None:
+        """Removes orders from the collection without carrying them forward"""
+        if not orders:
+            return
+        done = []
+        for order in orders:
+            bucket = self._find_bucket(order)
+            bucket.discard(order)
+            del self._orders_by_id[order.id_]
+            if bucket is self._done_orders:
+                done.append(order)
+        self._done_index.remove_all(done)
+        self._time_index.remove_all(orders)
+        self._price_index = None
+
+    def serialize(self):
+        # orders are written in time order, so loading them back only
+        # appends to the time indexes
+        by_time = attrgetter('mili_unixtime')
+        serialized_data = {}
+        serialized_data["active_orders"] = [order.serialize() for order in sorted(self._active_orders, key=by_time)]
+        serialized_data["done_orders"] = [order.serialize() for order in self._done_index]
+        serialized_data["cancelled_orders"] = [order.serialize() for order in sorted(self._cancelled_orders, key=by_time)]
+        return serialized_data
+
+    def deserialize(self, serialized_data, inplace=False):
+        assert {"active_orders", "done_orders", "cancelled_orders"} == set(serialized_data.keys())
+        oc = OrderHistoryCollection(self.symbol)
+        o = self._order_history_template()
         for order_category in ["active_orders", "done_orders", "cancelled_orders"]:
             orders_data = serialized_data[order_category]
             for data in orders_data:
@@ -144,18 +1159,170 @@ class OrderHistoryCollection:
         else:
             return oc
 
+    def deserialize_parallel(
+        self,
+        serialized_data: dict,
+        max_workers: int = None,
+        chunk_size: int = 100000,
+        columnar: bool = False,
+        ):
+        """Deserializes many orders with a pool of processes.
+
+        The records are split into chunks of `chunk_size` which are turned
+        into ColumnarOrderHistory chunks by a ProcessPoolExecutor, without
+        creating OrderHistory objects, and merged into one time-sorted
+        ColumnarOrderHistory. Unless `columnar` is True the merged columns
+        are then materialized into a new OrderHistoryCollection like the one
+        returned by `deserialize`.
+
+        Only the building of the columns runs in the worker processes. The
+        OrderHistory objects of the default `columnar=False` are created in
+        the calling process (objects built by the workers would have to be
+        pickled back, which costs as much as creating them), so that step
+        does not get faster with more workers; use `columnar=True` when the
+        aggregates of the columns are enough.
+
+        Parameters
+        ----------
+        serialized_data : dict
+            The output of `serialize`.
+        max_workers : int
+            Default value is None.
+            Number of processes; the default of ProcessPoolExecutor is used
+            when None. With a single chunk no process is started.
+        chunk_size : int
+            Default value is 100000.
+            Number of records sent to a process at a time.
+        columnar : bool
+            Default value is False.
+            If True the ColumnarOrderHistory is returned.
+
+        Returns
+        -------
+            : OrderHistoryCollection or ColumnarOrderHistory
+        """
+        assert {"active_orders", "done_orders", "cancelled_orders"} == set(serialized_data.keys())
+        assert type(chunk_size) == int and chunk_size > 0
+        records = list(
+            itertools.chain(
+                serialized_data["active_orders"],
+                serialized_data["done_orders"],
+                serialized_data["cancelled_orders"],
+                )
+            )
+        chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+        if len(chunks) <= 1 or max_workers == 1:
+            columns = [ColumnarOrderHistory.from_records(self.symbol, chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                columns = list(
+                    executor.map(
+                        ColumnarOrderHistory.from_records,
+                        itertools.repeat(self.symbol),
+                        chunks,
+                        )
+                    )
+        merged = ColumnarOrderHistory.concatenate(self.symbol, columns)
+        if columnar:
+            return merged
+        return merged.to_collection()
+
     def __add__(self, other):
         assert isinstance(other, OrderHistoryCollection)
         assert self.symbol.symbol == other.symbol.symbol
         oc = OrderHistoryCollection(symbol=self.symbol)
-        oc._active_orders = self._active_orders.union(other._active_orders)
-        oc._done_orders = self._done_orders.union(other._done_orders)
-        oc._cancelled_orders = self._cancelled_orders.union(other._cancelled_orders)
+        oc.merge_many([self, other])
         return oc
 
+    def __iadd__(self, other):
+        return self.merge_inplace(other)
+
+    def _get_bucket_rank(self, order) -> int:
+        bucket = self._find_bucket(order)
+        if bucket is self._active_orders:
+            return STATUS_RANK_ACTIVE
+        elif bucket is self._cancelled_orders:
+            return STATUS_RANK_CANCELLED
+        else:
+            return STATUS_RANK_DONE
+
+    def merge_inplace(self, other):
+        """Merges the orders of `other` into this collection.
+
+        Only the orders of `other` are visited. When both collections have
+        an order with the same id, the one with the most advanced status is
+        kept (done > cancelled > active); on a tie the order of this
+        collection is kept.
+
+        Returns
+        -------
+        self : OrderHistoryCollection
+        """
+        return self.merge_many([other])
+
+    def merge_many(self, collections):
+        """Merges many collections into this collection in one pass.
+
+        The time indexes of the collections are merged with a k-way merge,
+        so the new orders reach the indexes of this collection in time order.
+        Conflicts are resolved like in `merge_inplace`. The carried-forward
+        aggregates and the archived ids of the collections are added to this
+        collection; an archived order wins over a live copy of it.
+
+        Parameters
+        ----------
+        collections : iterable
+            Iterable of OrderHistoryCollection objects with the same symbol.
+            This collection and repeated collections are skipped.
+
+        Returns
+        -------
+        self : OrderHistoryCollection
+        """
+        collections = list(collections)
+        for ohc in collections:
+            assert isinstance(ohc, OrderHistoryCollection)
+            assert self.symbol.symbol == ohc.symbol.symbol
+        # this collection already has its own orders (and its time index
+        # must not be iterated while orders are added to it), and a
+        # collection given twice is merged once
+        collections = list({id(ohc): ohc for ohc in collections if ohc is not self}.values())
+        self._merge_orders(
+            heapq.merge(
+                *[ohc._time_index for ohc in collections],
+                key=attrgetter('mili_unixtime'),
+                )
+            )
+        for ohc in collections:
+            if ohc._archived_ids or ohc._archived_cutoff is not None or ohc._done_index.horizon is not None:
+                self._add_carried_aggregates(ohc.get_carried_aggregates())
+        return self
+
+    def _merge_orders(self, orders) -> None:
+        """Merges orders into this collection keeping the most advanced status.
+
+        Conflicts are resolved like in `merge_inplace` and every added or
+        replaced order is written to the journal.
+        """
+        new_orders = {}
+        for order in orders:
+            id_ = order.id_
+            rank = _get_status_rank(order)
+            existing = self._orders_by_id.get(id_)
+            if existing is not None:
+                if existing is not order and rank > self._get_bucket_rank(existing):
+                    self._add_order_history(order)
+                    self._log('log_add', order)
+            else:
+                candidate = new_orders.get(id_)
+                if candidate is None or rank > _get_status_rank(candidate):
+                    new_orders[id_] = order
+        self.add_order_histories(new_orders.values())
+
     def to_json(self, filepath='order_history_collection.json'):
-        with open(filepath, 'w') as f:
-            json.dump(self.serialize(), f)
+        # written to a temporary file and renamed, so a crash while writing
+        # does not lose the previous file
+        write_json_atomic(filepath, self.serialize())
 
     def to_text(self, filepath='order_history_collection.txt'):
         with open(filepath, 'w') as f:
@@ -182,11 +1349,86 @@ class OrderHistoryCollection:
                 logging.info(f"Opened the json file to read")
                 serialized_data = json.load(f)
             oc = self.deserialize(serialized_data=serialized_data, inplace=False)
-            self = self.__add__(oc)
-            return self
+            return self.merge_inplace(oc)
         else:
             logging.warning(f"josn filepath = '{filepath}', does not exists")
 
+    def save_columnar(self, path: str = 'order_history_collection') -> None:
+        """Saves the collection as fixed-width columns in the directory `path`.
+
+        See `ColumnarOrderHistory` for the format. The carried-forward
+        aggregates and archived ids of `apply_retention` are saved with the
+        columns.
+        """
+        ColumnarOrderHistory.from_orders(
+            self.symbol,
+            self.iter_all(),
+            carried=self.get_carried_aggregates(),
+            ).save(path)
+
+    @staticmethod
+    def open_columnar(path: str = 'order_history_collection') -> ColumnarOrderHistory:
+        """Opens columns saved by `save_columnar` as memory-mapped arrays.
+
+        The returned ColumnarOrderHistory supports the same aggregates as
+        OrderHistoryCollection and creates OrderHistory objects only when
+        rows are accessed.
+        """
+        return ColumnarOrderHistory.open(path)
+
+    def load_json_streaming(
+        self,
+        filepath: str = 'order_history_collection.json',
+        chunk_size: int = 1 << 16,
+        batch_size: int = 10000,
+        progress=None,
+        ):
+        """Loads a JSON file written by `to_json` into this collection.
+
+        Unlike `load_json` the file is never held in memory as a whole: it is
+        parsed in chunks of `chunk_size` bytes and the orders are merged into
+        this collection in batches of `batch_size`, without an intermediate
+        collection. The batches are merged like in `load_json`: an order
+        already in the collection is only replaced by one with a more
+        advanced status, and the changes are written to the journal.
+
+        Parameters
+        ----------
+        filepath : str
+        chunk_size : int
+            Default value is 65536.
+            Number of bytes read from the file at a time.
+        batch_size : int
+            Default value is 10000.
+            Number of orders added to the collection at a time.
+        progress : callable
+            Default value is None.
+            Called as `progress(bytes_read, total_bytes)` after each chunk.
+
+        Returns
+        -------
+        self : OrderHistoryCollection
+        """
+        if not os.path.exists(filepath):
+            logging.warning(f"json filepath = '{filepath}', does not exists")
+            return self
+        o = self._order_history_template()
+        batch = []
+        reader = SerializedOrderHistoryReader(
+            filepath,
+            chunk_size=chunk_size,
+            progress=progress,
+            )
+        for category, data in reader:
+            if category not in ("active_orders", "done_orders", "cancelled_orders"):
+                raise ValueError(f"Unknown order category '{category}' in '{filepath}'")
+            batch.append(o.deserialize(data))
+            if len(batch) >= batch_size:
+                self._merge_orders(batch)
+                batch = []
+        self._merge_orders(batch)
+        return self
+
     def __str__(self) -> str:
         s = "=============== ORDER HISTORY COLLECTION ===============\n"
         s += "--------------- Done Orders ---------------\n"
@@ -2,6 +2,9 @@
 """
 
 from email.mime import base
+from operator import itemgetter
+import time
+import numpy as np
 from .order_history_collection import OrderHistoryCollection
 from .order_collection import OrderCollection
 from .order import Order
@@ -9,6 +12,41 @@ from .order_history import OrderHistory
 from .price import Price
 from .amount import Amount
 from .symbol import Symbol
+from .risk import RiskLimits
+
+# float errors smaller than this fraction of a tick are ignored when prices
+# and amounts are rounded to ticks
+TICK_TOLERANCE = 1e-9
+LADDER_SHAPES = ['geometric', 'linear']
+DEFAULT_PARAMS_MAPPING = {
+    'id_': 'id_',
+    'symbol': 'symbol',
+    'price': 'price',
+    'side': 'side',
+    'amount': 'amount',
+    'mili_unixtime': 'mili_unixtime',
+    'is_cancelled': 'is_cancelled',
+    'is_active': 'is_active',
+    }
+
+
+def compile_params_mapping(params_mapping: dict) -> tuple:
+    """Compiles a params mapping into an extractor of raw rows.
+
+    Returns
+    -------
+        : tuple
+        The tuple (keys, getter) where `getter(row)` returns the values of
+        the row for `keys` (the OrderHistory parameters) as a tuple, with a
+        single `operator.itemgetter` call.
+    """
+    keys = tuple(params_mapping.keys())
+    getter = itemgetter(*[params_mapping[key] for key in keys])
+    if len(keys) == 1:
+        single_getter = getter
+        getter = lambda row: (single_getter(row),)
+    return keys, getter
+
 
 class OrderManager:
 
@@ -17,6 +55,7 @@ class OrderManager:
         symbol: Symbol,
         amount_digits: int,
         amount_precision: int,
+        risk_limits: RiskLimits = None,
         ):
         self._symbol = symbol
         self._digits = symbol.digits
@@ -25,6 +64,7 @@ class OrderManager:
         self._amount_precision = amount_precision
         self._ohc = OrderHistoryCollection(self.symbol)
         self._oc = OrderCollection(self.symbol)
+        self.risk_limits = risk_limits
 
     @property
     def symbol(self) -> Symbol:
@@ -50,6 +90,19 @@ class OrderManager:
     def amount_precision(self) -> int:
         return self._amount_precision
 
+    @property
+    def risk_limits(self) -> RiskLimits:
+        return self._risk_limits
+
+    @risk_limits.setter
+    def risk_limits(self, risk_limits: RiskLimits) -> None:
+        if risk_limits is not None and not isinstance(risk_limits, RiskLimits):
+            raise TypeError(
+                "Expected risk_limits of type 'RiskLimits' "
+                f"but got of type '{risk_limits.__class__.__name__}'"
+                )
+        self._risk_limits = risk_limits
+
     def generate_buy_limit_order(
         self,
         price: float,
@@ -87,33 +140,564 @@ class OrderManager:
             amount = amount.increase(amount_increment_rate)
         return oc
 
+    def generate_limit_orders_ladder(
+        self,
+        side: str,
+        start_price: float,
+        n_orders: int = 10,
+        price_step_rate: float = 0.01,
+        fee: float = 0.004,
+        price_shape: str = 'geometric',
+        weights='geometric',
+        weight_rate: float = 0.04,
+        min_amount: float = None,
+        budget: float = None,
+        ) -> OrderCollection:
+        """Returns a ladder of limit orders computed with NumPy arrays.
+
+        The prices move away from `start_price` (down for BUY, up for SELL)
+        by `price_step_rate + fee` per level, like Price.decrease and
+        Price.increase:
+
+        - 'geometric': start_price / (1 + price_step_rate + fee) ** i for BUY
+          and start_price * (1 + price_step_rate + fee) ** i for SELL,
+        - 'linear': start_price * (1 -/+ i * (price_step_rate + fee)).
+
+        The amounts are proportional to `weights`: 'geometric' weights are
+        (1 + weight_rate) ** i (like Amount.increase), 'linear' weights are
+        1 + i * weight_rate and an array of `n_orders` numbers is used as
+        custom weights. They are scaled so that the first order has
+        `min_amount`, or so that the total notional (sum of price * amount)
+        is `budget`.
+
+        Prices are rounded to ticks of the symbol precision away from the
+        market (down for BUY, up for SELL) and amounts are rounded down to
+        the amount precision, so the budget is never exceeded. Levels whose
+        amount is rounded to zero are dropped, and two levels rounded to the
+        same price raise ValueError instead of being placed twice.
+
+        Parameters
+        ----------
+        side : str
+            'BUY' or 'SELL'.
+        start_price : float
+            The price of the first level.
+        n_orders : int
+            Default value is 10.
+        price_step_rate : float
+            Default value is 0.01.
+        fee : float
+            Default value is 0.004.
+        price_shape : str
+            Default value is 'geometric'.
+            'geometric' or 'linear'.
+        weights : str or array_like
+            Default value is 'geometric'.
+            'geometric', 'linear' or custom non-negative weights.
+        weight_rate : float
+            Default value is 0.04.
+        min_amount : float
+            Default value is None.
+            The amount of the first order.
+        budget : float
+            Default value is None.
+            The total notional of the ladder.
+
+        Returns
+        -------
+            : OrderCollection
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when the arguments are not valid, when not
+            exactly one of `min_amount` and `budget` is given, when a price
+            is not positive, when two levels have the same price or when the
+            amounts overflow.
+        AssertionError
+            Raises AssertionError when a price or an amount has more integer
+            digits than allowed, like Price and Amount do.
+        """
+        if side not in ['BUY', 'SELL']:
+            raise ValueError(f"Expected side to be 'BUY' or 'SELL' but got '{side}'")
+        if type(n_orders) != int or n_orders < 1:
+            raise ValueError(f"Expected n_orders to be a positive int but got '{n_orders}'")
+        if price_shape not in LADDER_SHAPES:
+            raise ValueError(f"Expected price_shape to be one of {LADDER_SHAPES} but got '{price_shape}'")
+        if (min_amount is None) == (budget is None):
+            raise ValueError("Expected exactly one of min_amount and budget")
+        levels = np.arange(n_orders)
+        direction = -1 if side == 'BUY' else 1
+        step = price_step_rate + fee
+        if price_shape == 'geometric':
+            prices = start_price * (1 + step) ** (direction * levels.astype(float))
+        else:
+            prices = start_price * (1 + direction * step * levels)
+        ticks = 10 ** self.precision
+        if side == 'BUY':
+            prices = np.floor(prices * ticks + TICK_TOLERANCE) / ticks
+        else:
+            prices = np.ceil(prices * ticks - TICK_TOLERANCE) / ticks
+        if np.any(prices <= 0):
+            raise ValueError(
+                f"The ladder reaches a non-positive price after {int(np.argmax(prices <= 0))} levels"
+                )
+        log_weights = None
+        if isinstance(weights, str):
+            if weights == 'geometric':
+                if weight_rate <= -1:
+                    raise ValueError(f"Expected weight_rate to be bigger than -1 but got '{weight_rate}'")
+                # (1 + weight_rate) ** i overflows for long ladders, so the
+                # weights are computed in log space and scaled by the biggest
+                log_weights = levels * np.log1p(weight_rate)
+                weights = np.exp(log_weights - np.max(log_weights))
+            elif weights == 'linear':
+                weights = 1 + weight_rate * levels
+            else:
+                raise ValueError(f"Expected weights to be one of {LADDER_SHAPES} or an array but got '{weights}'")
+        weights = np.asarray(weights, dtype=float)
+        if (
+            weights.shape != (n_orders,) or
+            not np.all(np.isfinite(weights)) or
+            np.any(weights < 0) or
+            not np.any(weights > 0)
+            ):
+            raise ValueError(f"Expected {n_orders} finite non-negative weights which are not all zero")
+        weights = weights / np.max(weights)
+        with np.errstate(over='ignore'):
+            if min_amount is not None:
+                if log_weights is not None:
+                    amounts = min_amount * np.exp(log_weights)
+                elif weights[0] == 0:
+                    raise ValueError("The first weight must not be zero when min_amount is given")
+                else:
+                    amounts = min_amount * (weights / weights[0])
+            else:
+                amounts = budget * weights / np.sum(weights * prices)
+        if not np.all(np.isfinite(amounts)):
+            raise ValueError(
+                f"The amounts of the ladder overflow after {int(np.argmin(np.isfinite(amounts)))} "
+                "levels, use a smaller weight_rate or fewer orders"
+                )
+        amount_ticks = 10 ** self.amount_precision
+        amounts = np.floor(amounts * amount_ticks + TICK_TOLERANCE) / amount_ticks
+        keep = amounts > 0
+        prices, amounts = prices[keep], amounts[keep]
+        duplicates = np.flatnonzero(prices[1:] == prices[:-1])
+        if len(duplicates):
+            first, second = np.flatnonzero(keep)[[duplicates[0], duplicates[0] + 1]].tolist()
+            raise ValueError(
+                f"The levels {first} and {second} of the ladder are both rounded to the "
+                f"price {prices[duplicates[0]]}, use a bigger price_step_rate or fewer orders"
+                )
+        for name, values, digits, precision in [
+            ('price', prices, self.digits, self.precision),
+            ('amount', amounts, self.amount_digits, self.amount_precision),
+            ]:
+            if np.any(values >= 10 ** (digits - precision)):
+                raise AssertionError(
+                    f"The integer part of a {name} could not be bigger than "
+                    f"{digits - precision} digits"
+                    )
+        symbol = self.symbol
+        oc = OrderCollection(symbol)
+        oc.add_orders(
+            Order._from_validated(
+                symbol,
+                side,
+                Price._from_validated(price, self.digits, self.precision),
+                Amount._from_validated(amount, self.amount_digits, self.amount_precision),
+                'LIMIT',
+                )
+            for price, amount in zip(np.round(prices, self.precision).tolist(), np.round(amounts, self.amount_precision).tolist())
+            )
+        return oc
+
+    def generate_buy_limit_orders_ladder(self, max_price: float, **kwargs) -> OrderCollection:
+        """Returns a BUY ladder starting at `max_price` (see `generate_limit_orders_ladder`)"""
+        return self.generate_limit_orders_ladder('BUY', max_price, **kwargs)
+
+    def generate_sell_limit_orders_ladder(self, min_price: float, **kwargs) -> OrderCollection:
+        """Returns a SELL ladder starting at `min_price` (see `generate_limit_orders_ladder`)"""
+        return self.generate_limit_orders_ladder('SELL', min_price, **kwargs)
+
     def get_orders_history(
         self,
         list_of_dicts,
         params_mapping: dict = None,
-        ) -> None:
-        """Gets orders history"""
-        if params_mapping is None:        
-            params_mapping = {
-                'id_': 'id_',
-                'symbol': 'symbol',
-                'price': 'price',
-                'side': 'side',
-                'amount': 'amount',
-                'mili_unixtime': 'mili_unixtime',
-                'is_cancelled': 'is_cancelled',
-                'is_active': 'is_active',
-                }
-        for order_data in list_of_dicts:
+        ) -> set:
+        """Gets orders history
+
+        Only the rows of new orders are turned into OrderHistory objects;
+        rows of known orders just update their status when it changed (see
+        OrderHistoryCollection.upsert_rows).
+
+        Returns
+        -------
+            : set
+            The ids of the orders which were added or changed.
+        """
+        if params_mapping is None:
+            params_mapping = DEFAULT_PARAMS_MAPPING
+        symbol_key = params_mapping['symbol']
+
+        def check_symbol(list_of_dicts):
+            for order_data in list_of_dicts:
+                if order_data.get(symbol_key) != self.symbol.symbol:
+                    raise ValueError("Wrong Symbol!")
+                yield order_data
+
+        def to_order_history(order_data):
             d = {}
             for key, value in params_mapping.items():
                 d[key] = order_data.get(value)
-            if d['symbol'] != self.symbol.symbol:
-                raise ValueError("Wrong Symbol!")
             d['symbol'] = self.symbol
             d['price'] = Price(float(d['price']), self.symbol.digits, self.symbol.precision)
             d['amount'] = Amount(float(d['amount']), self.amount_digits, self.amount_precision)
-            o = OrderHistory(**d)
-            self._ohc.add_order_history(o)
+            return OrderHistory(**d)
+
+        return self._ohc.upsert_rows(
+            check_symbol(list_of_dicts),
+            to_order_history,
+            id_key=params_mapping['id_'],
+            is_active_key=params_mapping['is_active'],
+            is_cancelled_key=params_mapping['is_cancelled'],
+            )
+
+    def _parse_numbers(self, values, digits: int, precision: int, name: str) -> list:
+        """Parses a column of numbers (or numeric strings) in one NumPy call.
+
+        The numbers are rounded to `precision` and checked against `digits`
+        like NumberString does for a single number. The rounding is done
+        with Python `round`, as in NumberString, since `numpy.round` scales
+        the number first and may round the other way (e.g. 2.675 to 2.68
+        instead of 2.67).
+        """
+        numbers = [round(number, precision) for number in np.array(values, dtype=float).tolist()]
+        integer_digits = digits - precision
+        # the sign counts as a digit in NumberString
+        too_big = np.any(np.array(numbers) >= 10 ** integer_digits) or any(
+            len(str(number).split('.')[0]) > integer_digits for number in numbers if number < 0
+            )
+        if too_big:
+            raise AssertionError(
+                f"The integer part of a {name} could not be bigger than "
+                f"{integer_digits} digits"
+                )
+        return numbers
+
+    def ingest_orders_history(
+        self,
+        list_of_dicts,
+        params_mapping: dict = None,
+        ) -> list:
+        """Adds a page of raw order history rows to the collection in bulk.
+
+        The mapping is compiled once into an itemgetter, the symbol column
+        is checked in one pass and the price and amount columns are parsed
+        with NumPy. The orders are then added with
+        OrderHistoryCollection.add_order_histories, replacing orders with
+        the same id. Unlike `get_orders_history` every row is turned into an
+        OrderHistory, which is faster when most rows are new (e.g. the first
+        load of a long history).
+
+        Parameters
+        ----------
+        list_of_dicts : iterable
+            The raw rows.
+        params_mapping : dict
+            Default value is None.
+            Mapping of OrderHistory parameter to the key of the raw rows.
+            It must have the keys 'symbol', 'price' and 'amount'.
+
+        Returns
+        -------
+            : list
+            The added OrderHistory objects.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when a row has another symbol.
+        KeyError
+            Raises KeyError when a row does not have a key of the mapping.
+        """
+        if params_mapping is None:
+            params_mapping = DEFAULT_PARAMS_MAPPING
+        keys, getter = compile_params_mapping(params_mapping)
+        rows = list(map(getter, list_of_dicts))
+        if not rows:
+            return []
+        columns = dict(zip(keys, zip(*rows)))
+        if set(columns['symbol']) != {self.symbol.symbol}:
+            raise ValueError("Wrong Symbol!")
+        prices = self._parse_numbers(columns['price'], self.digits, self.precision, 'price')
+        amounts = self._parse_numbers(columns['amount'], self.amount_digits, self.amount_precision, 'amount')
+        other_keys = [key for key in keys if key not in ['symbol', 'price', 'amount']]
+        symbol = self.symbol
+        orders = [
+            OrderHistory(
+                symbol=symbol,
+                price=Price._from_validated(price, self.digits, self.precision),
+                amount=Amount._from_validated(amount, self.amount_digits, self.amount_precision),
+                **dict(zip(other_keys, values))
+                )
+            for price, amount, values in zip(prices, amounts, zip(*[columns[key] for key in other_keys]))
+        ]
+        self._ohc.add_order_histories(orders)
+        return orders
+
+    def _get_requote_key(self, order: Order) -> tuple:
+        return (
+            order.side,
+            int(round(order.amount.number * 10 ** self.amount_precision)),
+            )
+
+    def plan_requote(
+        self,
+        target,
+        active_orders=None,
+        tick_tolerance: int = 0,
+        ) -> tuple:
+        """Returns the minimal cancels and placements to move to a target ladder.
+
+        A live order is kept when the target has an order with the same side
+        and amount whose price is at most `tick_tolerance` ticks away. The
+        orders of every (side, amount) group are matched in price order,
+        which keeps as many live orders as possible; the other live orders
+        are cancelled and the other target orders are placed.
+
+        Parameters
+        ----------
+        target : iterable
+            The wanted orders, e.g. an OrderCollection from one of the
+            ladder builders.
+        active_orders : iterable
+            Default value is None.
+            The live orders; `self.ohc.active_orders` when None.
+        tick_tolerance : int
+            Default value is 0.
+            Number of price ticks of the symbol precision by which a live
+            order may differ from its target.
+
+        Returns
+        -------
+            : tuple
+            The tuple (cancels, placements, kept): the live OrderHistory
+            objects to cancel, the target Order objects to place and the
+            number of live orders which are kept.
+        """
+        if active_orders is None:
+            active_orders = self.ohc.active_orders
+        assert type(tick_tolerance) == int and tick_tolerance >= 0
+        ticks = 10 ** self.precision
+        groups = {}
+        for i, orders in enumerate([active_orders, target]):
+            for order in orders:
+                group = groups.setdefault(self._get_requote_key(order), ([], []))
+                group[i].append((int(round(order.price.number * ticks)), order))
+        cancels = []
+        placements = []
+        kept = 0
+        for live, wanted in groups.values():
+            live.sort(key=itemgetter(0))
+            wanted.sort(key=itemgetter(0))
+            i = j = 0
+            while i < len(live) and j < len(wanted):
+                difference = live[i][0] - wanted[j][0]
+                if abs(difference) <= tick_tolerance:
+                    kept += 1
+                    i += 1
+                    j += 1
+                elif difference < 0:
+                    cancels.append(live[i][1])
+                    i += 1
+                else:
+                    placements.append(wanted[j][1])
+                    j += 1
+            cancels.extend(order for _, order in live[i:])
+            placements.extend(order for _, order in wanted[j:])
+        return cancels, placements, kept
+
+    def get_exposure(self) -> tuple:
+        """Returns the position of `self.ohc` and the amounts of its resting orders.
+
+        The position is read from the prefix sums of the done orders, so it
+        costs O(log n) and includes the orders archived by retention.
+
+        Returns
+        -------
+            : tuple
+            The tuple (position, open_buy_amount, open_sell_amount): the
+            signed amount of the done orders and the unsigned amounts of the
+            active BUY and SELL orders.
+        """
+        open_buy_amount = 0.0
+        open_sell_amount = 0.0
+        for order in self._ohc.active_orders:
+            if order.side == 'BUY':
+                open_buy_amount += abs(order.amount.number)
+            else:
+                open_sell_amount += abs(order.amount.number)
+        return self._ohc.get_position(), open_buy_amount, open_sell_amount
 
+    def check_orders(self, orders, reference_price: float = None) -> tuple:
+        """Checks orders against `self.risk_limits` in one vectorized pass.
 
+        The position limit accounts for the done orders and for the active
+        orders of `self.ohc` (see `get_exposure`).
+
+        Parameters
+        ----------
+        orders : iterable
+            Iterable of Order objects.
+        reference_price : float
+            Default value is None.
+            The reference price of the price band (e.g. the mid price).
+
+        Returns
+        -------
+            : tuple
+            The tuple (mask, reasons) of `RiskLimits.check`; all the orders
+            are accepted when `self.risk_limits` is None.
+        """
+        orders = list(orders)
+        if self._risk_limits is None:
+            return np.ones(len(orders), dtype=bool), [() for _ in orders]
+        position, open_buy_amount, open_sell_amount = self.get_exposure()
+        return self._risk_limits.check(
+            orders,
+            position=position,
+            reference_price=reference_price,
+            open_buy_amount=open_buy_amount,
+            open_sell_amount=open_sell_amount,
+            )
+
+    def filter_orders(self, orders, reference_price: float = None) -> tuple:
+        """Splits orders into the ones accepted and rejected by `self.risk_limits`.
+
+        Returns
+        -------
+            : tuple
+            The tuple (accepted, rejected): an OrderCollection of the
+            accepted orders and a list of (order, reasons) tuples.
+        """
+        orders = list(orders)
+        mask, reasons = self.check_orders(orders, reference_price=reference_price)
+        accepted = OrderCollection(self.symbol)
+        accepted.add_orders([order for order, ok in zip(orders, mask.tolist()) if ok])
+        rejected = [(orders[i], reasons[i]) for i in np.flatnonzero(~mask).tolist()]
+        return accepted, rejected
+
+    def send_limit_orders(
+        self,
+        api,
+        orders,
+        reference_price: float = None,
+        batch_size: int = 20,
+        mili_unixtime: int = None,
+        ) -> tuple:
+        """Sends the orders accepted by `self.risk_limits` through the OrderAPI.
+
+        The orders are checked with `filter_orders` before anything is
+        sent, so rejected orders never reach the API. Every placed order is
+        added to `self.ohc` as an active order with the id returned by the
+        API, so the next checks count it in the exposure before the order
+        history is polled again.
+
+        Parameters
+        ----------
+        api : OrderAPI
+        orders : iterable
+            Iterable of Order objects.
+        reference_price : float
+            Default value is None.
+        batch_size : int
+            Default value is 20.
+            Number of orders per `OrderAPI.send_limit_orders_list` call.
+        mili_unixtime : int
+            Default value is None.
+            The time of the placed orders; the current time when None.
+
+        Returns
+        -------
+            : tuple
+            The tuple (placed, rejected): the set of ids returned by the API
+            and the list of (order, reasons) tuples of `filter_orders`.
+        """
+        assert type(batch_size) == int and batch_size > 0
+        accepted, rejected = self.filter_orders(orders, reference_price=reference_price)
+        accepted = accepted.orders
+        if mili_unixtime is None:
+            mili_unixtime = int(time.time() * 1000)
+        placed_ids = set()
+        for i in range(0, len(accepted), batch_size):
+            batch = accepted[i:i + batch_size]
+            ids = api.send_limit_orders_list([order.serialize() for order in batch])
+            placed = [
+                OrderHistory.from_order(id_, order, mili_unixtime)
+                for order, id_ in zip(batch, ids)
+                if id_ is not None
+                ]
+            self._ohc.add_order_histories(placed)
+            placed_ids.update(order.id_ for order in placed)
+        return placed_ids, rejected
+
+    def requote(
+        self,
+        api,
+        target,
+        tick_tolerance: int = 0,
+        batch_size: int = 20,
+        reference_price: float = None,
+        mili_unixtime: int = None,
+        ) -> dict:
+        """Moves the live orders of `self.ohc` to a target ladder with minimal churn.
+
+        The plan of `plan_requote` is sent through the OrderAPI: first the
+        cancels with `cancel_orders_by_ids` (the cancelled orders are marked
+        as cancelled in `self.ohc`) and then the placements which pass
+        `self.risk_limits`, with `send_limit_orders` in batches of
+        `batch_size` (the placed orders are added to `self.ohc` as active
+        orders, so a second requote keeps them).
+
+        Parameters
+        ----------
+        api : OrderAPI
+        target : iterable
+            The wanted orders.
+        tick_tolerance : int
+            Default value is 0.
+        batch_size : int
+            Default value is 20.
+        reference_price : float
+            Default value is None.
+            The reference price of the price band of `self.risk_limits`.
+        mili_unixtime : int
+            Default value is None.
+            The time of the placed orders; the current time when None.
+
+        Returns
+        -------
+            : dict
+            Dictionary with the keys 'cancelled' (list of ids), 'placed'
+            (set of ids returned by the API), 'rejected' (list of (order,
+            reasons) tuples of the placements rejected by the risk limits)
+            and 'kept' (number of live orders which were left alone).
+        """
+        assert type(batch_size) == int and batch_size > 0
+        cancels, placements, kept = self.plan_requote(target, tick_tolerance=tick_tolerance)
+        cancelled_ids = []
+        for i in range(0, len(cancels), batch_size):
+            ids = api.cancel_orders_by_ids([order.id_ for order in cancels[i:i + batch_size]])
+            for id_ in ids:
+                self._ohc.update_status(id_, False, True)
+            cancelled_ids.extend(ids)
+        placed_ids, rejected = self.send_limit_orders(
+            api,
+            placements,
+            reference_price=reference_price,
+            batch_size=batch_size,
+            mili_unixtime=mili_unixtime,
+            )
+        return {'cancelled': cancelled_ids, 'placed': placed_ids, 'rejected': rejected, 'kept': kept}
@@ -0,0 +1,102 @@
+"""A module for retention policies of order histories
+"""
+import json
+from bisect import bisect_right
+
+
+class RetentionPolicy:
+
+    """Class to decide which finished orders are moved out of memory.
+
+    A finished (done or cancelled) order is retained while it is younger
+    than `max_age_ms` and among the newest `max_done_orders` done orders
+    (or `max_cancelled_orders` cancelled orders). Limits which are None are
+    not applied.
+
+    The ids of the archived orders are remembered, so they are not added
+    to the collection again. With `max_archived_id_age_ms` only the ids of
+    the orders at most that much older than the newest archived order are
+    remembered; finished orders older than that are then not added to the
+    collection any more, whatever their id.
+
+    Attributes
+    ----------
+    max_age_ms : int
+        Maximum age of a retained order in milliseconds.
+    max_done_orders : int
+        Maximum number of retained done orders.
+    max_cancelled_orders : int
+        Maximum number of retained cancelled orders.
+    max_archived_id_age_ms : int
+        Maximum age of a remembered archived id in milliseconds, relative
+        to the newest archived order.
+
+    Example
+    -------
+    >>> policy = RetentionPolicy(max_age_ms=7 * 24 * 3600 * 1000, max_done_orders=100000)
+    >>> ohc.apply_retention(policy, 'order_history_archive.jsonl')
+
+    """
+
+    def __init__(
+        self,
+        max_age_ms: int = None,
+        max_done_orders: int = None,
+        max_cancelled_orders: int = None,
+        max_archived_id_age_ms: int = None,
+        ):
+        for name, value in [
+            ('max_age_ms', max_age_ms),
+            ('max_done_orders', max_done_orders),
+            ('max_cancelled_orders', max_cancelled_orders),
+            ('max_archived_id_age_ms', max_archived_id_age_ms),
+            ]:
+            if value is not None and (type(value) != int or value < 0):
+                raise ValueError(
+                    f"Expected {name} to be None or a non-negative int "
+                    f"but got '{value}'"
+                    )
+        self.max_age_ms = max_age_ms
+        self.max_done_orders = max_done_orders
+        self.max_cancelled_orders = max_cancelled_orders
+        self.max_archived_id_age_ms = max_archived_id_age_ms
+
+    def _n_expired(self, mili_unixtimes: list, max_orders: int, now_mili_unixtime: int) -> int:
+        n = 0
+        if max_orders is not None:
+            n = max(n, len(mili_unixtimes) - max_orders)
+        if self.max_age_ms is not None and now_mili_unixtime is not None:
+            n = max(n, bisect_right(mili_unixtimes, now_mili_unixtime - self.max_age_ms - 1))
+        return n
+
+    def n_expired_done(self, mili_unixtimes: list, now_mili_unixtime: int = None) -> int:
+        """Returns how many of the oldest done orders are expired.
+
+        Parameters
+        ----------
+        mili_unixtimes : list
+            Sorted times of the done orders.
+        now_mili_unixtime : int
+            Default value is None.
+            The current time, needed for the `max_age_ms` limit.
+        """
+        return self._n_expired(mili_unixtimes, self.max_done_orders, now_mili_unixtime)
+
+    def n_expired_cancelled(self, mili_unixtimes: list, now_mili_unixtime: int = None) -> int:
+        """Returns how many of the oldest cancelled orders are expired"""
+        return self._n_expired(mili_unixtimes, self.max_cancelled_orders, now_mili_unixtime)
+
+    def __repr__(self) -> str:
+        return (
+            f"RetentionPolicy(max_age_ms={self.max_age_ms}, "
+            f"max_done_orders={self.max_done_orders}, "
+            f"max_cancelled_orders={self.max_cancelled_orders}, "
+            f"max_archived_id_age_ms={self.max_archived_id_age_ms})"
+            )
+
+
+def archive_orders(filepath: str, orders) -> None:
+    """Appends the serialized orders to a JSON lines archive file"""
+    with open(filepath, 'a') as f:
+        for order in orders:
+            f.write(json.dumps(order.serialize()) + '\n')
@@ -0,0 +1,216 @@
+"""A module for pre-trade risk checks of orders
+"""
+import numpy as np
+
+REASON_ORDER_NOTIONAL = 'order_notional'
+REASON_PRICE_BAND = 'price_band'
+REASON_POSITION = 'position'
+REASON_TOTAL_NOTIONAL = 'total_notional'
+REASONS = [REASON_ORDER_NOTIONAL, REASON_PRICE_BAND, REASON_POSITION, REASON_TOTAL_NOTIONAL]
+# float errors smaller than this fraction of a limit are ignored
+LIMIT_TOLERANCE = 1e-9
+
+
+class RiskLimits:
+
+    """Class to check a batch of orders against pre-trade risk limits.
+
+    All the orders of a batch are checked at once with numpy:
+
+    - 'order_notional': the notional value (price * amount) of an order is
+      above `max_order_notional`,
+    - 'price_band': the price of an order is more than
+      `max_price_deviation` (a rate) away from the reference price,
+    - 'position': the position after all the BUY (or all the SELL) orders
+      of the batch are filled would be above `max_position` (or below
+      `-max_position`),
+    - 'total_notional': the notional value of the batch is above
+      `max_total_notional`.
+
+    The aggregate limits ('position' and 'total_notional') are applied in
+    the order of the batch to the orders which pass the limits before them,
+    so the first orders of a ladder are kept and, once a limit is reached,
+    the later ones are rejected. Limits which are None are not applied.
+
+    Attributes
+    ----------
+    max_order_notional : float
+    max_total_notional : float
+    max_position : float
+        Maximum absolute position, in units of the amount.
+    max_price_deviation : float
+        Maximum relative distance of a price to the reference price.
+    reference_price : float
+        Default reference price of the price band.
+
+    Example
+    -------
+    >>> limits = RiskLimits(max_order_notional=1000, max_position=2, max_price_deviation=0.1)
+    >>> mask, reasons = limits.check(orders, position=0.5, reference_price=41000.0)
+
+    """
+
+    def __init__(
+        self,
+        max_order_notional: float = None,
+        max_total_notional: float = None,
+        max_position: float = None,
+        max_price_deviation: float = None,
+        reference_price: float = None,
+        ):
+        for name, value in [
+            ('max_order_notional', max_order_notional),
+            ('max_total_notional', max_total_notional),
+            ('max_position', max_position),
+            ('max_price_deviation', max_price_deviation),
+            ('reference_price', reference_price),
+            ]:
+            if value is not None and (type(value) not in [int, float] or value < 0):
+                raise ValueError(
+                    f"Expected {name} to be None or a non-negative number "
+                    f"but got '{value}'"
+                    )
+        self.max_order_notional = max_order_notional
+        self.max_total_notional = max_total_notional
+        self.max_position = max_position
+        self.max_price_deviation = max_price_deviation
+        self.reference_price = reference_price
+
+    def check_arrays(
+        self,
+        sides,
+        prices,
+        amounts,
+        position: float = 0.0,
+        reference_price: float = None,
+        open_buy_amount: float = 0.0,
+        open_sell_amount: float = 0.0,
+        ) -> tuple:
+        """Checks orders given as arrays (see `check`).
+
+        Parameters
+        ----------
+        sides : array_like
+            'BUY' or 'SELL' of every order.
+        prices : array_like
+        amounts : array_like
+            The unsigned amounts.
+        position : float
+            Default value is 0.0.
+        reference_price : float
+            Default value is None.
+        open_buy_amount : float
+            Default value is 0.0.
+        open_sell_amount : float
+            Default value is 0.0.
+
+        Returns
+        -------
+            : tuple
+            The tuple (mask, reasons), see `check`.
+        """
+        prices = np.asarray(prices, dtype=float)
+        amounts = np.abs(np.asarray(amounts, dtype=float))
+        is_buy = np.asarray(sides) == 'BUY'
+        n = len(prices)
+        failed = {}
+        notionals = prices * amounts
+        if self.max_order_notional is not None:
+            failed[REASON_ORDER_NOTIONAL] = (
+                notionals > self.max_order_notional * (1 + LIMIT_TOLERANCE)
+                )
+        if reference_price is None:
+            reference_price = self.reference_price
+        if self.max_price_deviation is not None:
+            if reference_price is None:
+                raise ValueError("Expected a reference_price for the max_price_deviation limit")
+            failed[REASON_PRICE_BAND] = (
+                np.abs(prices - reference_price)
+                > reference_price * self.max_price_deviation * (1 + LIMIT_TOLERANCE)
+                )
+        mask = np.ones(n, dtype=bool)
+        for reason_failed in failed.values():
+            mask &= ~reason_failed
+        if self.max_position is not None:
+            limit = self.max_position * (1 + LIMIT_TOLERANCE)
+            buys = mask & is_buy
+            sells = mask & ~is_buy
+            failed[REASON_POSITION] = (
+                (buys & (position + open_buy_amount + np.cumsum(np.where(buys, amounts, 0)) > limit))
+                | (sells & (position - open_sell_amount - np.cumsum(np.where(sells, amounts, 0)) < -limit))
+                )
+            mask &= ~failed[REASON_POSITION]
+        if self.max_total_notional is not None:
+            failed[REASON_TOTAL_NOTIONAL] = mask & (
+                np.cumsum(np.where(mask, notionals, 0))
+                > self.max_total_notional * (1 + LIMIT_TOLERANCE)
+                )
+            mask &= ~failed[REASON_TOTAL_NOTIONAL]
+        reasons = [() for _ in range(n)]
+        for i in np.flatnonzero(~mask).tolist():
+            reasons[i] = tuple(
+                reason for reason in REASONS if reason in failed and failed[reason][i]
+                )
+        return mask, reasons
+
+    def check(
+        self,
+        orders,
+        position: float = 0.0,
+        reference_price: float = None,
+        open_buy_amount: float = 0.0,
+        open_sell_amount: float = 0.0,
+        ) -> tuple:
+        """Checks a batch of orders against the limits.
+
+        Parameters
+        ----------
+        orders : iterable
+            Iterable of Order objects, e.g. an OrderCollection.
+        position : float
+            Default value is 0.0.
+            The signed position before the orders are filled.
+        reference_price : float
+            Default value is None.
+            The reference price of the price band; `self.reference_price`
+            when None.
+        open_buy_amount : float
+            Default value is 0.0.
+            Unsigned amount of the resting BUY orders which may still fill
+            and add to the position.
+        open_sell_amount : float
+            Default value is 0.0.
+            Unsigned amount of the resting SELL orders.
+
+        Returns
+        -------
+            : tuple
+            The tuple (mask, reasons): a boolean numpy array which is True
+            for the accepted orders and, for every order, the tuple of the
+            REASONS which rejected it (empty for the accepted orders).
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when the price band is checked without a
+            reference price.
+        """
+        orders = list(orders)
+        return self.check_arrays(
+            [order.side for order in orders],
+            [order.price.number for order in orders],
+            [order.amount.number for order in orders],
+            position=position,
+            reference_price=reference_price,
+            open_buy_amount=open_buy_amount,
+            open_sell_amount=open_sell_amount,
+            )
+
+    def __repr__(self) -> str:
+        return (
+            f"RiskLimits(max_order_notional={self.max_order_notional}, "
+            f"max_total_notional={self.max_total_notional}, "
+            f"max_position={self.max_position}, "
+            f"max_price_deviation={self.max_price_deviation}, "
+            f"reference_price={self.reference_price})"
+            )
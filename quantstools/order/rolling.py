@@ -0,0 +1,186 @@
+"""A module for rolling-window metrics of fills
+"""
+from collections import deque
+from .order_history import OrderHistory
+
+
+class RollingWindowAggregator:
+
+    """Class to keep the volume and VWAP of the fills of a sliding time window.
+
+    The fills of the window are kept in a deque sorted by `mili_unixtime`
+    together with the running sums of their amount and notional value
+    (price * amount). A fill is added to the right and removed from the left
+    when it leaves the window, so adding a fill and querying the window are
+    O(1) amortized. The window at time `t` holds the fills with
+    `t - window_ms < mili_unixtime <= t`.
+
+    Attributes
+    ----------
+    window_ms : int
+        Length of the window in milliseconds.
+    now : int
+        The latest time the window was moved to.
+
+    """
+
+    def __init__(self, window_ms: int):
+        if type(window_ms) != int or window_ms <= 0:
+            raise ValueError(f"Expected window_ms to be a positive int but got '{window_ms}'")
+        self._window_ms = window_ms
+        # (mili_unixtime, amount, notional) of the fills in the window
+        self._fills = deque()
+        self._amount = 0.0
+        self._notional = 0.0
+        self._now = None
+
+    @property
+    def window_ms(self) -> int:
+        return self._window_ms
+
+    @property
+    def now(self) -> int:
+        return self._now
+
+    def __len__(self) -> int:
+        return len(self._fills)
+
+    def add(self, mili_unixtime: int, amount: float, price: float) -> None:
+        """Adds a fill and moves the window forward to its time if needed.
+
+        A late fill (older than the latest one) is inserted at its place, or
+        ignored when it is already out of the window.
+        """
+        amount = abs(amount)
+        fill = (mili_unixtime, amount, amount * price)
+        fills = self._fills
+        if self._now is None or mili_unixtime >= self._now:
+            fills.append(fill)
+            self._amount += fill[1]
+            self._notional += fill[2]
+            self.expire(mili_unixtime)
+            return
+        if mili_unixtime <= self._now - self._window_ms:
+            return
+        # late fills are rare and close to the right end
+        i = len(fills)
+        while i > 0 and fills[i - 1][0] > mili_unixtime:
+            i -= 1
+        fills.insert(i, fill)
+        self._amount += fill[1]
+        self._notional += fill[2]
+
+    def expire(self, now_mili_unixtime: int) -> None:
+        """Moves the window forward to `now_mili_unixtime`.
+
+        The window never moves backwards; an earlier time is ignored.
+        """
+        if self._now is not None and now_mili_unixtime <= self._now:
+            return
+        self._now = now_mili_unixtime
+        cutoff = now_mili_unixtime - self._window_ms
+        fills = self._fills
+        while fills and fills[0][0] <= cutoff:
+            _, amount, notional = fills.popleft()
+            self._amount -= amount
+            self._notional -= notional
+        if not fills:
+            # do not carry float residuals into the next window
+            self._amount = 0.0
+            self._notional = 0.0
+
+    def get_volume(self, now_mili_unixtime: int = None) -> float:
+        """Returns the traded amount in the window.
+
+        Parameters
+        ----------
+        now_mili_unixtime : int
+            Default value is None.
+            If given the window is first moved forward to this time,
+            otherwise it ends at the latest fill.
+        """
+        if now_mili_unixtime is not None:
+            self.expire(now_mili_unixtime)
+        return self._amount
+
+    def get_notional(self, now_mili_unixtime: int = None) -> float:
+        """Returns the traded value (price * amount) in the window"""
+        if now_mili_unixtime is not None:
+            self.expire(now_mili_unixtime)
+        return self._notional
+
+    def get_vwap(self, now_mili_unixtime: int = None) -> float:
+        """Returns the volume weighted average price of the window, or 0 when empty"""
+        if now_mili_unixtime is not None:
+            self.expire(now_mili_unixtime)
+        if not self._fills:
+            return 0
+        return self._notional / self._amount
+
+
+class RollingWindowMetrics:
+
+    """Class to keep rolling-window aggregators of several window sizes.
+
+    It can be used as a fill listener of OrderHistoryCollection (see
+    `OrderHistoryCollection.rolling_metrics`).
+
+    Example
+    -------
+    >>> metrics = ohc.rolling_metrics([60 * 1000, 15 * 60 * 1000])
+    >>> metrics.get_vwap(15 * 60 * 1000, now_mili_unixtime=now)
+    >>> metrics[60 * 1000].get_volume(now)
+
+    """
+
+    def __init__(self, windows_ms, side: str = None):
+        """
+        Parameters
+        ----------
+        windows_ms : iterable
+            The window lengths in milliseconds.
+        side : str
+            Default value is None.
+            If 'BUY' or 'SELL' only the fills of that side are counted.
+        """
+        assert side in [None, 'BUY', 'SELL']
+        self._side = side
+        self._aggregators = dict(
+            (window_ms, RollingWindowAggregator(window_ms)) for window_ms in windows_ms
+            )
+        if not self._aggregators:
+            raise ValueError("Expected at least one window")
+
+    @property
+    def side(self) -> str:
+        return self._side
+
+    @property
+    def windows_ms(self) -> list:
+        return list(self._aggregators.keys())
+
+    def __getitem__(self, window_ms: int) -> RollingWindowAggregator:
+        return self._aggregators[window_ms]
+
+    def add_fill(self, mili_unixtime: int, side: str, amount: float, price: float) -> None:
+        if self._side is not None and side != self._side:
+            return
+        for aggregator in self._aggregators.values():
+            aggregator.add(mili_unixtime, amount, price)
+
+    def add_order(self, order: OrderHistory) -> None:
+        assert isinstance(order, OrderHistory)
+        self.add_fill(order.mili_unixtime, order.side, order.amount.number, order.price.number)
+
+    def __call__(self, order: OrderHistory) -> None:
+        self.add_order(order)
+
+    def expire(self, now_mili_unixtime: int) -> None:
+        for aggregator in self._aggregators.values():
+            aggregator.expire(now_mili_unixtime)
+
+    def get_volume(self, window_ms: int, now_mili_unixtime: int = None) -> float:
+        return self._aggregators[window_ms].get_volume(now_mili_unixtime)
+
+    def get_vwap(self, window_ms: int, now_mili_unixtime: int = None) -> float:
+        return self._aggregators[window_ms].get_vwap(now_mili_unixtime)
@@ -0,0 +1,93 @@
+"""A module for crash-safe snapshots of order history collections
+"""
+import os
+import json
+import tempfile
+
+
+def write_text_atomic(filepath: str, text: str, fsync: bool = True) -> None:
+    """Writes `text` to `filepath` atomically.
+
+    The text is written to a temporary file in the same directory, flushed
+    to disk and then renamed over `filepath`. A crash while writing leaves
+    the previous file untouched.
+
+    Parameters
+    ----------
+    filepath : str
+    text : str
+    fsync : bool
+        Default value is True.
+        If True the file and its directory are flushed with os.fsync.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_filepath = tempfile.mkstemp(
+        dir=directory,
+        prefix=os.path.basename(filepath) + '.',
+        suffix='.tmp',
+        )
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        # make the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_json_atomic(filepath: str, data, fsync: bool = True) -> None:
+    """Writes `data` as JSON to `filepath` atomically (see `write_text_atomic`).
+
+    Parameters
+    ----------
+    filepath : str
+    data :
+        Any JSON serializable object.
+    fsync : bool
+        Default value is True.
+        If True the file and its directory are flushed with os.fsync.
+    """
+    write_text_atomic(filepath, json.dumps(data), fsync=fsync)
+
+
+def write_snapshot(
+    filepath: str,
+    seq: int,
+    serialized_data: dict,
+    carried: dict = None,
+    fsync: bool = True,
+    ) -> None:
+    """Atomically writes a snapshot of serialized orders with its sequence number.
+
+    `seq` is the sequence number of the last journal entry included in the
+    snapshot. `carried` holds the aggregates of archived orders (see
+    OrderHistoryCollection.apply_retention).
+    """
+    data = {'seq': seq, 'data': serialized_data}
+    if carried is not None:
+        data['carried'] = carried
+    write_json_atomic(filepath, data, fsync=fsync)
+
+
+def read_snapshot(filepath: str):
+    """Reads a snapshot and returns the tuple (seq, serialized_data, carried).
+
+    Plain files written by OrderHistoryCollection.to_json are accepted as
+    snapshots with sequence number 0 and no carried aggregates.
+    """
+    with open(filepath, 'r') as f:
+        data = json.load(f)
+    if 'seq' in data and 'data' in data:
+        return int(data['seq']), data['data'], data.get('carried')
+    return 0, data, None
@@ -0,0 +1,482 @@
+"""A module for sorted indexes over collections of orders
+"""
+import itertools
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+
+
+class SortedIndex:
+
+    """Class to keep orders sorted by a numeric key.
+
+    The keys are kept in a plain list next to the orders, so range lookups
+    are a binary search. Inserting orders in key order (e.g. in time order)
+    is an append and costs amortized O(1).
+
+    Attributes
+    ----------
+    key : callable
+        Function which returns the sort key of an order. The default key
+        is the `mili_unixtime` attribute of the order.
+
+    Example
+    -------
+    >>> index = SortedIndex()
+    >>> index.insert(order)
+    >>> list(index.between(1650000000000, 1650000060000))
+
+    """
+
+    def __init__(self, key=attrgetter('mili_unixtime')):
+        self._key = key
+        self._keys = []
+        self._orders = []
+        self._version = 0
+
+    @property
+    def key(self):
+        """Returns the key function of the index"""
+        return self._key
+
+    @property
+    def keys(self) -> list:
+        """Returns the sorted list of keys (read only)"""
+        return self._keys
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __iter__(self):
+        return iter(self.view(0, len(self._orders)))
+
+    def insert(self, order) -> int:
+        """Inserts `order` and returns its position in the index.
+
+        Orders with equal keys keep their insertion order.
+        """
+        k = self._key(order)
+        if not self._keys or self._keys[-1] <= k:
+            position = len(self._keys)
+            self._keys.append(k)
+            self._orders.append(order)
+        else:
+            position = bisect_right(self._keys, k)
+            self._keys.insert(position, k)
+            self._orders.insert(position, order)
+        self._version += 1
+        return position
+
+    def extend(self, orders) -> None:
+        """Inserts many orders at once.
+
+        When the orders come in key order after the current last key they
+        are appended; otherwise the whole index is sorted once, which is
+        much cheaper than inserting the orders one by one.
+        """
+        orders = list(orders)
+        if not orders:
+            return
+        keys = [self._key(order) for order in orders]
+        in_order = (
+            (not self._keys or self._keys[-1] <= keys[0]) and
+            all(a <= b for a, b in zip(keys, keys[1:]))
+            )
+        self._keys.extend(keys)
+        self._orders.extend(orders)
+        self._extended(orders)
+        if in_order:
+            self._version += 1
+        else:
+            # a stable sort keeps the insertion order of equal keys
+            self._take(sorted(range(len(self._keys)), key=self._keys.__getitem__))
+
+    def _extended(self, orders: list) -> None:
+        """Called after `orders` are appended to the end of the index"""
+        pass
+
+    def remove(self, order) -> int:
+        """Removes `order` from the index and returns its old position.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when `order` is not in the index.
+        """
+        k = self._key(order)
+        position = bisect_left(self._keys, k)
+        n = len(self._keys)
+        while position < n and self._keys[position] == k:
+            if self._orders[position] is order:
+                break
+            position += 1
+        else:
+            # the key of the order was changed after it was inserted
+            position = next(
+                (i for i, o in enumerate(self._orders) if o is order),
+                None,
+                )
+            if position is None:
+                raise ValueError(f"{order!r} is not in the index")
+        del self._keys[position]
+        del self._orders[position]
+        self._version += 1
+        return position
+
+    def remove_all(self, orders) -> None:
+        """Removes all of the given orders in a single pass over the index.
+        """
+        removed = set(map(id, orders))
+        if not removed:
+            return
+        self._take([i for i, o in enumerate(self._orders) if id(o) not in removed])
+
+    def _take(self, positions: list) -> None:
+        """Keeps only the orders at the given positions, in the given order"""
+        self._keys = [self._keys[i] for i in positions]
+        self._orders = [self._orders[i] for i in positions]
+        self._version += 1
+
+    def view(self, start: int, stop: int):
+        """Returns a view over the positions `start` to `stop` of the index.
+        """
+        return SortedIndexView(self, start, stop)
+
+    def between(self, low, high):
+        """Returns a view of the orders with `low` <= key <= `high`"""
+        return self.view(
+            bisect_left(self._keys, low),
+            bisect_right(self._keys, high),
+            )
+
+    def before(self, key):
+        """Returns a view of the orders with key <= `key`"""
+        return self.view(0, bisect_right(self._keys, key))
+
+    def after(self, key):
+        """Returns a view of the orders with key > `key`"""
+        return self.view(bisect_right(self._keys, key), len(self._keys))
+
+
+class CumulativeSortedIndex(SortedIndex):
+
+    """Class to keep orders sorted by a key together with prefix sums.
+
+    For every measure (a function of an order which returns a number) the
+    index keeps the measure of each order in key order, split in blocks of
+    at most 2 * BLOCK_SIZE values, with Fenwick trees over the lengths and
+    the sums of the blocks. Inserting or removing an order anywhere in the
+    index and the sum of a measure over all orders with key <= k all cost
+    O(log n) (plus a pass over a single block), so an old active order
+    becoming done is as cheap as a new one.
+
+    Orders can be dropped with `carry_forward` while their measures are
+    kept in a base sum, so the sums stay exact for every key at or after
+    the last dropped key (the horizon).
+
+    Attributes
+    ----------
+    measures : dict
+        Mapping of measure name to a function of an order.
+
+    Example
+    -------
+    >>> index = CumulativeSortedIndex({'value': OrderHistory.get_value})
+    >>> index.insert(order)
+    >>> index.sum_before(1650000000000, 'value')
+
+    """
+
+    BLOCK_SIZE = 256
+
+    def __init__(self, measures: dict, key=attrgetter('mili_unixtime')):
+        super().__init__(key=key)
+        self._measures = dict(measures)
+        # the measures of the orders in key order, in blocks which are
+        # the same for all the measures
+        self._blocks = dict((name, []) for name in self._measures)
+        self._block_lengths = []
+        # Fenwick trees (1-based) over the block lengths and block sums
+        self._length_tree = [0]
+        self._sum_trees = dict((name, [0.0]) for name in self._measures)
+        # sums of the measures of the orders dropped by carry_forward
+        self._base = dict((name, 0.0) for name in self._measures)
+        self._horizon = None
+
+    @property
+    def measures(self) -> dict:
+        """Returns the measures of the index"""
+        return self._measures
+
+    @property
+    def horizon(self):
+        """Returns the biggest key of the dropped orders or None"""
+        return self._horizon
+
+    def base(self, name: str) -> float:
+        """Returns the carried-forward sum of a measure"""
+        return self._base[name]
+
+    def add_base(self, base: dict, horizon) -> None:
+        """Adds carried-forward sums (e.g. read from a snapshot) to the base sums"""
+        assert set(base.keys()) == set(self._measures.keys())
+        for name, value in base.items():
+            self._base[name] += value
+        if horizon is not None and (self._horizon is None or horizon > self._horizon):
+            self._horizon = horizon
+
+    def carry_forward(self, orders) -> None:
+        """Removes `orders` from the index keeping their measures in the base sums.
+        """
+        orders = list(orders)
+        if not orders:
+            return
+        for name, measure in self._measures.items():
+            self._base[name] += sum(map(measure, orders))
+        horizon = max(map(self._key, orders))
+        if self._horizon is None or horizon > self._horizon:
+            self._horizon = horizon
+        self.remove_all(orders)
+
+    def _check_horizon(self, key) -> None:
+        if self._horizon is not None and key < self._horizon:
+            raise ValueError(
+                f"The sums before {self._horizon} are not available because "
+                "the orders before it were carried forward"
+                )
+
+    @staticmethod
+    def _rebuild_tree_from(tree: list, block: int, values: list) -> None:
+        """Replaces the nodes of the blocks from `block` on by the sums `values`.
+
+        The nodes of the blocks before `block` do not depend on the later
+        blocks and are kept, so the cost is O(len(values) + log n).
+        """
+        del tree[block + 1:]
+        tree.extend(values)
+        n = len(tree) - 1
+        # the kept nodes which are children of the new nodes
+        i = block
+        while i > 0:
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+            i -= i & -i
+        for i in range(block + 1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+
+    @staticmethod
+    def _add_to_tree(tree: list, block: int, delta) -> None:
+        i = block + 1
+        n = len(tree) - 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    @staticmethod
+    def _tree_prefix(tree: list, n_blocks: int):
+        """Returns the sum of the first `n_blocks` blocks"""
+        total = 0
+        i = n_blocks
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _rebuild_trees_from(self, block: int) -> None:
+        """Rebuilds the tree nodes of the blocks from `block` on"""
+        self._rebuild_tree_from(self._length_tree, block, self._block_lengths[block:])
+        for name, blocks in self._blocks.items():
+            self._rebuild_tree_from(self._sum_trees[name], block, [sum(values) for values in blocks[block:]])
+
+    def _rebuild(self, values: dict) -> None:
+        """Splits the flat lists of measures `values` into new blocks"""
+        size = self.BLOCK_SIZE
+        n = len(self._keys)
+        for name in self._measures:
+            flat = values[name]
+            self._blocks[name] = [flat[i:i + size] for i in range(0, n, size)]
+        self._block_lengths = [min(size, n - i) for i in range(0, n, size)]
+        self._rebuild_trees_from(0)
+
+    def _flat_values(self, name: str):
+        return itertools.chain.from_iterable(self._blocks[name])
+
+    def _locate(self, position: int) -> tuple:
+        """Returns the (block, offset) of a position by a descent of the length tree.
+
+        A position after the last value is located at the end of the last
+        block.
+        """
+        tree = self._length_tree
+        n_blocks = len(tree) - 1
+        block = 0
+        rest = position
+        step = 1 << (n_blocks.bit_length() - 1) if n_blocks else 0
+        while step:
+            j = block + step
+            if j <= n_blocks and tree[j] <= rest:
+                block = j
+                rest -= tree[j]
+            step >>= 1
+        if block == n_blocks and n_blocks:
+            return n_blocks - 1, self._block_lengths[-1]
+        return block, rest
+
+    def insert(self, order) -> int:
+        position = super().insert(order)
+        if not self._block_lengths:
+            self._rebuild(dict((name, [measure(order)]) for name, measure in self._measures.items()))
+            return position
+        block, offset = self._locate(position)
+        for name, measure in self._measures.items():
+            value = measure(order)
+            self._blocks[name][block].insert(offset, value)
+            self._add_to_tree(self._sum_trees[name], block, value)
+        self._block_lengths[block] += 1
+        self._add_to_tree(self._length_tree, block, 1)
+        if self._block_lengths[block] > 2 * self.BLOCK_SIZE:
+            self._split_block(block)
+        return position
+
+    def _split_block(self, block: int) -> None:
+        half = self._block_lengths[block] // 2
+        for blocks in self._blocks.values():
+            values = blocks[block]
+            blocks[block:block + 1] = [values[:half], values[half:]]
+        length = self._block_lengths[block]
+        self._block_lengths[block:block + 1] = [half, length - half]
+        # only the blocks from the split one on move, so splitting the last
+        # block (appends in key order) costs O(log n)
+        self._rebuild_trees_from(block)
+
+    def _extended(self, orders: list) -> None:
+        size = self.BLOCK_SIZE
+        # the first block which receives values
+        first = len(self._block_lengths)
+        if first and self._block_lengths[-1] < size:
+            first -= 1
+        for name, measure in self._measures.items():
+            values = list(map(measure, orders))
+            blocks = self._blocks[name]
+            if blocks and len(blocks[-1]) < size:
+                room = size - len(blocks[-1])
+                blocks[-1].extend(values[:room])
+                values = values[room:]
+            blocks.extend(values[i:i + size] for i in range(0, len(values), size))
+        self._block_lengths = [len(block) for block in next(iter(self._blocks.values()), [])]
+        self._rebuild_trees_from(first)
+
+    def remove(self, order) -> int:
+        position = super().remove(order)
+        block, offset = self._locate(position)
+        for name, blocks in self._blocks.items():
+            value = blocks[block].pop(offset)
+            self._add_to_tree(self._sum_trees[name], block, -value)
+        self._block_lengths[block] -= 1
+        self._add_to_tree(self._length_tree, block, -1)
+        if self._block_lengths[block] == 0:
+            for blocks in self._blocks.values():
+                del blocks[block]
+            del self._block_lengths[block]
+            self._rebuild_trees_from(block)
+        return position
+
+    def _take(self, positions: list) -> None:
+        values = {}
+        for name in self._measures:
+            flat = list(self._flat_values(name))
+            values[name] = [flat[i] for i in positions]
+        super()._take(positions)
+        self._rebuild(values)
+
+    def _prefix(self, position: int, name: str) -> float:
+        """Returns the base plus the sum of the first `position` values"""
+        if position == 0:
+            return self._base[name]
+        block, offset = self._locate(position)
+        return (
+            self._base[name]
+            + self._tree_prefix(self._sum_trees[name], block)
+            + sum(self._blocks[name][block][:offset])
+            )
+
+    def cumsums(self, name: str) -> list:
+        """Returns the running sums of a measure in key order as a new list
+
+        The running sums include the carried-forward base sum.
+        """
+        cumsums = list(itertools.accumulate(self._flat_values(name), initial=self._base[name]))
+        return cumsums[1:]
+
+    def total(self, name: str) -> float:
+        """Returns the sum of a measure over all orders"""
+        return self._base[name] + self._tree_prefix(self._sum_trees[name], len(self._block_lengths))
+
+    def sum_before(self, key, name: str) -> float:
+        """Returns the sum of a measure over the orders with key <= `key`
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when `key` is before the horizon.
+        """
+        self._check_horizon(key)
+        return self._prefix(bisect_right(self._keys, key), name)
+
+
+class SortedIndexView:
+
+    """Class to represent a contiguous range of a SortedIndex.
+
+    A view does not copy the orders. It is only valid as long as the index
+    is not changed; using a view after the index is changed raises a
+    RuntimeError, similar to changing a dict during iteration.
+    """
+
+    def __init__(self, index: SortedIndex, start: int, stop: int):
+        self._index = index
+        self._start = start
+        self._stop = max(start, stop)
+        self._version = index._version
+
+    def _check(self) -> None:
+        if self._index._version != self._version:
+            raise RuntimeError("SortedIndex changed after the view was created")
+
+    @property
+    def keys(self) -> list:
+        """Returns the keys of the orders in the view as a new list"""
+        self._check()
+        return self._index._keys[self._start:self._stop]
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __iter__(self):
+        self._check()
+        orders = self._index._orders
+        for i in range(self._start, self._stop):
+            self._check()
+            yield orders[i]
+
+    def __getitem__(self, item):
+        self._check()
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            assert step == 1, "Only contiguous slices of a view are supported"
+            return SortedIndexView(self._index, self._start + start, self._start + stop)
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("SortedIndexView index out of range")
+        return self._index._orders[self._start + item]
+
+    def to_list(self) -> list:
+        """Returns the orders in the view as a new list"""
+        self._check()
+        return self._index._orders[self._start:self._stop]
+
+    def __repr__(self) -> str:
+        return f"SortedIndexView(start={self._start}, stop={self._stop})"
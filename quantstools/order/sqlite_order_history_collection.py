@@ -0,0 +1,586 @@
+"""A module for order history collections stored in SQLite
+"""
+import os
+import json
+import sqlite3
+import logging
+import itertools
+from .price import Price
+from .amount import Amount
+from .symbol import Symbol
+from .order_history import OrderHistory
+from .columnar import ColumnarOrderHistory
+from .snapshot import write_json_atomic
+from .order_history_collection import (
+    OrderHistoryCollection,
+    STATUS_RANK_ACTIVE,
+    STATUS_RANK_CANCELLED,
+    STATUS_RANK_DONE,
+)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id_ TEXT PRIMARY KEY,
+        side INTEGER NOT NULL,
+        type_ TEXT NOT NULL,
+        price REAL NOT NULL,
+        price_digits INTEGER NOT NULL,
+        price_precision INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        amount_digits INTEGER NOT NULL,
+        amount_precision INTEGER NOT NULL,
+        mili_unixtime INTEGER NOT NULL,
+        status INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS orders_mili_unixtime ON orders (mili_unixtime)",
+    "CREATE INDEX IF NOT EXISTS orders_status_mili_unixtime ON orders (status, mili_unixtime)",
+]
+COLUMNS = (
+    'id_, side, type_, price, price_digits, price_precision, '
+    'amount, amount_digits, amount_precision, mili_unixtime, status'
+)
+# SQLite allows at most 999 variables in a statement on old versions
+MAX_VARIABLES = 999
+
+
+def _get_status(is_active: bool, is_cancelled: bool) -> int:
+    if is_active:
+        return STATUS_RANK_ACTIVE
+    elif is_cancelled:
+        return STATUS_RANK_CANCELLED
+    else:
+        return STATUS_RANK_DONE
+
+
+class SQLiteOrderHistoryCollection:
+
+    """Class with the API of OrderHistoryCollection which keeps the orders in SQLite.
+
+    The orders are stored in a table of a local SQLite file, indexed by id,
+    by status and mili_unixtime, and by mili_unixtime, so the size of the
+    history is not limited by memory and the same file can be opened by
+    several processes. The aggregates (`get_total_value`,
+    `get_total_amount`, `get_avg_price`, `get_total_profit`) and the time
+    filters are computed by SQL queries. OrderHistory objects are only
+    created for the orders which are returned.
+
+    `query`, `get_position`, `deserialize`, `__str__` and `to_text` work
+    like those of OrderHistoryCollection. Like `filter_by_mili_unixtime`,
+    `__add__` and `deserialize` (unless `inplace`) return a new in-memory
+    OrderHistoryCollection. The journal, snapshots and `apply_retention`
+    are only supported by OrderHistoryCollection.
+
+    The `active_orders`, `done_orders` and `cancelled_orders` properties
+    load the whole bucket into a set; use `iter_active`, `iter_done` and
+    `iter_cancelled` to stream large buckets instead.
+
+    Attributes
+    ----------
+    symbol : Symbol
+    filepath : str
+        Path of the SQLite file, or ':memory:'.
+
+    Example
+    -------
+    >>> ohc = SQLiteOrderHistoryCollection(symbol, 'order_history_collection.sqlite')
+    >>> ohc.add_order_history(orders)
+    >>> ohc.get_total_value(mili_unixtime__lte=1650000000000)
+
+    """
+
+    def __init__(
+        self,
+        symbol: Symbol,
+        filepath: str = 'order_history_collection.sqlite',
+        batch_size: int = 10000,
+        ) -> None:
+        """
+        Parameters
+        ----------
+        symbol : Symbol
+        filepath : str
+            Default value is 'order_history_collection.sqlite'.
+            The file is created if it does not exist.
+        batch_size : int
+            Default value is 10000.
+            Number of rows written by one executemany call.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when the file holds orders of another symbol.
+        """
+        self._symbol = symbol
+        self._filepath = filepath
+        self._batch_size = batch_size
+        self._connection = sqlite3.connect(filepath)
+        if filepath != ':memory:':
+            # readers of other processes are not blocked by a writer
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+            self._connection.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('symbol', ?)",
+                (symbol.symbol,),
+                )
+        stored_symbol = self._connection.execute(
+            "SELECT value FROM meta WHERE key = 'symbol'"
+            ).fetchone()[0]
+        if stored_symbol != symbol.symbol:
+            self.close()
+            raise ValueError(
+                f"The file '{filepath}' holds orders of symbol = {stored_symbol} "
+                f"but the collection symbol is {symbol.symbol}"
+                )
+
+    @property
+    def symbol(self) -> Symbol:
+        return self._symbol
+
+    @property
+    def filepath(self) -> str:
+        return self._filepath
+
+    @property
+    def active_orders(self) -> set:
+        return set(self.iter_active())
+
+    @property
+    def done_orders(self) -> set:
+        return set(self.iter_done())
+
+    @property
+    def cancelled_orders(self) -> set:
+        return set(self.iter_cancelled())
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _to_row(self, order: OrderHistory) -> tuple:
+        assert isinstance(order, OrderHistory)
+        return (
+            order.id_,
+            1 if order.side == 'BUY' else -1,
+            order.type_,
+            order.price.number,
+            order.price.digits,
+            order.price.precision,
+            order.amount.number,
+            order.amount.digits,
+            order.amount.precision,
+            order.mili_unixtime,
+            _get_status(order.is_active, order.is_cancelled),
+        )
+
+    def _to_order(self, row: tuple) -> OrderHistory:
+        (
+            id_, side, type_,
+            price, price_digits, price_precision,
+            amount, amount_digits, amount_precision,
+            mili_unixtime, status,
+        ) = row
+        return OrderHistory(
+            id_=id_,
+            symbol=self._symbol,
+            side='BUY' if side > 0 else 'SELL',
+            price=Price(price, price_digits, price_precision),
+            amount=Amount(amount, amount_digits, amount_precision),
+            mili_unixtime=mili_unixtime,
+            is_active=status == STATUS_RANK_ACTIVE,
+            is_cancelled=status == STATUS_RANK_CANCELLED,
+            type_=type_,
+        )
+
+    def _select(self, where: str = '', parameters: tuple = (), order_by_time: bool = False):
+        query = f"SELECT {COLUMNS} FROM orders"
+        if where:
+            query += f" WHERE {where}"
+        if order_by_time:
+            query += " ORDER BY mili_unixtime, rowid"
+        for row in self._connection.execute(query, parameters):
+            yield self._to_order(row)
+
+    def _insert_rows(self, rows) -> None:
+        """Writes the rows with one executemany call per batch and one commit"""
+        rows = iter(rows)
+        with self._connection:
+            while True:
+                batch = list(itertools.islice(rows, self._batch_size))
+                if not batch:
+                    break
+                self._connection.executemany(
+                    f"INSERT OR REPLACE INTO orders ({COLUMNS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch,
+                    )
+
+    def _count(self, where: str = '', parameters: tuple = ()) -> int:
+        query = "SELECT COUNT(*) FROM orders"
+        if where:
+            query += f" WHERE {where}"
+        return self._connection.execute(query, parameters).fetchone()[0]
+
+    def __len__(self):
+        return self._count()
+
+    def __iter__(self):
+        """Iterates over the active and done orders (see `iter_all` for all)"""
+        return self._select("status IN (?, ?)", (STATUS_RANK_ACTIVE, STATUS_RANK_DONE))
+
+    def iter_active(self):
+        return self._select("status = ?", (STATUS_RANK_ACTIVE,))
+
+    def iter_done(self):
+        return self._select("status = ?", (STATUS_RANK_DONE,))
+
+    def iter_cancelled(self):
+        return self._select("status = ?", (STATUS_RANK_CANCELLED,))
+
+    def iter_all(self):
+        return self._select()
+
+    def iter_by_time(self, done_only: bool = False):
+        """Iterates over the orders in time order using the time indexes"""
+        if done_only:
+            return self._select("status = ?", (STATUS_RANK_DONE,), order_by_time=True)
+        return self._select(order_by_time=True)
+
+    def add_order_history(self, order):
+        if isinstance(order, OrderHistory):
+            self._insert_rows([self._to_row(order)])
+        else:
+            # if it is not OrderHistory
+            # it must be iterable of OrderHistory objects
+            self._insert_rows(self._to_row(order_) for order_ in order)
+
+    def get(self, id_: str, default=None) -> OrderHistory:
+        """Returns the order with the given id or `default` if there is none.
+        """
+        for order in self._select("id_ = ?", (id_,)):
+            return order
+        return default
+
+    def contains(self, id_: str) -> bool:
+        """Returns whether an order with the given id is in the collection.
+        """
+        return self._count("id_ = ?", (id_,)) > 0
+
+    def update_status(self, id_: str, is_active: bool, is_cancelled: bool) -> OrderHistory:
+        """Updates the status of the order with the given id.
+
+        Returns
+        -------
+            : OrderHistory
+            The updated order.
+
+        Raises
+        ------
+        KeyError
+            Raises KeyError when there is no order with the given id.
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                "UPDATE orders SET status = ? WHERE id_ = ?",
+                (_get_status(is_active, is_cancelled), id_),
+                )
+        if cursor.rowcount == 0:
+            raise KeyError(id_)
+        return self.get(id_)
+
+    def _get_statuses(self, ids: list) -> dict:
+        statuses = {}
+        for i in range(0, len(ids), MAX_VARIABLES):
+            chunk = ids[i:i + MAX_VARIABLES]
+            query = (
+                "SELECT id_, status FROM orders "
+                f"WHERE id_ IN ({', '.join('?' * len(chunk))})"
+                )
+            statuses.update(self._connection.execute(query, chunk))
+        return statuses
+
+    def upsert_rows(
+        self,
+        rows,
+        to_order_history,
+        id_key: str = 'id_',
+        is_active_key: str = 'is_active',
+        is_cancelled_key: str = 'is_cancelled',
+        ) -> set:
+        """Inserts new orders and updates the status of known ones from raw rows.
+
+        See OrderHistoryCollection.upsert_rows. The statuses of the known
+        orders are read with one query per batch of ids.
+
+        Returns
+        -------
+            : set
+            The ids of the orders which were added or changed.
+        """
+        rows = list(rows)
+        statuses = self._get_statuses(list(set(row[id_key] for row in rows)))
+        changed_ids = set()
+        new_rows = []
+        status_updates = []
+        for row in rows:
+            id_ = row[id_key]
+            status = _get_status(row[is_active_key], row[is_cancelled_key])
+            if id_ not in statuses:
+                new_rows.append(self._to_row(to_order_history(row)))
+            elif statuses[id_] != status:
+                status_updates.append((status, id_))
+            else:
+                continue
+            statuses[id_] = status
+            changed_ids.add(id_)
+        self._insert_rows(new_rows)
+        with self._connection:
+            self._connection.executemany(
+                "UPDATE orders SET status = ? WHERE id_ = ?",
+                status_updates,
+                )
+        return changed_ids
+
+    def filter_by_mili_unixtime(self, mili_unixtime__lte=None):
+        """Returns the orders with mili_unixtime <= the given time.
+
+        The orders are selected by SQL and returned in a new (in-memory)
+        OrderHistoryCollection.
+        """
+        if mili_unixtime__lte is None:
+            return self
+        else:
+            new_ohc = OrderHistoryCollection(self.symbol)
+            new_ohc._add_order_histories(self.before(mili_unixtime__lte))
+            return new_ohc
+
+    def between(self, mili_unixtime__gte: int, mili_unixtime__lte: int) -> list:
+        """Returns the orders with time in the given closed range, in time order.
+        """
+        return list(
+            self._select(
+                "mili_unixtime BETWEEN ? AND ?",
+                (mili_unixtime__gte, mili_unixtime__lte),
+                order_by_time=True,
+                )
+            )
+
+    def before(self, mili_unixtime__lte: int) -> list:
+        """Returns the orders with mili_unixtime <= the given time, in time order.
+        """
+        return list(self._select("mili_unixtime <= ?", (mili_unixtime__lte,), order_by_time=True))
+
+    def after(self, mili_unixtime__gt: int) -> list:
+        """Returns the orders with mili_unixtime > the given time, in time order.
+        """
+        return list(self._select("mili_unixtime > ?", (mili_unixtime__gt,), order_by_time=True))
+
+    def _sum_done(self, expression: str, mili_unixtime__lte=None) -> float:
+        query = f"SELECT TOTAL({expression}) FROM orders WHERE status = ?"
+        parameters = (STATUS_RANK_DONE,)
+        if mili_unixtime__lte is not None:
+            query += " AND mili_unixtime <= ?"
+            parameters += (mili_unixtime__lte,)
+        return self._connection.execute(query, parameters).fetchone()[0]
+
+    def get_total_value(self, mili_unixtime__lte=None):
+        # each value is rounded like OrderHistory.get_value before the sum
+        return self._sum_done("ROUND(side * ABS(amount) * price, price_precision)", mili_unixtime__lte)
+
+    def get_total_amount(self, mili_unixtime__lte=None):
+        return self._sum_done("amount", mili_unixtime__lte)
+
+    def get_position(self, mili_unixtime__lte=None) -> float:
+        """Returns the signed amount of the done orders (BUY minus SELL)"""
+        return self._sum_done("side * ABS(amount)", mili_unixtime__lte)
+
+    def get_avg_price(self, mili_unixtime_lte=None) -> float:
+        total_value = self.get_total_value(mili_unixtime__lte=mili_unixtime_lte)
+        total_amount = self.get_total_amount(mili_unixtime__lte=mili_unixtime_lte)
+        if total_amount == 0:
+            return 0
+        return total_value / total_amount
+
+    def get_total_profit(self, sell_price: float = None, mili_unixtime_lte: int = None):
+        total_value = self.get_total_value(mili_unixtime__lte=mili_unixtime_lte)
+        total_amount = self.get_total_amount(mili_unixtime__lte=mili_unixtime_lte)
+        if total_amount == 0.0:
+            return total_value
+        else:
+            if sell_price is None:
+                raise ValueError("Sell Price must be provided when total amount is not zero")
+            return sell_price * total_amount - total_value
+
+    def query(
+        self,
+        side: str = None,
+        status=None,
+        price_between: tuple = None,
+        time_between: tuple = None,
+        columnar: bool = False,
+        ):
+        """Returns the orders which match all the given predicates.
+
+        See OrderHistoryCollection.query. The predicates are turned into
+        one SQL query, which uses the status and time indexes.
+
+        Returns
+        -------
+            : list or ColumnarOrderHistory
+            The orders sorted by mili_unixtime.
+
+        Raises
+        ------
+        ValueError
+            Raises ValueError when a predicate is not valid.
+        """
+        statuses, price_between, time_between = OrderHistoryCollection._check_query(
+            side, status, price_between, time_between
+            )
+        conditions = []
+        parameters = ()
+        if side is not None:
+            conditions.append("side = ?")
+            parameters += (1 if side == 'BUY' else -1,)
+        if statuses is not None:
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            parameters += tuple(_get_status(s == 'active', s == 'cancelled') for s in statuses)
+        for column, between in [('price', price_between), ('mili_unixtime', time_between)]:
+            if between is not None:
+                # the open ends are not compared, so the time index is
+                # used for the ranges of integers
+                low, high = between
+                if low != float('-inf'):
+                    conditions.append(f"{column} >= ?")
+                    parameters += (low,)
+                if high != float('inf'):
+                    conditions.append(f"{column} <= ?")
+                    parameters += (high,)
+        result = list(self._select(' AND '.join(conditions), parameters, order_by_time=True))
+        if columnar:
+            return ColumnarOrderHistory.from_orders(self.symbol, result)
+        return result
+
+    def __add__(self, other):
+        """Returns the orders of both collections in a new OrderHistoryCollection.
+
+        Conflicts are resolved like in OrderHistoryCollection.merge_inplace:
+        the order with the most advanced status is kept, and on a tie the
+        order of this collection.
+        """
+        assert isinstance(other, (OrderHistoryCollection, SQLiteOrderHistoryCollection))
+        assert self.symbol.symbol == other.symbol.symbol
+        oc = OrderHistoryCollection(symbol=self.symbol)
+        oc._merge_orders(self.iter_by_time())
+        if isinstance(other, OrderHistoryCollection):
+            oc.merge_many([other])
+        else:
+            oc._merge_orders(other.iter_by_time())
+        return oc
+
+    def clean(self):
+        """Removes cancelled orders"""
+        with self._connection:
+            self._connection.execute("DELETE FROM orders WHERE status = ?", (STATUS_RANK_CANCELLED,))
+
+    def serialize(self):
+        serialized_data = {}
+        for order_category, status in [
+            ("active_orders", STATUS_RANK_ACTIVE),
+            ("done_orders", STATUS_RANK_DONE),
+            ("cancelled_orders", STATUS_RANK_CANCELLED),
+            ]:
+            serialized_data[order_category] = [
+                order.serialize()
+                for order in self._select("status = ?", (status,), order_by_time=True)
+            ]
+        return serialized_data
+
+    def deserialize(self, serialized_data, inplace=False):
+        """Creates the orders of data written by `serialize`.
+
+        Returns
+        -------
+            : SQLiteOrderHistoryCollection or OrderHistoryCollection
+            This collection with the orders added when `inplace` is True,
+            otherwise a new in-memory OrderHistoryCollection.
+        """
+        assert {"active_orders", "done_orders", "cancelled_orders"} == set(serialized_data.keys())
+        o = OrderHistoryCollection(self.symbol)._order_history_template()
+        orders = (
+            o.deserialize(data)
+            for order_category in ["active_orders", "done_orders", "cancelled_orders"]
+            for data in serialized_data[order_category]
+            )
+        if inplace is True:
+            self.add_order_history(orders)
+            return self
+        else:
+            oc = OrderHistoryCollection(self.symbol)
+            for order in orders:
+                oc.add_order_history(order)
+            return oc
+
+    def to_json(self, filepath='order_history_collection.json'):
+        write_json_atomic(filepath, self.serialize())
+
+    def _iter_text(self):
+        yield "=============== ORDER HISTORY COLLECTION ===============\n"
+        for title, status in [
+            ("Done Orders", STATUS_RANK_DONE),
+            ("Active Orders", STATUS_RANK_ACTIVE),
+            ("Cancelled Orders", STATUS_RANK_CANCELLED),
+            ]:
+            yield f"--------------- {title} ---------------\n"
+            for o in self._select("status = ?", (status,), order_by_time=True):
+                yield str(o) + "\n"
+        yield self.get_report()
+
+    def to_text(self, filepath='order_history_collection.txt'):
+        # the orders are written as they are read, without building the
+        # whole text in memory
+        with open(filepath, 'w') as f:
+            f.writelines(self._iter_text())
+
+    def __str__(self) -> str:
+        return ''.join(self._iter_text())
+
+    def load_json(self, filepath='order_history_collection.json'):
+        """Adds the orders of a JSON file written by `to_json` to this collection.
+
+        Returns
+        -------
+        self : SQLiteOrderHistoryCollection
+        """
+        if not os.path.exists(filepath):
+            logging.warning(f"json filepath = '{filepath}', does not exists")
+            return self
+        with open(filepath, 'r') as f:
+            serialized_data = json.load(f)
+        return self.deserialize(serialized_data, inplace=True)
+
+    def get_report(self):
+        s = " ==================== SUMMARY ====================\n"
+        s += "Order Status".ljust(20) + " | " + "#".ljust(6) + "\n"
+        s += "Done Orders".ljust(20) + " | " + f"{self._count('status = ?', (STATUS_RANK_DONE,))}".ljust(6) + "\n"
+        s += "Active Orders".ljust(20) + " | " + f"{self._count('status = ?', (STATUS_RANK_ACTIVE,))}".ljust(6) + "\n"
+        s += "Cancelled Orders".ljust(20) + " | " + f"{self._count('status = ?', (STATUS_RANK_CANCELLED,))}".ljust(6) + "\n"
+        s += "     -------------------------     \n"
+        s += f"Total Amount = {self.get_total_amount()}\n"
+        s += f"Total Value = {self.get_total_value()}\n"
+        s += f"Average Price = {self.get_avg_price()}\n"
+        return s
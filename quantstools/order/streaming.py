@@ -0,0 +1,125 @@
+"""A module to read serialized order history collections incrementally
+"""
+import os
+import json
+import codecs
+
+WHITESPACE = ' \t\n\r'
+
+
+class SerializedOrderHistoryReader:
+
+    """Class to read a JSON file written by OrderHistoryCollection.to_json.
+
+    The file is read in chunks of `chunk_size` bytes and every order record
+    is decoded as soon as it is complete, so the memory in use is bounded by
+    the chunk size plus the size of one record, whatever the size of the
+    file. The expected layout is the one of OrderHistoryCollection.serialize:
+
+        {"active_orders": [{...}, ...], "done_orders": [...], "cancelled_orders": [...]}
+
+    Example
+    -------
+    >>> reader = SerializedOrderHistoryReader('order_history_collection.json')
+    >>> for category, data in reader:
+    ...     print(category, data['id_'])
+
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        chunk_size: int = 1 << 16,
+        progress=None,
+        ):
+        """
+        Parameters
+        ----------
+        filepath : str
+            Path of the JSON file.
+        chunk_size : int
+            Default value is 65536.
+            Number of bytes read from the file at a time.
+        progress : callable
+            Default value is None.
+            If given, it is called as `progress(bytes_read, total_bytes)`
+            after each chunk is read.
+
+        """
+        self._filepath = filepath
+        self._chunk_size = chunk_size
+        self._progress = progress
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Reads one more chunk into the buffer; returns False at the end of file"""
+        if self._eof:
+            return False
+        data = self._file.read(self._chunk_size)
+        if self._position:
+            # drop the part of the buffer which is already consumed
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
+        self._buffer += self._text_decoder.decode(data, final=not data)
+        if not data:
+            self._eof = True
+        if self._progress is not None:
+            self._progress(self._file.tell(), self._total_bytes)
+        return bool(data)
+
+    def _peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it"""
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in WHITESPACE:
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char == '' or char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} at character {self._position} "
+                f"of the buffer but got {char!r} in '{self._filepath}'"
+                )
+        self._position += 1
+        return char
+
+    def _decode(self):
+        """Decodes the next JSON value, reading more chunks as needed"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self._position = end
+            return value
+
+    def __iter__(self):
+        self._total_bytes = os.path.getsize(self._filepath)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._position = 0
+        self._eof = False
+        with open(self._filepath, 'rb') as self._file:
+            self._expect('{')
+            if self._peek() == '}':
+                return
+            while True:
+                category = self._decode()
+                self._expect(':')
+                self._expect('[')
+                if self._peek() == ']':
+                    self._position += 1
+                else:
+                    while True:
+                        yield category, self._decode()
+                        if self._expect(',]') == ']':
+                            break
+                if self._expect(',}') == '}':
+                    return
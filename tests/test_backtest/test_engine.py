@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+from quantstools.order import Symbol, OrderManager
+from quantstools.backtest import find_first_crossing, LadderBacktest
+
+
+def test_find_first_crossing():
+    values = np.arange(5000, dtype=float)
+    assert find_first_crossing(values, 3000.0, below=False) == 3000
+    assert find_first_crossing(values, 10.0, start=20, below=True) == 5000
+    assert find_first_crossing(values[::-1], 10.0, start=20, below=True) == 4989
+    assert find_first_crossing(values, 1.0, start=5000) == 5000
+
+
+class TestLadderBacktest:
+
+    def make_manager(self):
+        return OrderManager(Symbol('BTC-USDT', 12, 2, 12, 6), 12, 6)
+
+    def test_run(self):
+        m = self.make_manager()
+        backtest = LadderBacktest(m, 1.0, n_orders=2, price_decrement_rate=0.01, take_profit_rate=0.01)
+        ladder = m.generate_buy_limit_orders_triangle(99.0, 1.0, n_orders=2)
+        p0, p1 = [o.price.number for o in ladder]
+        a0, a1 = [o.amount.number for o in ladder]
+        closes = [100.0, 100.0, 98.9, 97.0, 99.0, 100.0, 100.0]
+        times = [1000 * i for i in range(len(closes))]
+        report = backtest.run(times, closes)
+        avg_price = (p0 * a0 + p1 * a1) / (a0 + a1)
+        target = round(avg_price * 1.01, 2)
+        assert report['n_fills'] == 3
+        assert report['n_cycles'] == 1
+        assert report['n_ladders'] == 2
+        assert report['position'] == pytest.approx(0)
+        assert report['max_position'] == pytest.approx(a0 + a1)
+        assert report['realized_pnl'] == pytest.approx((target - avg_price) * (a0 + a1))
+        assert report['total_pnl'] == pytest.approx(report['realized_pnl'])
+        done = sorted(m.ohc.done_orders, key=lambda o: o.id_)
+        assert [(o.side, o.price.number, o.mili_unixtime) for o in done] == [
+            ('BUY', p0, 2000),
+            ('BUY', p1, 3000),
+            ('SELL', target, 5000),
+        ]
+
+    def test_run_with_lows_highs_and_fee(self):
+        m = self.make_manager()
+        backtest = LadderBacktest(m, 1.0, n_orders=3, price_decrement_rate=0.01, fee=0.001)
+        closes = [100.0, 100.0, 100.0]
+        report = backtest.run([0, 1, 2], closes, lows=[100.0, 90.0, 100.0], highs=[100.0, 100.0, 95.0])
+        # all the ladder fills in the same bar and the position stays open
+        assert report['n_fills'] == 3
+        assert report['n_cycles'] == 0
+        assert report['fees'] == pytest.approx(0.001 * sum(o.price.number * o.amount.number for o in m.ohc.done_orders))
+        assert report['unrealized_pnl'] > 0
+
+    def test_requote(self):
+        m = self.make_manager()
+        backtest = LadderBacktest(m, 1.0, n_orders=2, requote_rate=0.01)
+        report = backtest.run([0, 1, 2, 3], [100.0, 101.0, 102.1, 103.2])
+        assert report['n_fills'] == 0
+        assert report['n_ladders'] == 3
+
+    def test_raises(self):
+        m = self.make_manager()
+        with pytest.raises(TypeError):
+            LadderBacktest(None, 1.0)
+        with pytest.raises(ValueError):
+            LadderBacktest(m, 1.0, n_orders=0)
+        with pytest.raises(ValueError):
+            LadderBacktest(m, 1.0).run([0, 1], [1.0])
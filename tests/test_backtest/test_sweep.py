@@ -0,0 +1,41 @@
+import pytest
+import numpy as np
+from quantstools.order import Symbol, OrderManager
+from quantstools.backtest import LadderBacktest, run_parameter_sweep
+
+
+class TestRunParameterSweep:
+
+    symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+
+    def make_bars(self, n=2000):
+        rng = np.random.default_rng(1)
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+        return np.arange(n) * 60000, closes
+
+    def test_serial_and_parallel(self):
+        times, closes = self.make_bars()
+        grid = {'n_orders': [2, 5], 'take_profit_rate': [0.005, 0.01]}
+        serial = run_parameter_sweep(self.symbol, 12, 6, times, closes, grid, max_workers=1, min_amount=1.0)
+        parallel = run_parameter_sweep(
+            self.symbol, 12, 6, times, closes, grid, max_workers=2, chunk_size=3, min_amount=1.0
+        )
+        assert serial['n_orders'].tolist() == [2, 2, 5, 5]
+        assert serial['take_profit_rate'].tolist() == [0.005, 0.01, 0.005, 0.01]
+        assert set(parallel.keys()) == set(serial.keys())
+        for key in serial:
+            assert parallel[key].tolist() == serial[key].tolist()
+        report = LadderBacktest(
+            OrderManager(self.symbol, 12, 6), 1.0, n_orders=5, take_profit_rate=0.005
+        ).run(times, closes)
+        assert serial['total_pnl'][2] == pytest.approx(report['total_pnl'])
+        assert serial['n_fills'][2] == report['n_fills']
+
+    def test_raises_value_error(self):
+        times, closes = self.make_bars(10)
+        with pytest.raises(ValueError):
+            run_parameter_sweep(self.symbol, 12, 6, times, closes, {'n': [1]}, min_amount=1.0)
+        with pytest.raises(ValueError):
+            run_parameter_sweep(self.symbol, 12, 6, times, closes, {'min_amount': [1.0]}, min_amount=1.0)
+        with pytest.raises(ValueError):
+            run_parameter_sweep(self.symbol, 12, 6, times[:5], closes, {}, min_amount=1.0)
@@ -0,0 +1,107 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from pytz import timezone
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+)
+from quantstools.order.bars import aggregate_bars
+from quantstools.order.order_history import get_day_starts_in_timezone
+
+
+def test_aggregate_bars():
+    bars = aggregate_bars(
+        [0, 10, 20, 120, 130, 300],
+        [10.0, 12.0, 9.0, 20.0, 22.0, 30.0],
+        [1.0, -1.0, 2.0, 1.0, 3.0, 1.0],
+        interval_ms=100,
+        )
+    assert list(bars['mili_unixtime']) == [0, 100, 300]
+    assert list(bars['open']) == [10.0, 20.0, 30.0]
+    assert list(bars['high']) == [12.0, 22.0, 30.0]
+    assert list(bars['low']) == [9.0, 20.0, 30.0]
+    assert list(bars['close']) == [9.0, 22.0, 30.0]
+    assert list(bars['volume']) == [4.0, 4.0, 1.0]
+    assert bars['vwap'] == pytest.approx([10.0, 21.5, 30.0])
+    assert list(bars['n_fills']) == [3, 2, 1]
+
+
+def test_aggregate_bars_sorts_fills():
+    bars = aggregate_bars([20, 0, 10], [3.0, 1.0, 2.0], [1.0, 1.0, 1.0], interval_ms=100)
+    assert list(bars['open']) == [1.0]
+    assert list(bars['close']) == [3.0]
+
+
+def test_aggregate_bars_arguments():
+    with pytest.raises(ValueError):
+        aggregate_bars([0], [1.0], [1.0])
+    with pytest.raises(ValueError):
+        aggregate_bars([0], [1.0], [1.0], interval_ms=100, tz='UTC')
+    with pytest.raises(ValueError):
+        aggregate_bars([0], [1.0], [1.0], interval_ms=0)
+    assert len(aggregate_bars([], [], [], interval_ms=100)['open']) == 0
+
+
+def test_get_day_starts_in_timezone():
+    tz = timezone('America/Montreal')
+    first = int(tz.localize(datetime(2022, 3, 12, 12)).timestamp()) * 1000
+    last = int(tz.localize(datetime(2022, 3, 14, 1)).timestamp()) * 1000
+    day_starts = get_day_starts_in_timezone(first, last, 'America/Montreal')
+    assert len(day_starts) == 3
+    # the clocks move forward on 2022-03-13, so that day has 23 hours
+    assert day_starts[2] - day_starts[1] == 23 * 3600 * 1000
+    assert day_starts[0] == int(tz.localize(datetime(2022, 3, 12)).timestamp()) * 1000
+
+
+class TestOrderHistoryCollectionToBars:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+        hour = 3600 * 1000
+        rows = [
+            ('1', 'BUY', 100, 1.0, 1 * hour, False),
+            ('2', 'SELL', 110, 1.0, 2 * hour, False),
+            ('3', 'BUY', 90, 2.0, 3 * hour, True),
+            ('4', 'BUY', 95, 1.0, 26 * hour, False),
+        ]
+        for id_, side, price, amount, t, is_active in rows:
+            self.ohc.add_order_history(
+                OrderHistory(
+                    id_=id_,
+                    symbol=self.symbol,
+                    side=side,
+                    price=Price(price, self.symbol.digits, self.symbol.precision),
+                    amount=Amount(amount, self.symbol.amount_digits, self.symbol.amount_precision),
+                    mili_unixtime=t,
+                    is_active=is_active,
+                )
+            )
+
+    def test_to_bars(self):
+        bars = self.ohc.to_bars(interval_ms=24 * 3600 * 1000)
+        assert list(bars['mili_unixtime']) == [0, 24 * 3600 * 1000]
+        assert list(bars['open']) == [100, 95]
+        assert list(bars['close']) == [110, 95]
+        assert list(bars['volume']) == [2.0, 1.0]
+        assert list(self.ohc.to_bars(interval_ms=3600 * 1000, side='BUY')['open']) == [100, 95]
+
+    def test_to_bars_in_timezone(self):
+        # 1970-01-01 00:00 in Tehran is 1969-12-31 20:30 UTC
+        bars = self.ohc.to_bars(tz='Asia/Tehran')
+        assert list(bars['mili_unixtime']) == [-12600 * 1000, (24 * 3600 - 12600) * 1000]
+        assert list(bars['n_fills']) == [2, 1]
+
+    def test_to_bars_of_columnar(self, tmp_path):
+        path = str(tmp_path / 'columns')
+        self.ohc.save_columnar(path)
+        columns = OrderHistoryCollection.open_columnar(path)
+        for kwargs in [{'interval_ms': 3600 * 1000}, {'tz': 'Asia/Tehran', 'side': 'BUY'}]:
+            expected = self.ohc.to_bars(**kwargs)
+            bars = columns.to_bars(**kwargs)
+            for field in expected:
+                assert np.allclose(bars[field], expected[field])
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+    ColumnarOrderHistory,
+    RetentionPolicy,
+)
+
+
+class TestColumnarOrderHistory:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+        rows = [
+            ('1000', 'BUY', 20000, 1.0, 100000000, False, False),
+            ('2000', 'BUY', 40000, 1.0, 200000000, False, False),
+            ('3000', 'SELL', 30000.25, 0.5, 150000000, False, False),
+            ('4000', 'BUY', 10000, 2.0, 50000000, False, True),
+            ('5000', 'SELL', 50000, 1.0, 250000000, True, False),
+        ]
+        for id_, side, price, amount, t, is_active, is_cancelled in rows:
+            self.ohc.add_order_history(
+                OrderHistory(
+                    id_=id_,
+                    symbol=self.symbol,
+                    side=side,
+                    price=Price(price, 12, 4),
+                    amount=Amount(amount, 12, 6),
+                    mili_unixtime=t,
+                    is_active=is_active,
+                    is_cancelled=is_cancelled,
+                )
+            )
+
+    def test_save_and_open_columnar(self, tmp_path):
+        path = str(tmp_path / 'columns')
+        self.ohc.save_columnar(path)
+        columns = OrderHistoryCollection.open_columnar(path)
+        assert isinstance(columns, ColumnarOrderHistory)
+        assert isinstance(columns.columns['price_ticks'], np.memmap)
+        assert columns.symbol == self.symbol
+        assert len(columns) == 5
+        assert list(columns.columns['mili_unixtime']) == sorted(o.mili_unixtime for o in self.ohc.before(10 ** 12))
+        assert columns.price_precision == 4
+
+    def test_aggregates_are_same_as_collection(self, tmp_path):
+        path = str(tmp_path / 'columns')
+        self.ohc.save_columnar(path)
+        columns = OrderHistoryCollection.open_columnar(path)
+        for t in [None, 1000, 100000000, 150000000, 300000000]:
+            assert columns.get_total_value(t) == pytest.approx(self.ohc.get_total_value(t))
+            assert columns.get_total_amount(t) == pytest.approx(self.ohc.get_total_amount(t))
+            assert columns.get_avg_price(t) == pytest.approx(self.ohc.get_avg_price(t))
+        assert columns.get_total_profit(35000.0) == pytest.approx(self.ohc.get_total_profit(35000.0))
+        with pytest.raises(ValueError):
+            columns.get_total_profit()
+
+    def test_save_columnar_keeps_carried_aggregates(self, tmp_path):
+        path = str(tmp_path / 'columns')
+        totals = [self.ohc.get_total_value(), self.ohc.get_total_amount()]
+        self.ohc.apply_retention(RetentionPolicy(max_done_orders=1), None)
+        self.ohc.save_columnar(path)
+        columns = OrderHistoryCollection.open_columnar(path)
+        assert len(columns) == 3
+        assert [columns.get_total_value(), columns.get_total_amount()] == pytest.approx(totals)
+        assert columns.get_total_value(150000000) == pytest.approx(self.ohc.get_total_value(150000000))
+        with pytest.raises(ValueError):
+            columns.get_total_value(100000000)
+        ohc = columns.to_collection()
+        assert [ohc.get_total_value(), ohc.get_total_amount()] == pytest.approx(totals)
+        assert ohc.get_carried_aggregates() == self.ohc.get_carried_aggregates()
+
+    def test_rows_are_materialized_on_access(self, tmp_path):
+        path = str(tmp_path / 'columns')
+        self.ohc.save_columnar(path)
+        columns = OrderHistoryCollection.open_columnar(path)
+        order = columns[1]
+        original = self.ohc.get(order.id_)
+        assert order.id_ == '1000'
+        assert order.price == original.price
+        assert order.amount == original.amount
+        assert order.side == original.side
+        assert order.is_active == original.is_active
+        assert columns[-1].id_ == '5000'
+        with pytest.raises(IndexError):
+            columns[5]
+        assert columns[2].get_price() == '30000.2500'
+
+    def test_to_collection(self, tmp_path):
+        path = str(tmp_path / 'columns')
+        self.ohc.save_columnar(path)
+        ohc = OrderHistoryCollection.open_columnar(path).to_collection()
+        assert ohc.active_orders == self.ohc.active_orders
+        assert ohc.done_orders == self.ohc.done_orders
+        assert ohc.cancelled_orders == self.ohc.cancelled_orders
+
+    def test_empty_collection(self, tmp_path):
+        path = str(tmp_path / 'columns')
+        OrderHistoryCollection(self.symbol).save_columnar(path)
+        columns = OrderHistoryCollection.open_columnar(path)
+        assert len(columns) == 0
+        assert columns.get_total_value() == 0
+
+    def test_from_records_matches_deserialize(self):
+        serialized_data = self.ohc.serialize()
+        ohc = self.ohc.deserialize(serialized_data)
+        records = serialized_data['done_orders'] + serialized_data['cancelled_orders'] + serialized_data['active_orders']
+        columns = ColumnarOrderHistory.from_records(self.symbol, records)
+        assert list(columns.columns['mili_unixtime']) == sorted(r['mili_unixtime'] for r in records)
+        for order in columns:
+            expected = ohc.get(order.id_)
+            assert order.price.number == expected.price.number
+            assert order.amount.number == expected.amount.number
+            assert (order.side, order.is_active, order.is_cancelled) == (expected.side, expected.is_active, expected.is_cancelled)
+        assert columns.get_total_value() == pytest.approx(ohc.get_total_value())
+        with pytest.raises(ValueError):
+            ColumnarOrderHistory.from_records(Symbol('ETH-USDT', 8, 2, 12, 6), records)
+
+    def test_concatenate(self):
+        records = self.ohc.serialize()['done_orders']
+        chunks = [
+            ColumnarOrderHistory.from_records(self.symbol, records[:1]),
+            ColumnarOrderHistory.from_records(self.symbol, records[1:]),
+            ColumnarOrderHistory.from_orders(self.symbol, self.ohc.cancelled_orders),
+        ]
+        columns = ColumnarOrderHistory.concatenate(self.symbol, chunks)
+        assert columns.price_precision == 4
+        assert len(columns) == 4
+        assert list(columns.columns['mili_unixtime']) == [50000000, 100000000, 150000000, 200000000]
+        assert columns[0].price.number == 10000
+        assert columns.get_total_value() == pytest.approx(self.ohc.get_total_value(), abs=0.01)
+        assert len(ColumnarOrderHistory.concatenate(self.symbol, [])) == 0
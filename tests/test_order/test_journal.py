@@ -0,0 +1,234 @@
+import os
+import json
+import pytest
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+    OrderHistoryJournal,
+)
+
+
+def make_order_history(symbol, id_, mili_unixtime, is_active=True, price=20000):
+    return OrderHistory(
+        id_=id_,
+        symbol=symbol,
+        side='BUY',
+        price=Price(price, symbol.digits, symbol.precision),
+        amount=Amount(1.0, symbol.amount_digits, symbol.amount_precision),
+        mili_unixtime=mili_unixtime,
+        is_active=is_active,
+        is_cancelled=False,
+    )
+
+
+class TestOrderHistoryJournal:
+
+    def test_append_and_read(self, tmp_path):
+        filepath = str(tmp_path / 'journal.jsonl')
+        journal = OrderHistoryJournal(filepath)
+        assert journal.append({'op': 'clean'}) == 1
+        assert journal.append({'op': 'clean'}) == 2
+        assert [e['seq'] for e in journal.read()] == [1, 2]
+        journal.close()
+        # a new journal continues the sequence of the file
+        assert OrderHistoryJournal(filepath).seq == 2
+
+    def test_read_skips_incomplete_last_line(self, tmp_path):
+        filepath = str(tmp_path / 'journal.jsonl')
+        journal = OrderHistoryJournal(filepath)
+        journal.append({'op': 'clean'})
+        journal.close()
+        with open(filepath, 'a') as f:
+            f.write('{"op": "add", "se')
+        assert [e['seq'] for e in OrderHistoryJournal(filepath).read()] == [1]
+        assert OrderHistoryJournal(filepath).seq == 1
+
+    def test_truncate(self, tmp_path):
+        filepath = str(tmp_path / 'journal.jsonl')
+        journal = OrderHistoryJournal(filepath, compact_every=2)
+        journal.append({'op': 'clean'})
+        assert journal.needs_compaction is False
+        journal.append({'op': 'clean'})
+        assert journal.needs_compaction is True
+        journal.truncate()
+        assert list(journal.read()) == [{'op': 'checkpoint', 'seq': 2}]
+        assert journal.needs_compaction is False
+        assert journal.append({'op': 'clean'}) == 3
+
+
+class TestOrderHistoryCollectionJournal:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+
+    def test_changes_are_appended_as_lines(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        ohc = OrderHistoryCollection(self.symbol)
+        ohc.enable_journal(filepath, snapshot_filepath=str(tmp_path / 'ohc.json'))
+        ohc.add_order_history(make_order_history(self.symbol, '1', 1000))
+        ohc.add_order_history(make_order_history(self.symbol, '2', 2000))
+        ohc.update_status('1', is_active=False, is_cancelled=False)
+        ohc.update_status('2', is_active=False, is_cancelled=True)
+        ohc.clean()
+        ohc.disable_journal()
+        with open(filepath) as f:
+            entries = [json.loads(line) for line in f]
+        assert [e['op'] for e in entries] == ['add', 'add', 'status', 'status', 'clean']
+        assert entries[0]['order']['id_'] == '1'
+
+    def test_load_journal_replays_changes(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        ohc = OrderHistoryCollection(self.symbol)
+        ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        ohc.add_order_history(make_order_history(self.symbol, '1', 1000))
+        ohc.add_order_history(make_order_history(self.symbol, '2', 2000, price=30000))
+        ohc.add_order_history(make_order_history(self.symbol, '3', 3000))
+        ohc.update_status('1', is_active=False, is_cancelled=False)
+        ohc.update_status('2', is_active=False, is_cancelled=False)
+        ohc.update_status('3', is_active=False, is_cancelled=True)
+        ohc.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert {o.id_ for o in loaded.done_orders} == {'1', '2'}
+        assert {o.id_ for o in loaded.cancelled_orders} == {'3'}
+        assert loaded.get_total_value() == pytest.approx(50000)
+
+    def test_compaction(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        ohc = OrderHistoryCollection(self.symbol)
+        ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath, compact_every=3)
+        for i in range(4):
+            ohc.add_order_history(make_order_history(self.symbol, str(i), 1000 * i))
+        ohc.update_status('0', is_active=False, is_cancelled=False)
+        ohc.disable_journal()
+        with open(filepath) as f:
+            assert [json.loads(line)['op'] for line in f] == ['checkpoint', 'add', 'status']
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert len(loaded) == 4
+        assert len(loaded.active_orders) == 3
+        assert loaded.get('0').is_active is False
+
+    def test_load_journal_replays_only_entries_after_snapshot(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        ohc = OrderHistoryCollection(self.symbol)
+        journal = ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        ohc.add_order_history(make_order_history(self.symbol, '1', 1000))
+        ohc.add_order_history(make_order_history(self.symbol, '2', 2000))
+        # simulate a crash after the snapshot is renamed but before the
+        # journal is truncated
+        assert ohc.save_snapshot(snapshot_filepath) == journal.seq == 2
+        ohc.update_status('1', is_active=False, is_cancelled=True)
+        ohc.clean()
+        ohc.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert not loaded.contains('1')
+        assert loaded.contains('2')
+
+    def test_sequence_continues_after_restart(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        ohc = OrderHistoryCollection(self.symbol)
+        ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        ohc.add_order_history(make_order_history(self.symbol, '1', 1000))
+        ohc.compact_journal()
+        ohc.disable_journal()
+        restarted = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        journal = restarted.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        assert journal.seq == 1
+        restarted.add_order_history(make_order_history(self.symbol, '2', 2000))
+        restarted.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert loaded.contains('1')
+        assert loaded.contains('2')
+
+    def test_crash_while_truncating_keeps_the_journal(self, tmp_path, monkeypatch):
+        import quantstools.order.snapshot
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        ohc = OrderHistoryCollection(self.symbol)
+        ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        ohc.add_order_history(make_order_history(self.symbol, '1', 1000))
+        ohc.add_order_history(make_order_history(self.symbol, '2', 2000))
+        replace = os.replace
+
+        def replace_or_crash(src, dst):
+            # the snapshot is renamed, then the process dies before the
+            # checkpoint replaces the journal
+            if dst == filepath:
+                raise KeyboardInterrupt
+            replace(src, dst)
+
+        monkeypatch.setattr(quantstools.order.snapshot.os, 'replace', replace_or_crash)
+        with pytest.raises(KeyboardInterrupt):
+            ohc.compact_journal()
+        monkeypatch.undo()
+        ohc.disable_journal()
+        with open(filepath) as f:
+            assert [json.loads(line)['seq'] for line in f] == [1, 2]
+        assert sorted(os.listdir(str(tmp_path))) == ['ohc.json', 'ohc.jsonl']
+        restarted = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        journal = restarted.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        restarted.update_status('1', is_active=False, is_cancelled=True)
+        assert journal.seq == 3
+        restarted.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert loaded.get('1').is_cancelled is True
+        assert len(loaded) == 2
+
+    def test_sequence_continues_after_the_snapshot_of_an_emptied_journal(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        ohc = OrderHistoryCollection(self.symbol)
+        ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        ohc.add_order_history(make_order_history(self.symbol, '1', 1000))
+        ohc.add_order_history(make_order_history(self.symbol, '2', 2000))
+        ohc.save_snapshot(snapshot_filepath)
+        ohc.disable_journal()
+        # the journal file lost its entries, e.g. on a file system which
+        # does not keep the data of a crashed write
+        open(filepath, 'w').close()
+        for enable_first in [False, True]:
+            restarted = OrderHistoryCollection(self.symbol)
+            if enable_first:
+                journal = restarted.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+                restarted.load_journal(filepath, snapshot_filepath)
+            else:
+                restarted.load_journal(filepath, snapshot_filepath)
+                journal = restarted.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+            assert journal.seq == 2
+            restarted.disable_journal()
+        restarted.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        restarted.update_status('2', is_active=False, is_cancelled=False)
+        restarted.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert loaded.get('2').is_active is False
+
+
+class TestSnapshot:
+
+    def test_write_json_atomic_keeps_old_file_on_error(self, tmp_path):
+        from quantstools.order.snapshot import write_json_atomic
+        filepath = str(tmp_path / 'data.json')
+        write_json_atomic(filepath, {'a': 1})
+        with pytest.raises(TypeError):
+            write_json_atomic(filepath, {'a': object()})
+        with open(filepath) as f:
+            assert json.load(f) == {'a': 1}
+        assert os.listdir(str(tmp_path)) == ['data.json']
+
+    def test_read_snapshot_accepts_to_json_files(self, tmp_path):
+        from quantstools.order.snapshot import read_snapshot
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        ohc = OrderHistoryCollection(symbol)
+        ohc.add_order_history(make_order_history(symbol, '1', 1000))
+        filepath = str(tmp_path / 'ohc.json')
+        ohc.to_json(filepath)
+        seq, data, carried = read_snapshot(filepath)
+        assert seq == 0
+        assert data == ohc.serialize()
+        assert carried is None
@@ -0,0 +1,106 @@
+import pytest
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+    LotMatcher,
+)
+
+
+class TestLotMatcher:
+
+    fills = [
+        ('BUY', 1.0, 100.0),
+        ('BUY', 1.0, 120.0),
+        ('SELL', 1.5, 130.0),
+    ]
+
+    def add_fills(self, matcher):
+        for side, amount, price in self.fills:
+            matcher.add_fill(side, amount, price)
+        return matcher
+
+    def test_fifo(self):
+        matcher = self.add_fills(LotMatcher('FIFO'))
+        assert matcher.realized_pnl == pytest.approx(30 + 0.5 * 10)
+        assert matcher.open_lots == [(0.5, 120.0)]
+        assert matcher.position == pytest.approx(0.5)
+
+    def test_lifo(self):
+        matcher = self.add_fills(LotMatcher('LIFO'))
+        assert matcher.realized_pnl == pytest.approx(10 + 0.5 * 30)
+        assert matcher.open_lots == [(0.5, 100.0)]
+
+    def test_avg(self):
+        matcher = self.add_fills(LotMatcher('AVG'))
+        assert matcher.realized_pnl == pytest.approx(1.5 * 20)
+        assert matcher.get_avg_cost() == pytest.approx(110)
+        assert matcher.get_unrealized_pnl(130.0) == pytest.approx(0.5 * 20)
+
+    def test_flip_to_short(self):
+        matcher = LotMatcher('FIFO')
+        matcher.add_fill('BUY', 1.0, 100.0)
+        assert matcher.add_fill('SELL', 3.0, 110.0) == pytest.approx(10)
+        assert matcher.open_lots == [(-2.0, 110.0)]
+        assert matcher.add_fill('BUY', 2.0, 90.0) == pytest.approx(40)
+        assert matcher.open_lots == []
+        assert matcher.realized_pnl == pytest.approx(50)
+        assert matcher.get_avg_cost() == 0
+
+    def test_float_residuals_close_lots(self):
+        matcher = LotMatcher('FIFO')
+        matcher.add_fill('BUY', 0.3, 100.0)
+        matcher.add_fill('SELL', 0.1, 100.0)
+        matcher.add_fill('SELL', 0.2, 100.0)
+        assert matcher.open_lots == []
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            LotMatcher('HIFO')
+
+
+class TestOrderHistoryCollectionFillListeners:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+
+    def make_order(self, id_, side, price, amount, mili_unixtime, is_active=False):
+        return OrderHistory(
+            id_=id_,
+            symbol=self.symbol,
+            side=side,
+            price=Price(price, self.symbol.digits, self.symbol.precision),
+            amount=Amount(amount, self.symbol.amount_digits, self.symbol.amount_precision),
+            mili_unixtime=mili_unixtime,
+            is_active=is_active,
+        )
+
+    def test_lot_matcher_replays_and_updates_incrementally(self):
+        self.ohc.add_order_history(self.make_order('2', 'BUY', 120, 1.0, 20))
+        self.ohc.add_order_history(self.make_order('1', 'BUY', 100, 1.0, 10))
+        matcher = self.ohc.lot_matcher('FIFO')
+        assert matcher.open_lots == [(1.0, 100.0), (1.0, 120.0)]
+
+        self.ohc.add_order_history(self.make_order('3', 'SELL', 130, 1.5, 30, is_active=True))
+        assert matcher.n_fills == 2
+        self.ohc.update_status('3', False, False)
+        assert matcher.realized_pnl == pytest.approx(35)
+
+        # the same fill is not reported twice
+        self.ohc.add_order_history(self.make_order('3', 'SELL', 130, 1.5, 30))
+        self.ohc.update_status('3', False, False)
+        assert matcher.n_fills == 3
+
+    def test_batch_fills_are_reported_in_time_order(self):
+        fills = []
+        self.ohc.add_fill_listener(fills.append, replay=False)
+        other = OrderHistoryCollection(self.symbol)
+        other.add_order_history([self.make_order(str(i), 'BUY', 100, 1.0, 10 - i) for i in range(3)])
+        self.ohc.merge_inplace(other)
+        assert [o.id_ for o in fills] == ['2', '1', '0']
+        self.ohc.remove_fill_listener(fills.append)
+        self.ohc.add_order_history(self.make_order('4', 'BUY', 100, 1.0, 20))
+        assert len(fills) == 3
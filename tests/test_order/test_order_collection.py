@@ -53,6 +53,21 @@ class TestOrderCollection(unittest.TestCase):
             oc.add_order(o)
         exc_info.match(message)
 
+    def test_add_orders(self) -> None:
+        oc = OrderCollection(self.symbol)
+        orders = [
+            Order(self.symbol, side, Price(15, self.symbol.digits, self.symbol.precision), Amount(0.15, self.symbol.amount_digits, self.symbol.amount_precision), 'LIMIT')
+            for side in ['BUY', 'SELL']
+        ]
+        oc.add_orders(iter(orders))
+        assert oc.orders == orders
+        with pytest.raises(TypeError):
+            oc.add_orders([orders[0], 'order'])
+        other_symbol = Symbol('ETH-USDT', 7, 4, 4, 2)
+        with pytest.raises(ValueError):
+            oc.add_orders([Order(other_symbol, 'BUY', Price(15, 7, 4), Amount(0.15, 4, 2), 'LIMIT')])
+        assert len(oc) == 2
+
     def test_reset(self):
         oc = OrderCollection(self.symbol)
         o = Order(self.symbol, 'BUY', Price(15.0, self.symbol.digits, self.symbol.precision) , Amount(0.15, self.symbol.amount_digits, self.symbol.amount_precision), 'LIMIT')
@@ -161,6 +161,23 @@ class TestOrderHistory:
             )
         assert o.get_value() == pytest.approx(0.015*0.12)
 
+    def test_get_value_is_same_as_order_get_value(self):
+        symbol = Symbol('ETH-BTC', 5, 4, 10, 6)
+        o = OrderHistory(
+            id_='fweoino845fwef',
+            symbol=symbol,
+            side='SELL',
+            price=Price(0.1234, symbol.digits, symbol.precision),
+            amount=Amount(0.015, 5, 3),
+            mili_unixtime=1650160131557,
+            is_active=False,
+            is_cancelled=False,
+            type_='LIMIT',
+            )
+        assert o.get_value() == o.order.get_value(rounding=symbol.precision)
+        assert o.get_value() < 0
+        assert o.get_value(rounding=2) == o.order.get_value(rounding=2)
+
     def test_from_order(self):
         symbol = Symbol('ETH-BTC', 5, 4, 10, 6)
         order = Order(
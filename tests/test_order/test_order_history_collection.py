@@ -2,6 +2,7 @@ import os
 import json
 import unittest
 import pytest
+import numpy as np
 from quantstools.order import (
     Symbol,
     Price,
@@ -10,6 +11,9 @@ from quantstools.order import (
     OrderHistory,
     OrderCollection,
     OrderHistoryCollection,
+    ColumnarOrderHistory,
+    SortedIndexView,
+    RetentionPolicy,
 )
 
 
@@ -306,3 +310,481 @@ class TestCaseOrderHistoryCollection(unittest.TestCase):
         self.ohc.to_json(filepath)
         assert os.path.exists(filepath)
         os.remove(filepath)
+
+    def test_get_and_contains(self):
+        assert self.ohc.contains('1000')
+        assert not self.ohc.contains('3000')
+        assert self.ohc.get('1000').mili_unixtime == 100000000
+        assert self.ohc.get('3000') is None
+
+    def test_update_status_moves_order_between_buckets(self):
+        order = OrderHistory(
+            id_='3000',
+            symbol=self.symbol,
+            side='BUY',
+            price=Price(30000, 12, 4),
+            amount=Amount(1.0, 12, 6),
+            mili_unixtime=300000000,
+        )
+        self.ohc.add_order_history(order)
+        assert self.ohc.active_orders == set([order])
+        updated = self.ohc.update_status('3000', is_active=False, is_cancelled=False)
+        assert updated is order
+        assert order.is_active is False
+        assert self.ohc.active_orders == set()
+        assert order in self.ohc.done_orders
+        assert self.ohc.get_total_value() == pytest.approx(90000)
+        self.ohc.update_status('3000', is_active=False, is_cancelled=True)
+        assert order not in self.ohc.done_orders
+        assert self.ohc.cancelled_orders == set([order])
+        assert len(self.ohc) == 3
+        with pytest.raises(KeyError):
+            self.ohc.update_status('4000', is_active=False, is_cancelled=False)
+
+    def test_add_order_history_replaces_order_with_same_id(self):
+        order = OrderHistory(
+            id_='1000',
+            symbol=self.symbol,
+            side='BUY',
+            price=Price(20000, 12, 4),
+            amount=Amount(1.0, 12, 6),
+            mili_unixtime=100000000,
+            is_active=False,
+            is_cancelled=True,
+        )
+        self.ohc.add_order_history(order)
+        assert len(self.ohc) == 2
+        assert self.ohc.get('1000') is order
+        assert self.ohc.cancelled_orders == set([order])
+        assert len(self.ohc.done_orders) == 1
+
+    def test_clean(self):
+        self.ohc.update_status('1000', is_active=False, is_cancelled=True)
+        self.ohc.clean()
+        assert len(self.ohc) == 1
+        assert not self.ohc.contains('1000')
+
+    def test_between_before_after(self):
+        assert [o.id_ for o in self.ohc.before(100000000)] == ['1000']
+        assert [o.id_ for o in self.ohc.after(100000000)] == ['2000']
+        assert [o.id_ for o in self.ohc.between(0, 300000000)] == ['1000', '2000']
+        assert len(self.ohc.between(100000001, 199999999)) == 0
+        self.ohc.update_status('1000', is_active=False, is_cancelled=True)
+        assert [o.id_ for o in self.ohc.before(100000000)] == ['1000']
+        self.ohc.clean()
+        assert len(self.ohc.before(100000000)) == 0
+
+    def test_filter_by_mili_unixtime(self):
+        ohc = self.ohc.filter_by_mili_unixtime(mili_unixtime__lte=150000000)
+        assert [o.id_ for o in ohc.done_orders] == ['1000']
+        assert ohc.contains('1000')
+        assert not ohc.contains('2000')
+
+    def test_aggregates_after_status_changes_and_out_of_order_adds(self):
+        self.ohc.add_order_history(
+            OrderHistory(
+                id_='500',
+                symbol=self.symbol,
+                side='BUY',
+                price=Price(10000, 12, 4),
+                amount=Amount(2.0, 12, 6),
+                mili_unixtime=50000000,
+                is_active=True,
+            )
+        )
+        assert self.ohc.get_total_value() == pytest.approx(60000)
+        self.ohc.update_status('500', is_active=False, is_cancelled=False)
+        assert self.ohc.get_total_value(mili_unixtime__lte=50000000) == pytest.approx(20000)
+        assert self.ohc.get_total_value(mili_unixtime__lte=100000000) == pytest.approx(40000)
+        assert self.ohc.get_total_amount(mili_unixtime__lte=200000000) == pytest.approx(4)
+        self.ohc.update_status('1000', is_active=False, is_cancelled=True)
+        assert self.ohc.get_total_value() == pytest.approx(60000)
+        assert self.ohc.get_avg_price(mili_unixtime_lte=150000000) == pytest.approx(10000)
+
+    def test_pnl_curve(self):
+        timestamps = [1000, 100000005, 100000005, 200000005, 200000005]
+        prices = [np.nan, 20000.0, 60000.0, 30000.0, 60000.0]
+        curve = self.ohc.pnl_curve(timestamps, prices)
+        assert isinstance(curve, np.ndarray)
+        assert curve == pytest.approx([0, 0, 40000, 0, 60000])
+        for t, p, pnl in zip(timestamps[1:], prices[1:], curve[1:]):
+            assert self.ohc.get_total_profit(sell_price=p, mili_unixtime_lte=t) == pytest.approx(pnl)
+
+    def test_pnl_curve_raises_error_when_price_is_missing(self):
+        assert self.ohc.pnl_curve([1000, 2000]) == pytest.approx([0, 0])
+        with pytest.raises(ValueError):
+            self.ohc.pnl_curve([1000, 100000005])
+        with pytest.raises(ValueError):
+            self.ohc.pnl_curve([1000, 100000005], [20000.0])
+
+
+class TestOrderHistoryCollectionMerge:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+
+    def make_order(self, id_, mili_unixtime, is_active=False, is_cancelled=False, price=100):
+        return OrderHistory(
+            id_=id_,
+            symbol=self.symbol,
+            side='BUY',
+            price=Price(price, self.symbol.digits, self.symbol.precision),
+            amount=Amount(1.0, self.symbol.amount_digits, self.symbol.amount_precision),
+            mili_unixtime=mili_unixtime,
+            is_active=is_active,
+            is_cancelled=is_cancelled,
+        )
+
+    def make_collection(self, *orders):
+        ohc = OrderHistoryCollection(self.symbol)
+        for order in orders:
+            ohc.add_order_history(order)
+        return ohc
+
+    def test_merge_inplace_resolves_conflicts_by_most_advanced_status(self):
+        ohc = self.make_collection(
+            self.make_order('a', 10, is_active=True),
+            self.make_order('b', 20),
+            self.make_order('c', 30, is_cancelled=True),
+        )
+        other = self.make_collection(
+            self.make_order('a', 10),
+            self.make_order('b', 20, is_active=True),
+            self.make_order('c', 30),
+            self.make_order('d', 5, is_active=True),
+        )
+        result = ohc.merge_inplace(other)
+        assert result is ohc
+        assert {o.id_ for o in ohc.done_orders} == {'a', 'b', 'c'}
+        assert {o.id_ for o in ohc.active_orders} == {'d'}
+        assert ohc.cancelled_orders == set()
+        assert ohc.get('a') is other.get('a')
+        assert ohc.get('b') is not other.get('b')
+        assert [o.id_ for o in ohc.before(100)] == ['d', 'a', 'b', 'c']
+        assert ohc.get_total_value() == pytest.approx(300)
+
+    def test_iadd(self):
+        ohc = self.make_collection(self.make_order('a', 10))
+        first = ohc
+        ohc += self.make_collection(self.make_order('b', 20))
+        assert ohc is first
+        assert len(ohc) == 2
+
+    def test_merge_many(self):
+        collections = [
+            self.make_collection(*[self.make_order(f'{day}-{i}', 100 * i + day) for i in range(5)])
+            for day in range(4)
+        ]
+        collections.append(self.make_collection(self.make_order('0-0', 0, is_active=True)))
+        ohc = OrderHistoryCollection(self.symbol).merge_many(collections)
+        assert len(ohc) == 20
+        assert len(ohc.done_orders) == 20
+        assert ohc.before(10 ** 6).keys == sorted(ohc.before(10 ** 6).keys)
+        assert ohc.get_total_value(mili_unixtime__lte=101) == pytest.approx(600)
+
+    def test_merge_many_skips_self_and_repeated_collections(self):
+        ohc = self.make_collection(self.make_order('a', 10, is_active=True), self.make_order('b', 20))
+        other = self.make_collection(self.make_order('a', 10), self.make_order('c', 30))
+        assert ohc.merge_many([ohc, other, other, ohc]) is ohc
+        assert [o.id_ for o in ohc.before(100)] == ['a', 'b', 'c']
+        assert {o.id_ for o in ohc.done_orders} == {'a', 'b', 'c'}
+        assert ohc.get_total_value() == pytest.approx(300)
+        ohc += ohc
+        assert len(ohc) == 3
+
+    def test_add_keeps_operands_unchanged(self):
+        ohc = self.make_collection(self.make_order('a', 10, is_active=True))
+        other = self.make_collection(self.make_order('a', 10))
+        total = ohc + other
+        assert {o.id_ for o in total.done_orders} == {'a'}
+        assert {o.id_ for o in ohc.active_orders} == {'a'}
+
+    def test_load_json_merges_into_self(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.json')
+        self.make_collection(self.make_order('a', 10), self.make_order('b', 20)).to_json(filepath)
+        ohc = self.make_collection(self.make_order('a', 10, is_active=True))
+        assert ohc.load_json(filepath) is ohc
+        assert {o.id_ for o in ohc.done_orders} == {'a', 'b'}
+
+
+class TestOrderHistoryCollectionUpsert:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.n_built = 0
+
+    def to_order_history(self, row):
+        self.n_built += 1
+        return OrderHistory(
+            id_=row['id'],
+            symbol=self.symbol,
+            side='BUY',
+            price=Price(float(row['price']), self.symbol.digits, self.symbol.precision),
+            amount=Amount(1.0, self.symbol.amount_digits, self.symbol.amount_precision),
+            mili_unixtime=row['time'],
+            is_active=row['active'],
+            is_cancelled=row['cancelled'],
+        )
+
+    def rows(self, statuses):
+        return [
+            {'id': f'o{i}', 'price': '100', 'time': i, 'active': active, 'cancelled': cancelled}
+            for i, (active, cancelled) in enumerate(statuses)
+        ]
+
+    def upsert(self, ohc, rows):
+        return ohc.upsert_rows(
+            rows,
+            self.to_order_history,
+            id_key='id',
+            is_active_key='active',
+            is_cancelled_key='cancelled',
+        )
+
+    def test_upsert_rows(self):
+        ohc = OrderHistoryCollection(self.symbol)
+        changed = self.upsert(ohc, self.rows([(True, False)] * 3))
+        assert changed == {'o0', 'o1', 'o2'}
+        assert self.n_built == 3
+        assert len(ohc.active_orders) == 3
+
+        order = ohc.get('o1')
+        changed = self.upsert(ohc, self.rows([(True, False), (False, False), (False, True), (True, False)]))
+        assert changed == {'o1', 'o2', 'o3'}
+        # only the new order is built, the others are updated in place
+        assert self.n_built == 4
+        assert ohc.get('o1') is order
+        assert ohc.done_orders == {order}
+        assert {o.id_ for o in ohc.cancelled_orders} == {'o2'}
+        assert ohc.get_total_value() == pytest.approx(100)
+
+        assert self.upsert(ohc, self.rows([(True, False), (False, False), (False, True), (True, False)])) == set()
+        assert self.n_built == 4
+
+    def test_upsert_rows_journals_changes(self, tmp_path):
+        ohc = OrderHistoryCollection(self.symbol)
+        journal = ohc.enable_journal(str(tmp_path / 'ohc.jsonl'), str(tmp_path / 'ohc.json'))
+        self.upsert(ohc, self.rows([(True, False)] * 2))
+        self.upsert(ohc, self.rows([(False, False), (True, False)]))
+        assert [entry['op'] for entry in journal.read()] == ['add', 'add', 'status']
+        ohc.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(str(tmp_path / 'ohc.jsonl'), None)
+        assert {o.id_ for o in loaded.done_orders} == {'o0'}
+        assert {o.id_ for o in loaded.active_orders} == {'o1'}
+
+
+class TestOrderHistoryCollectionIteration:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+        for id_, mili_unixtime, is_active, is_cancelled in [
+            ('d1', 30, False, False),
+            ('a1', 20, True, False),
+            ('c1', 10, False, True),
+            ('d2', 5, False, False),
+        ]:
+            self.ohc.add_order_history(
+                OrderHistory(
+                    id_=id_,
+                    symbol=self.symbol,
+                    side='BUY',
+                    price=Price(100, self.symbol.digits, self.symbol.precision),
+                    amount=Amount(1.0, self.symbol.amount_digits, self.symbol.amount_precision),
+                    mili_unixtime=mili_unixtime,
+                    is_active=is_active,
+                    is_cancelled=is_cancelled,
+                )
+            )
+
+    def test_iter_excludes_cancelled_orders(self):
+        assert {o.id_ for o in self.ohc} == {'d1', 'a1', 'd2'}
+
+    def test_iter_buckets(self):
+        assert {o.id_ for o in self.ohc.iter_active()} == {'a1'}
+        assert {o.id_ for o in self.ohc.iter_done()} == {'d1', 'd2'}
+        assert {o.id_ for o in self.ohc.iter_cancelled()} == {'c1'}
+        assert sorted(o.id_ for o in self.ohc.iter_all()) == ['a1', 'c1', 'd1', 'd2']
+
+    def test_iter_by_time(self):
+        assert [o.id_ for o in self.ohc.iter_by_time()] == ['d2', 'c1', 'a1', 'd1']
+        assert [o.id_ for o in self.ohc.iter_by_time(done_only=True)] == ['d2', 'd1']
+        it = self.ohc.iter_by_time()
+        next(it)
+        self.ohc.clean()
+        with pytest.raises(RuntimeError):
+            next(it)
+
+
+class TestOrderHistoryCollectionDeserializeParallel:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+        for i in range(50):
+            self.ohc.add_order_history(
+                OrderHistory(
+                    id_=str(i),
+                    symbol=self.symbol,
+                    side='BUY' if i % 3 else 'SELL',
+                    price=Price(100 + i, self.symbol.digits, self.symbol.precision),
+                    amount=Amount(0.5, self.symbol.amount_digits, self.symbol.amount_precision),
+                    mili_unixtime=(i * 7) % 50,
+                    is_active=i % 5 == 0,
+                    is_cancelled=i % 5 == 1,
+                )
+            )
+
+    def test_deserialize_parallel(self):
+        ohc = self.ohc.deserialize_parallel(self.ohc.serialize(), max_workers=2, chunk_size=8)
+        assert isinstance(ohc, OrderHistoryCollection)
+        assert ohc.active_orders == self.ohc.active_orders
+        assert ohc.done_orders == self.ohc.done_orders
+        assert ohc.cancelled_orders == self.ohc.cancelled_orders
+        assert ohc.get_total_value() == pytest.approx(self.ohc.get_total_value())
+        assert ohc.get_total_amount(20) == pytest.approx(self.ohc.get_total_amount(20))
+
+    def test_deserialize_parallel_columnar(self):
+        columns = self.ohc.deserialize_parallel(self.ohc.serialize(), max_workers=1, chunk_size=8, columnar=True)
+        assert isinstance(columns, ColumnarOrderHistory)
+        assert len(columns) == 50
+        assert columns.get_total_value(20) == pytest.approx(self.ohc.get_total_value(20))
+
+
+class TestOrderHistoryCollectionQuery:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+        for i in range(100):
+            self.ohc.add_order_history(
+                OrderHistory(
+                    id_=str(i),
+                    symbol=self.symbol,
+                    side='BUY' if i % 2 else 'SELL',
+                    price=Price(100 + (i * 37) % 100, self.symbol.digits, self.symbol.precision),
+                    amount=Amount(1.0, self.symbol.amount_digits, self.symbol.amount_precision),
+                    mili_unixtime=1000 + i,
+                    is_active=i % 10 == 0,
+                    is_cancelled=i % 10 == 1,
+                )
+            )
+
+    def brute_force(self, side=None, statuses=None, price_between=None, time_between=None):
+        buckets = {'active': self.ohc.active_orders, 'done': self.ohc.done_orders, 'cancelled': self.ohc.cancelled_orders}
+        result = []
+        for order in self.ohc.iter_by_time():
+            if side is not None and order.side != side:
+                continue
+            if statuses is not None and not any(order in buckets[s] for s in statuses):
+                continue
+            if price_between is not None and not price_between[0] <= order.price.number <= price_between[1]:
+                continue
+            if time_between is not None and not time_between[0] <= order.mili_unixtime <= time_between[1]:
+                continue
+            result.append(order.id_)
+        return result
+
+    def test_query_matches_brute_force(self):
+        cases = [
+            ({'side': 'SELL', 'status': 'done', 'time_between': (1010, 1050), 'price_between': (150, None)},
+             {'side': 'SELL', 'statuses': ['done'], 'time_between': (1010, 1050), 'price_between': (150, 1e9)}),
+            ({'status': ['active', 'cancelled']}, {'statuses': ['active', 'cancelled']}),
+            ({'price_between': (110, 112)}, {'price_between': (110, 112)}),
+            ({'time_between': (None, 1005), 'side': 'BUY'}, {'time_between': (0, 1005), 'side': 'BUY'}),
+            ({}, {}),
+        ]
+        for kwargs, expected in cases:
+            result = self.ohc.query(**kwargs)
+            assert [o.id_ for o in result] == self.brute_force(**expected)
+
+    def test_query_plans(self):
+        assert self.ohc.explain_query(status='active') == {'index': 'status', 'n_candidates': 10}
+        assert self.ohc.explain_query(status='active', time_between=(1000, 1004)) == {'index': 'time', 'n_candidates': 5}
+        assert self.ohc.explain_query(status='done', time_between=(1000, 1019)) == {'index': 'done_time', 'n_candidates': 16}
+        assert self.ohc.explain_query(status='done', price_between=(100, 100)) == {'index': 'price', 'n_candidates': 1}
+        assert self.ohc.explain_query(side='BUY') == {'index': 'all', 'n_candidates': 100}
+
+    def test_query_returns_views_and_columns(self):
+        view = self.ohc.query(time_between=(1000, 1009))
+        assert isinstance(view, SortedIndexView)
+        assert len(view) == 10
+        columns = self.ohc.query(status='done', side='BUY', columnar=True)
+        assert isinstance(columns, ColumnarOrderHistory)
+        assert len(columns) == 40
+        assert columns.get_total_amount() == pytest.approx(40)
+
+    def test_price_index_follows_changes(self):
+        assert [o.id_ for o in self.ohc.query(price_between=(100, 100))] == ['0']
+        self.ohc.clean()
+        self.ohc.add_order_history(
+            OrderHistory(
+                id_='new',
+                symbol=self.symbol,
+                side='BUY',
+                price=Price(100, self.symbol.digits, self.symbol.precision),
+                amount=Amount(1.0, self.symbol.amount_digits, self.symbol.amount_precision),
+                mili_unixtime=1,
+            )
+        )
+        assert [o.id_ for o in self.ohc.query(price_between=(100, 100))] == ['new', '0']
+        # the built index is kept up to date
+        price_index = self.ohc._price_index
+        self.ohc.add_order_histories(
+            OrderHistory(
+                id_=id_,
+                symbol=self.symbol,
+                side='SELL',
+                price=Price(price, self.symbol.digits, self.symbol.precision),
+                amount=Amount(1.0, self.symbol.amount_digits, self.symbol.amount_precision),
+                mili_unixtime=2000,
+                is_active=False,
+            )
+            for id_, price in [('new', 150), ('other', 100)]
+        )
+        self.ohc.update_status('2', is_active=False, is_cancelled=True)
+        for price_between in [(100, 100), (150, 150), (120, 180)]:
+            assert [o.id_ for o in self.ohc.query(price_between=price_between)] == self.brute_force(
+                price_between=price_between
+            )
+        assert self.ohc._price_index is price_index
+        self.ohc.apply_retention(RetentionPolicy(max_done_orders=50), None)
+        for price_between in [(100, 100), (150, 150), (120, 180)]:
+            assert [o.id_ for o in self.ohc.query(price_between=price_between)] == self.brute_force(
+                price_between=price_between
+            )
+
+    def test_selective_query_does_not_build_the_price_index(self):
+        kwargs = {'status': 'active', 'time_between': (1000, 1004), 'price_between': (100, 200)}
+        assert self.ohc.explain_query(**kwargs) == {'index': 'time', 'n_candidates': 5}
+        assert [o.id_ for o in self.ohc.query(**kwargs)] == ['0']
+        assert self.ohc._price_index is None
+
+    def test_invalid_query(self):
+        with pytest.raises(ValueError):
+            self.ohc.query(status='filled')
+        with pytest.raises(ValueError):
+            self.ohc.query(side='buy')
+        with pytest.raises(ValueError):
+            self.ohc.query(price_between=(1, 2, 3))
+
+
+def test_add_order_histories_is_journaled(tmp_path):
+    symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+    ohc = OrderHistoryCollection(symbol)
+    journal = ohc.enable_journal(str(tmp_path / 'ohc.jsonl'), str(tmp_path / 'ohc.json'))
+    ohc.add_order_histories(
+        OrderHistory(
+            id_=str(i),
+            symbol=symbol,
+            side='BUY',
+            price=Price(100, symbol.digits, symbol.precision),
+            amount=Amount(1.0, symbol.amount_digits, symbol.amount_precision),
+            mili_unixtime=10 - i,
+            is_active=False,
+        )
+        for i in range(3)
+    )
+    assert [o.id_ for o in ohc.iter_by_time()] == ['2', '1', '0']
+    assert ohc.get_total_amount() == 3
+    assert [entry['op'] for entry in journal.read()] == ['add'] * 3
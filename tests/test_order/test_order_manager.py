@@ -77,3 +77,233 @@ class TestOrderManager:
         )
         assert len(m.ohc.done_orders) == 1
         assert len(m.ohc.active_orders) == 1
+
+    def test_get_orders_history_skips_unchanged_rows(self):
+        symbol = Symbol('VRA-USDT', 10, 8, 12, 6)
+        m = OrderManager(symbol, 12, 6)
+        row = {
+            'id_': '62618deb74b0a90001a93c12',
+            'symbol': 'VRA-USDT',
+            'price': '0.02512359',
+            'side': 'BUY',
+            'amount': '7000',
+            'mili_unixtime': 1650560401404,
+            'is_cancelled': False,
+            'is_active': True,
+        }
+        assert m.get_orders_history([row]) == {row['id_']}
+        order = m.ohc.get(row['id_'])
+        assert m.get_orders_history([row]) == set()
+        assert m.get_orders_history([dict(row, is_active=False)]) == {row['id_']}
+        assert m.ohc.get(row['id_']) is order
+        assert m.ohc.done_orders == {order}
+        with pytest.raises(ValueError):
+            m.get_orders_history([dict(row, symbol='BTC-USDT')])
+
+    def test_generate_limit_orders_ladder(self):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        m = OrderManager(symbol, 12, 6)
+        oc = m.generate_buy_limit_orders_ladder(
+            40000,
+            n_orders=3,
+            price_step_rate=0.01,
+            min_amount=1.0,
+            weight_rate=0.04,
+        )
+        assert isinstance(oc, OrderCollection)
+        assert [o.side for o in oc] == ['BUY'] * 3
+        # the same price steps as Price.decrease, rounded down to ticks
+        assert [o.price.number for o in oc] == [40000.0, 39447.73, 38903.08]
+        assert [o.amount.number for o in oc] == [1.0, 1.04, 1.0816]
+        for o in oc:
+            assert o.price.get_price() == Price(o.price.number, 12, 2).get_price()
+
+        oc = m.generate_sell_limit_orders_ladder(
+            100,
+            n_orders=4,
+            price_step_rate=0.1,
+            fee=0,
+            price_shape='linear',
+            weights=[1, 0, 1, 2],
+            budget=1000,
+        )
+        assert [o.price.number for o in oc] == [100.0, 120.0, 130.0]
+        assert [o.side for o in oc] == ['SELL'] * 3
+        assert sum(o.price.number * o.amount.number for o in oc) <= 1000
+        assert sum(o.price.number * o.amount.number for o in oc) == pytest.approx(1000, abs=0.001)
+
+    def test_generate_limit_orders_ladder_raises_value_error(self):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        m = OrderManager(symbol, 12, 6)
+        with pytest.raises(ValueError):
+            m.generate_buy_limit_orders_ladder(100, n_orders=3)
+        with pytest.raises(ValueError):
+            m.generate_buy_limit_orders_ladder(100, n_orders=3, min_amount=1, budget=100)
+        with pytest.raises(ValueError):
+            m.generate_buy_limit_orders_ladder(100, n_orders=20, price_step_rate=0.1, price_shape='linear', min_amount=1)
+        with pytest.raises(ValueError):
+            m.generate_buy_limit_orders_ladder(100, n_orders=2, weights=[1], min_amount=1)
+        with pytest.raises(AssertionError):
+            m.generate_sell_limit_orders_ladder(10 ** 11, n_orders=2, min_amount=1)
+        # the price steps are smaller than a tick
+        with pytest.raises(ValueError, match='levels 1 and 2'):
+            m.generate_buy_limit_orders_ladder(1.0, n_orders=5, price_step_rate=0.001, fee=0, min_amount=1)
+        with pytest.raises(ValueError, match='overflow'):
+            m.generate_buy_limit_orders_ladder(100000, n_orders=100000, price_step_rate=0, fee=0, min_amount=1)
+
+    def test_generate_limit_orders_ladder_with_many_levels(self):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        m = OrderManager(symbol, 12, 6)
+        oc = m.generate_sell_limit_orders_ladder(
+            100,
+            n_orders=100000,
+            price_step_rate=0,
+            fee=0.0001,
+            price_shape='linear',
+            budget=1000,
+        )
+        # the geometric weights do not overflow, and the first levels are
+        # too small for the amount precision
+        orders = list(oc)
+        assert 0 < len(orders) < 100000
+        assert orders[-1].price.number == pytest.approx(100 * (1 + 99999 * 0.0001))
+        assert orders[-1].amount.number > orders[0].amount.number
+        assert sum(o.price.number * o.amount.number for o in orders) <= 1000
+
+    def test_ingest_orders_history(self):
+        symbol = Symbol('VRA-USDT', 10, 8, 12, 6)
+        m = OrderManager(symbol, 12, 6)
+        rows = [
+            {
+                'id': str(i),
+                'symbol': 'VRA-USDT',
+                'price': '0.025123594',
+                'side': 'BUY' if i % 2 else 'SELL',
+                'size': '7000.0000001',
+                'createdAt': 1650560401404 + i,
+                'cancelExist': False,
+                'isActive': i == 0,
+                'type': 'LIMIT',
+            }
+            for i in range(3)
+        ]
+        params_mapping = {
+            'id_': 'id',
+            'symbol': 'symbol',
+            'type_': 'type',
+            'side': 'side',
+            'price': 'price',
+            'amount': 'size',
+            'is_active': 'isActive',
+            'is_cancelled': 'cancelExist',
+            'mili_unixtime': 'createdAt',
+        }
+        orders = m.ingest_orders_history(rows, params_mapping)
+        assert [o.id_ for o in orders] == ['0', '1', '2']
+        assert orders[1].price.number == Price(0.025123594, 10, 8).number
+        assert orders[1].amount.get_amount() == Amount(7000.0000001, 12, 6).get_amount()
+        assert orders[1].side == 'BUY'
+        assert len(m.ohc.active_orders) == 1
+        assert len(m.ohc.done_orders) == 2
+        assert m.ingest_orders_history([], params_mapping) == []
+        with pytest.raises(ValueError):
+            m.ingest_orders_history([dict(rows[0], symbol='BTC-USDT')], params_mapping)
+        with pytest.raises(KeyError):
+            m.ingest_orders_history([{'id': '4'}], params_mapping)
+
+    def test_ingest_orders_history_parses_like_get_orders_history(self):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        params_mapping = {
+            'id_': 'id', 'symbol': 'symbol', 'type_': 'type', 'side': 'side',
+            'price': 'price', 'amount': 'size', 'is_active': 'isActive',
+            'is_cancelled': 'cancelExist', 'mili_unixtime': 'createdAt',
+        }
+        # numbers whose decimal rounding differs between numpy.round and round
+        prices = ['2.675', '1.005', '100.125', '0.285', '41000.015', '-1.005']
+        sizes = ['0.0000005', '1.0000025', '2.675', '3', '0.1234565', '1']
+        rows = [
+            {
+                'id': str(i), 'symbol': 'BTC-USDT', 'price': price, 'side': 'BUY',
+                'size': size, 'createdAt': 1650560401404 + i, 'cancelExist': False,
+                'isActive': False, 'type': 'LIMIT',
+            }
+            for i, (price, size) in enumerate(zip(prices, sizes))
+        ]
+        per_row = OrderManager(symbol, 12, 6)
+        per_row.get_orders_history(rows, params_mapping)
+        bulk = OrderManager(symbol, 12, 6)
+        bulk.ingest_orders_history(rows, params_mapping)
+        for row in rows:
+            expected = per_row.ohc.get(row['id'])
+            order = bulk.ohc.get(row['id'])
+            assert order.price.number == expected.price.number
+            assert order.amount.number == expected.amount.number
+            assert order.serialize() == expected.serialize()
+        assert bulk.ohc.get('0').price.number == 2.67
+        assert bulk.ohc.get_total_value() == per_row.ohc.get_total_value()
+
+    def test_requote(self):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        m = OrderManager(symbol, 12, 6)
+        params_mapping = {
+            'id_': 'id', 'symbol': 'symbol', 'type_': 'type', 'side': 'side',
+            'price': 'price', 'amount': 'size', 'is_active': 'isActive',
+            'is_cancelled': 'cancelExist', 'mili_unixtime': 'createdAt',
+        }
+        live = [(100.0, 1), (99.0, 1), (98.0, 1), (97.0, 2)]
+        m.ingest_orders_history(
+            [
+                {
+                    'id': str(i), 'symbol': 'BTC-USDT', 'price': price, 'side': 'BUY',
+                    'size': amount, 'createdAt': 1650560401404 + i, 'cancelExist': False,
+                    'isActive': True, 'type': 'LIMIT',
+                }
+                for i, (price, amount) in enumerate(live)
+            ],
+            params_mapping,
+        )
+        target = OrderCollection(symbol)
+        for price, amount in [(100.01, 1), (99.5, 1), (98.0, 1), (97.0, 3)]:
+            target.add_order(m.generate_buy_limit_order(price, amount))
+
+        cancels, placements, kept = m.plan_requote(target, tick_tolerance=1)
+        assert sorted(o.id_ for o in cancels) == ['1', '3']
+        assert sorted((o.price.number, o.amount.number) for o in placements) == [(97.0, 3), (99.5, 1)]
+        assert kept == 2
+        cancels, placements, kept = m.plan_requote(target)
+        assert kept == 1
+
+        class FakeAPI:
+            def __init__(self):
+                self.sent = []
+
+            def cancel_orders_by_ids(self, ids):
+                return [id_ for id_ in ids if id_ != '3']
+
+            def send_limit_orders_list(self, orders):
+                self.sent.append(orders)
+                # the second order of a batch fails
+                return [f"new{len(self.sent)}{i}" if i < 1 else None for i in range(len(orders))]
+
+        api = FakeAPI()
+        result = m.requote(api, target, tick_tolerance=1, batch_size=1, mili_unixtime=1650560402000)
+        assert result['cancelled'] == ['1']
+        assert result['kept'] == 2
+        assert result['placed'] == {'new10', 'new20'}
+        assert len(api.sent) == 2
+        assert api.sent[0][0]['side'] == 'BUY'
+        # the placed orders are recorded as active
+        assert sorted(o.id_ for o in m.ohc.active_orders) == ['0', '2', '3', 'new10', 'new20']
+        assert m.ohc.get('new10').mili_unixtime == 1650560402000
+        assert [o.id_ for o in m.ohc.cancelled_orders] == ['1']
+        # so a second requote does not place them again
+        result = m.requote(api, target, tick_tolerance=1, batch_size=2)
+        assert result['placed'] == set()
+        assert result['kept'] == 4
+        assert len(api.sent) == 2
+        # an order which failed is not recorded
+        target.add_order(m.generate_buy_limit_order(90.0, 1))
+        target.add_order(m.generate_buy_limit_order(89.0, 1))
+        result = m.requote(api, target, tick_tolerance=1, batch_size=2)
+        assert len(result['placed']) == 1
+        assert len(m.ohc.active_orders) == 6
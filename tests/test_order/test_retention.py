@@ -0,0 +1,185 @@
+import json
+import pytest
+import numpy as np
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+    RetentionPolicy,
+)
+
+
+def make_order_history(symbol, id_, mili_unixtime, price, is_active=False, is_cancelled=False):
+    return OrderHistory(
+        id_=id_,
+        symbol=symbol,
+        side='BUY',
+        price=Price(price, symbol.digits, symbol.precision),
+        amount=Amount(1.0, symbol.amount_digits, symbol.amount_precision),
+        mili_unixtime=mili_unixtime,
+        is_active=is_active,
+        is_cancelled=is_cancelled,
+    )
+
+
+class TestRetentionPolicy:
+
+    def test_n_expired(self):
+        times = [10, 20, 30, 40]
+        assert RetentionPolicy().n_expired_done(times, 100) == 0
+        assert RetentionPolicy(max_done_orders=3).n_expired_done(times) == 1
+        assert RetentionPolicy(max_done_orders=5).n_expired_done(times) == 0
+        assert RetentionPolicy(max_age_ms=70).n_expired_done(times, 100) == 2
+        assert RetentionPolicy(max_age_ms=70).n_expired_done(times) == 0
+        assert RetentionPolicy(max_age_ms=70, max_done_orders=1).n_expired_done(times, 100) == 3
+        assert RetentionPolicy(max_cancelled_orders=0).n_expired_cancelled(times) == 4
+
+    def test_raises_error_for_invalid_limits(self):
+        with pytest.raises(ValueError):
+            RetentionPolicy(max_age_ms=-1)
+        with pytest.raises(ValueError):
+            RetentionPolicy(max_done_orders=1.5)
+        with pytest.raises(ValueError):
+            RetentionPolicy(max_archived_id_age_ms=-1)
+
+
+class TestApplyRetention:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+        for i in range(1, 6):
+            self.ohc.add_order_history(make_order_history(self.symbol, str(i), 1000 * i, 100 * i))
+        self.ohc.add_order_history(make_order_history(self.symbol, 'c1', 1500, 50, is_cancelled=True))
+        self.ohc.add_order_history(make_order_history(self.symbol, 'a1', 500, 50, is_active=True))
+
+    def test_totals_stay_exact(self, tmp_path):
+        archive_filepath = str(tmp_path / 'archive.jsonl')
+        expected = [self.ohc.get_total_value(t) for t in [3000, 4500, None]]
+        n = self.ohc.apply_retention(
+            RetentionPolicy(max_done_orders=2, max_cancelled_orders=0),
+            archive_filepath,
+            )
+        assert n == 4
+        assert len(self.ohc.done_orders) == 2
+        assert self.ohc.cancelled_orders == set()
+        assert self.ohc.contains('a1')
+        assert not self.ohc.contains('1')
+        assert [self.ohc.get_total_value(t) for t in [3000, 4500, None]] == pytest.approx(expected)
+        assert self.ohc.get_total_amount() == pytest.approx(5)
+        assert self.ohc.get_position() == pytest.approx(5)
+        assert self.ohc.get_position(3000) == pytest.approx(3)
+        assert self.ohc.get_avg_price() == pytest.approx(300)
+        assert self.ohc.get_total_profit(sell_price=400.0, mili_unixtime_lte=3000) == pytest.approx(600)
+        with pytest.raises(ValueError):
+            self.ohc.get_total_value(2999)
+        assert self.ohc.pnl_curve([3000, 5000], [400.0, 400.0]) == pytest.approx([600, 500])
+        with pytest.raises(ValueError):
+            self.ohc.pnl_curve([1000], [400.0])
+        with open(archive_filepath) as f:
+            assert sorted(json.loads(line)['id_'] for line in f) == ['1', '2', '3', 'c1']
+
+    def test_new_done_orders_after_retention(self):
+        self.ohc.apply_retention(RetentionPolicy(max_age_ms=2000), None, now_mili_unixtime=5000)
+        assert sorted(o.id_ for o in self.ohc.done_orders) == ['3', '4', '5']
+        self.ohc.add_order_history(make_order_history(self.symbol, '6', 6000, 600))
+        assert self.ohc.get_total_value() == pytest.approx(2100)
+        assert self.ohc.get_total_value(5000) == pytest.approx(1500)
+
+    def test_snapshot_and_journal_keep_carried_aggregates(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        self.ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        self.ohc.save_snapshot(snapshot_filepath)
+        self.ohc.apply_retention(RetentionPolicy(max_done_orders=3), None)
+        self.ohc.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert loaded.get_carried_aggregates() == self.ohc.get_carried_aggregates()
+        assert len(loaded) == len(self.ohc)
+        self.ohc.save_snapshot(snapshot_filepath)
+        loaded = OrderHistoryCollection(self.symbol)
+        loaded.load_snapshot(snapshot_filepath)
+        assert loaded.get_total_value() == pytest.approx(1500)
+        assert loaded.get_carried_aggregates()['horizon'] == 2000
+
+    def test_archived_orders_are_not_added_again(self, tmp_path):
+        done_orders = [make_order_history(self.symbol, str(i), 1000 * i, 100 * i) for i in range(1, 6)]
+        assert self.ohc.get_total_amount() == pytest.approx(5)
+        self.ohc.apply_retention(RetentionPolicy(max_done_orders=2, max_cancelled_orders=0), None)
+        assert self.ohc.archived_ids == {'1', '2', '3', 'c1'}
+        assert self.ohc.get_total_amount() == pytest.approx(5)
+        # re-polling, re-adding and merging the same orders does not count them twice
+        self.ohc.add_order_histories(done_orders)
+        self.ohc.add_order_history(done_orders[0])
+        rows = [{'id_': o.id_, 'is_active': False, 'is_cancelled': False} for o in done_orders]
+        changed = self.ohc.upsert_rows(rows, lambda row: done_orders[int(row['id_']) - 1])
+        assert changed == set()
+        other = OrderHistoryCollection(self.symbol)
+        other.add_order_histories(done_orders)
+        self.ohc.merge_inplace(other)
+        assert len(self.ohc.done_orders) == 2
+        assert self.ohc.get_total_amount() == pytest.approx(5)
+        # merging a collection with archived orders drops the live copies
+        merged = other + self.ohc
+        assert merged.get_total_amount() == pytest.approx(5)
+        assert sorted(o.id_ for o in merged.done_orders) == ['4', '5']
+        # the archived ids survive a snapshot
+        filepath = str(tmp_path / 'ohc.json')
+        self.ohc.save_snapshot(filepath)
+        loaded = OrderHistoryCollection(self.symbol)
+        loaded.load_snapshot(filepath)
+        loaded.add_order_histories(done_orders)
+        assert loaded.get_total_amount() == pytest.approx(5)
+        assert loaded.archived_ids == self.ohc.archived_ids
+
+    def test_journal_keeps_archived_ids(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        self.ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        self.ohc.save_snapshot(snapshot_filepath)
+        self.ohc.apply_retention(RetentionPolicy(max_done_orders=3), None)
+        self.ohc.add_order_history(make_order_history(self.symbol, '1', 1000, 100))
+        self.ohc.disable_journal()
+        loaded = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        assert loaded.archived_ids == {'1', '2'}
+        assert loaded.get_total_amount() == pytest.approx(5)
+
+    def test_archived_ids_are_forgotten_after_max_archived_id_age_ms(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.jsonl')
+        snapshot_filepath = str(tmp_path / 'ohc.json')
+        self.ohc.enable_journal(filepath, snapshot_filepath=snapshot_filepath)
+        self.ohc.save_snapshot(snapshot_filepath)
+        done_orders = [make_order_history(self.symbol, str(i), 1000 * i, 100 * i) for i in range(1, 6)]
+        self.ohc.apply_retention(
+            RetentionPolicy(max_done_orders=2, max_cancelled_orders=0, max_archived_id_age_ms=1000),
+            None,
+            )
+        # the newest archived order is '3' at 3000
+        assert self.ohc.archived_cutoff == 2000
+        assert self.ohc.archived_ids == {'2', '3'}
+        assert self.ohc.get_carried_aggregates()['archived_ids'] == {'2': 2000, '3': 3000}
+        # the forgotten ids are before the cutoff, so they are still not added again
+        self.ohc.add_order_histories(done_orders)
+        self.ohc.add_order_history(make_order_history(self.symbol, 'c1', 1500, 50, is_cancelled=True))
+        rows = [{'id_': o.id_, 'is_active': False, 'is_cancelled': False} for o in done_orders]
+        assert self.ohc.upsert_rows(rows, lambda row: done_orders[int(row['id_']) - 1]) == set()
+        assert len(self.ohc) == 3
+        assert self.ohc.get_total_amount() == pytest.approx(5)
+        # old active orders are added and may still become done
+        self.ohc.add_order_history(make_order_history(self.symbol, 'a2', 100, 50, is_active=True))
+        self.ohc.update_status('a1', is_active=False, is_cancelled=False)
+        assert self.ohc.get_total_amount() == pytest.approx(6)
+        self.ohc.disable_journal()
+        replayed = OrderHistoryCollection(self.symbol).load_journal(filepath, snapshot_filepath)
+        snapshot_filepath = str(tmp_path / 'ohc-retained.json')
+        self.ohc.save_snapshot(snapshot_filepath)
+        loaded = OrderHistoryCollection(self.symbol)
+        loaded.load_snapshot(snapshot_filepath)
+        for loaded in [replayed, loaded]:
+            assert loaded.archived_cutoff == 2000
+            assert loaded.archived_ids == {'2', '3'}
+            assert loaded.get('a1').is_active is False
+            assert loaded.contains('a2')
+            assert loaded.get_total_amount() == pytest.approx(6)
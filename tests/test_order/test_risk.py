@@ -0,0 +1,146 @@
+import pytest
+import numpy as np
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    Order,
+    OrderHistory,
+    OrderCollection,
+    OrderManager,
+    RiskLimits,
+    RetentionPolicy,
+)
+
+
+class TestRiskLimits:
+
+    def test_no_limits(self):
+        mask, reasons = RiskLimits().check_arrays(['BUY', 'SELL'], [100.0, 110.0], [1.0, 2.0])
+        assert mask.tolist() == [True, True]
+        assert reasons == [(), ()]
+
+    def test_order_notional_and_price_band(self):
+        limits = RiskLimits(max_order_notional=150, max_price_deviation=0.1, reference_price=100.0)
+        mask, reasons = limits.check_arrays(
+            ['BUY', 'BUY', 'BUY', 'SELL'],
+            [100.0, 95.0, 80.0, 120.0],
+            [1.0, 2.0, 1.0, 2.0],
+        )
+        assert mask.tolist() == [True, False, False, False]
+        assert reasons == [(), ('order_notional',), ('price_band',), ('order_notional', 'price_band')]
+        # the reference price of the call wins
+        mask, _ = limits.check_arrays(['BUY'], [80.0], [1.0], reference_price=80.0)
+        assert mask.tolist() == [True]
+        with pytest.raises(ValueError):
+            RiskLimits(max_price_deviation=0.1).check_arrays(['BUY'], [80.0], [1.0])
+
+    def test_position(self):
+        limits = RiskLimits(max_position=3)
+        sides = ['BUY', 'SELL', 'BUY', 'BUY', 'SELL']
+        amounts = [1.0, 2.0, 1.0, 1.0, 1.0]
+        mask, reasons = limits.check_arrays(sides, [1.0] * 5, amounts, position=0.5)
+        assert mask.tolist() == [True, True, True, False, True]
+        assert reasons[3] == ('position',)
+        mask, _ = limits.check_arrays(sides, [1.0] * 5, amounts, position=0.5, open_sell_amount=2.0)
+        assert mask.tolist() == [True, False, True, False, False]
+
+    def test_total_notional(self):
+        limits = RiskLimits(max_order_notional=250, max_total_notional=300)
+        mask, reasons = limits.check_arrays(
+            ['BUY'] * 4,
+            [100.0, 300.0, 100.0, 100.0],
+            [1.0, 1.0, 1.0, 1.0],
+        )
+        # the order rejected for its own notional does not count in the total
+        assert mask.tolist() == [True, False, True, True]
+        mask, reasons = limits.check_arrays(['BUY'] * 4, [100.0] * 4, [1.0] * 4)
+        assert mask.tolist() == [True, True, True, False]
+        assert reasons[3] == ('total_notional',)
+
+    def test_raises_value_error(self):
+        with pytest.raises(ValueError):
+            RiskLimits(max_position=-1)
+        with pytest.raises(ValueError):
+            RiskLimits(max_order_notional='10')
+
+
+class TestOrderManagerRiskLimits:
+
+    def test_send_limit_orders(self):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        m = OrderManager(symbol, 12, 6, risk_limits=RiskLimits(max_position=2.5, max_price_deviation=0.05))
+        m.ohc.add_order_history(OrderHistory(
+            id_='done',
+            symbol=symbol,
+            side='BUY',
+            price=Price(100.0, 12, 2),
+            amount=Amount(1.0, 12, 6),
+            mili_unixtime=1650560401404,
+            is_active=False,
+            is_cancelled=False,
+        ))
+        m.ohc.add_order_history(OrderHistory(
+            id_='active',
+            symbol=symbol,
+            side='BUY',
+            price=Price(99.0, 12, 2),
+            amount=Amount(1.0, 12, 6),
+            mili_unixtime=1650560401405,
+            is_active=True,
+            is_cancelled=False,
+        ))
+        assert m.get_exposure() == (1.0, 1.0, 0.0)
+        orders = OrderCollection(symbol)
+        for price in [98.0, 97.0, 50.0]:
+            orders.add_order(m.generate_buy_limit_order(price, 0.5))
+
+        class FakeAPI:
+            def __init__(self):
+                self.sent = []
+
+            def send_limit_orders_list(self, orders):
+                self.sent.extend(orders)
+                return [f'placed{len(self.sent) - len(orders) + i}' for i in range(len(orders))]
+
+        api = FakeAPI()
+        placed, rejected = m.send_limit_orders(api, orders, reference_price=100.0)
+        assert [o['price'] for o in api.sent] == [orders.orders[0].serialize()['price']]
+        assert placed == {'placed0'}
+        # the placed order counts in the exposure of the next checks
+        assert m.ohc.get('placed0').is_active is True
+        assert m.get_exposure() == (1.0, 1.5, 0.0)
+        assert [(o.price.number, reasons) for o, reasons in rejected] == [
+            (97.0, ('position',)),
+            (50.0, ('price_band',)),
+        ]
+        with pytest.raises(TypeError):
+            m.risk_limits = {'max_position': 1}
+        m.risk_limits = None
+        mask, _ = m.check_orders(orders)
+        assert mask.tolist() == [True, True, True]
+
+    def test_position_includes_archived_orders(self):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        m = OrderManager(symbol, 12, 6, risk_limits=RiskLimits(max_position=2.5))
+        for i, side in enumerate(['BUY', 'BUY', 'SELL', 'BUY']):
+            m.ohc.add_order_history(OrderHistory(
+                id_=str(i),
+                symbol=symbol,
+                side=side,
+                price=Price(100.0, 12, 2),
+                amount=Amount(1.0, 12, 6),
+                mili_unixtime=1650560401404 + i,
+                is_active=False,
+                is_cancelled=False,
+            ))
+        assert m.get_exposure() == (2.0, 0.0, 0.0)
+        m.ohc.apply_retention(RetentionPolicy(max_done_orders=0), None)
+        assert len(m.ohc.done_orders) == 0
+        assert m.get_exposure() == (2.0, 0.0, 0.0)
+        orders = OrderCollection(symbol)
+        for price in [98.0, 97.0]:
+            orders.add_order(m.generate_buy_limit_order(price, 1.0))
+        mask, reasons = m.check_orders(orders)
+        assert mask.tolist() == [False, False]
+        assert reasons == [('position',), ('position',)]
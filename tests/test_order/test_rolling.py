@@ -0,0 +1,80 @@
+import pytest
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+    RollingWindowAggregator,
+    RollingWindowMetrics,
+)
+
+
+class TestRollingWindowAggregator:
+
+    def test_window(self):
+        aggregator = RollingWindowAggregator(100)
+        aggregator.add(0, 1.0, 10.0)
+        aggregator.add(50, 3.0, 20.0)
+        assert aggregator.get_volume() == pytest.approx(4.0)
+        assert aggregator.get_vwap() == pytest.approx(17.5)
+        # the fill at 0 leaves the window at 100
+        assert aggregator.get_volume(100) == pytest.approx(3.0)
+        assert aggregator.get_vwap() == pytest.approx(20.0)
+        assert aggregator.get_vwap(150) == 0
+        assert len(aggregator) == 0
+
+    def test_late_fill(self):
+        aggregator = RollingWindowAggregator(100)
+        aggregator.add(100, 1.0, 10.0)
+        aggregator.add(60, 1.0, 30.0)
+        aggregator.add(0, 1.0, 50.0)
+        assert aggregator.get_vwap() == pytest.approx(20.0)
+        assert aggregator.get_volume(170) == pytest.approx(1.0)
+
+    def test_invalid_window(self):
+        with pytest.raises(ValueError):
+            RollingWindowAggregator(0)
+
+
+class TestRollingWindowMetrics:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.ohc = OrderHistoryCollection(self.symbol)
+
+    def add_order(self, id_, side, price, amount, mili_unixtime, is_active=False):
+        self.ohc.add_order_history(
+            OrderHistory(
+                id_=id_,
+                symbol=self.symbol,
+                side=side,
+                price=Price(price, self.symbol.digits, self.symbol.precision),
+                amount=Amount(amount, self.symbol.amount_digits, self.symbol.amount_precision),
+                mili_unixtime=mili_unixtime,
+                is_active=is_active,
+            )
+        )
+
+    def test_rolling_metrics_of_collection(self):
+        self.add_order('1', 'BUY', 100, 1.0, 1000)
+        self.add_order('2', 'SELL', 200, 1.0, 5000)
+        metrics = self.ohc.rolling_metrics([3000, 10000])
+        assert metrics.windows_ms == [3000, 10000]
+        assert metrics.get_volume(3000) == pytest.approx(1.0)
+        assert metrics.get_vwap(10000) == pytest.approx(150)
+
+        self.add_order('3', 'BUY', 400, 2.0, 7000, is_active=True)
+        assert metrics.get_volume(10000) == pytest.approx(2.0)
+        self.ohc.update_status('3', False, False)
+        assert metrics.get_vwap(3000) == pytest.approx((200 + 800) / 3)
+        assert metrics.get_volume(10000, now_mili_unixtime=12000) == pytest.approx(3.0)
+        assert metrics[3000].get_volume(12000) == 0
+
+    def test_side(self):
+        self.add_order('1', 'BUY', 100, 1.0, 1000)
+        self.add_order('2', 'SELL', 200, 1.0, 2000)
+        metrics = self.ohc.rolling_metrics([10000], side='SELL')
+        assert metrics.get_vwap(10000) == pytest.approx(200)
+        with pytest.raises(ValueError):
+            RollingWindowMetrics([])
@@ -0,0 +1,174 @@
+from types import SimpleNamespace
+import pytest
+from quantstools.order import (
+    SortedIndex,
+    SortedIndexView,
+    CumulativeSortedIndex,
+)
+
+
+def make_order(mili_unixtime, value=0.0):
+    return SimpleNamespace(mili_unixtime=mili_unixtime, value=value)
+
+
+class TestSortedIndex:
+
+    def setup_method(self):
+        self.orders = [make_order(t) for t in [30, 10, 20, 20, 40]]
+        self.index = SortedIndex()
+        for order in self.orders:
+            self.index.insert(order)
+
+    def test_insert_keeps_keys_sorted(self):
+        assert self.index.keys == [10, 20, 20, 30, 40]
+        assert len(self.index) == 5
+        assert [o.mili_unixtime for o in self.index] == [10, 20, 20, 30, 40]
+
+    def test_insert_keeps_insertion_order_for_equal_keys(self):
+        assert self.index.between(20, 20).to_list() == [self.orders[2], self.orders[3]]
+
+    def test_between_before_after(self):
+        assert self.index.between(15, 30).keys == [20, 20, 30]
+        assert self.index.between(50, 60).keys == []
+        assert self.index.before(20).keys == [10, 20, 20]
+        assert self.index.before(5).keys == []
+        assert self.index.after(20).keys == [30, 40]
+        assert len(self.index.before(30)) + len(self.index.after(30)) == len(self.index)
+
+    def test_remove(self):
+        self.index.remove(self.orders[3])
+        assert self.index.keys == [10, 20, 30, 40]
+        assert self.orders[2] in self.index.between(20, 20).to_list()
+        with pytest.raises(ValueError):
+            self.index.remove(make_order(20))
+
+    def test_remove_all(self):
+        self.index.remove_all([self.orders[0], self.orders[1]])
+        assert self.index.keys == [20, 20, 40]
+
+    def test_view(self):
+        view = self.index.between(20, 40)
+        assert isinstance(view, SortedIndexView)
+        assert len(view) == 4
+        assert view[0] is self.orders[2]
+        assert view[-1] is self.orders[4]
+        assert view[1:3].keys == [20, 30]
+        with pytest.raises(IndexError):
+            view[4]
+
+    def test_view_is_invalid_after_index_changes(self):
+        view = self.index.before(30)
+        self.index.insert(make_order(0))
+        with pytest.raises(RuntimeError):
+            list(view)
+
+
+class TestCumulativeSortedIndex:
+
+    def setup_method(self):
+        self.index = CumulativeSortedIndex({'value': lambda o: o.value})
+        self.orders = [make_order(t, v) for t, v in [(10, 1.0), (20, 2.0), (30, 4.0)]]
+        for order in self.orders:
+            self.index.insert(order)
+
+    def test_sum_before_when_inserted_in_order(self):
+        assert self.index.cumsums('value') == [1.0, 3.0, 7.0]
+        assert self.index.sum_before(5, 'value') == 0
+        assert self.index.sum_before(20, 'value') == pytest.approx(3.0)
+        assert self.index.sum_before(100, 'value') == pytest.approx(7.0)
+        assert self.index.total('value') == pytest.approx(7.0)
+
+    def test_sum_before_after_out_of_order_insert(self):
+        self.index.insert(make_order(15, 8.0))
+        assert self.index.sum_before(15, 'value') == pytest.approx(9.0)
+        assert self.index.sum_before(20, 'value') == pytest.approx(11.0)
+        self.index.insert(make_order(40, 16.0))
+        assert self.index.cumsums('value') == [1.0, 9.0, 11.0, 15.0, 31.0]
+
+    def test_sum_before_after_remove(self):
+        self.index.remove(self.orders[1])
+        assert self.index.sum_before(25, 'value') == pytest.approx(1.0)
+        self.index.insert(make_order(50, 8.0))
+        assert self.index.total('value') == pytest.approx(13.0)
+        self.index.remove_all(self.orders)
+        assert self.index.total('value') == pytest.approx(8.0)
+        assert self.index.sum_before(30, 'value') == 0
+
+    def test_total_of_empty_index(self):
+        assert CumulativeSortedIndex({'value': lambda o: o.value}).total('value') == 0
+
+
+class TestSortedIndexExtend:
+
+    def test_extend_in_order_appends(self):
+        index = CumulativeSortedIndex({'value': lambda o: o.value})
+        index.insert(make_order(10, 1.0))
+        index.extend([make_order(10, 2.0), make_order(20, 4.0)])
+        assert index.keys == [10, 10, 20]
+        assert index.cumsums('value') == [1.0, 3.0, 7.0]
+
+    def test_extend_out_of_order_sorts(self):
+        index = CumulativeSortedIndex({'value': lambda o: o.value})
+        first = make_order(20, 1.0)
+        index.insert(first)
+        assert index.total('value') == 1.0
+        second = make_order(20, 2.0)
+        index.extend([make_order(30, 4.0), second, make_order(5, 8.0)])
+        assert index.keys == [5, 20, 20, 30]
+        assert index.between(20, 20).to_list() == [first, second]
+        assert index.cumsums('value') == [8.0, 9.0, 11.0, 15.0]
+        assert index.sum_before(20, 'value') == pytest.approx(11.0)
+
+
+class TestCumulativeSortedIndexBlocks:
+
+    def test_random_updates_match_brute_force(self):
+        import random
+        rng = random.Random(0)
+        index = CumulativeSortedIndex({'value': lambda o: o.value})
+        index.BLOCK_SIZE = 4
+        orders = []
+        for _ in range(300):
+            if orders and rng.random() < 0.3:
+                order = orders.pop(rng.randrange(len(orders)))
+                index.remove(order)
+            else:
+                order = make_order(rng.randrange(100), float(rng.randrange(10)))
+                orders.append(order)
+                index.insert(order)
+            key = rng.randrange(110)
+            assert index.sum_before(key, 'value') == pytest.approx(
+                sum(o.value for o in orders if o.mili_unixtime <= key)
+            )
+        assert index.total('value') == pytest.approx(sum(o.value for o in orders))
+        index.extend([make_order(rng.randrange(100), 1.0) for _ in range(50)])
+        assert index.cumsums('value')[-1] == pytest.approx(index.total('value'))
+        assert len(index.cumsums('value')) == len(index)
+
+    def test_trees_match_a_full_rebuild(self):
+        import random
+        rng = random.Random(1)
+        index = CumulativeSortedIndex({'value': lambda o: o.value})
+        index.BLOCK_SIZE = 2
+        orders = []
+
+        def rebuilt(values):
+            tree = [0]
+            CumulativeSortedIndex._rebuild_tree_from(tree, 0, values)
+            return tree
+
+        for step in range(400):
+            if orders and rng.random() < 0.3:
+                index.remove(orders.pop(rng.randrange(len(orders))))
+            elif step % 50 == 49:
+                new_orders = [make_order(100 + step + i, 1.0) for i in range(7)]
+                orders.extend(new_orders)
+                index.extend(new_orders)
+            else:
+                # mostly appends, which split the last block
+                key = step if rng.random() < 0.7 else rng.randrange(step + 1)
+                order = make_order(key, float(rng.randrange(10)))
+                orders.append(order)
+                index.insert(order)
+            assert index._length_tree == rebuilt(index._block_lengths)
+            assert index._sum_trees['value'] == rebuilt([sum(b) for b in index._blocks['value']])
@@ -0,0 +1,177 @@
+import sqlite3
+import pytest
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+    SQLiteOrderHistoryCollection,
+)
+
+
+class TestSQLiteOrderHistoryCollection:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 8, 2, 12, 6)
+        self.orders = []
+        rows = [
+            ('1000', 'BUY', 20000, 1.0, 100000000, False, False),
+            ('2000', 'BUY', 40000, 1.0, 200000000, False, False),
+            ('3000', 'SELL', 30000.25, 0.5, 150000000, False, False),
+            ('4000', 'BUY', 10000, 2.0, 50000000, False, True),
+            ('5000', 'SELL', 50000, 1.0, 250000000, True, False),
+        ]
+        for id_, side, price, amount, t, is_active, is_cancelled in rows:
+            self.orders.append(
+                OrderHistory(
+                    id_=id_,
+                    symbol=self.symbol,
+                    side=side,
+                    price=Price(price, 12, 4),
+                    amount=Amount(amount, 12, 6),
+                    mili_unixtime=t,
+                    is_active=is_active,
+                    is_cancelled=is_cancelled,
+                )
+            )
+        self.ohc = OrderHistoryCollection(self.symbol)
+        self.ohc.add_order_history(self.orders)
+
+    def make_collection(self, tmp_path):
+        sohc = SQLiteOrderHistoryCollection(self.symbol, str(tmp_path / 'ohc.sqlite'), batch_size=2)
+        sohc.add_order_history(self.orders)
+        return sohc
+
+    def test_buckets_and_lookups(self, tmp_path):
+        with self.make_collection(tmp_path) as sohc:
+            assert len(sohc) == 5
+            assert sohc.active_orders == self.ohc.active_orders
+            assert sohc.done_orders == self.ohc.done_orders
+            assert sohc.cancelled_orders == self.ohc.cancelled_orders
+            assert {o.id_ for o in sohc} == {o.id_ for o in self.ohc}
+            order = sohc.get('3000')
+            assert order.price.number == 30000.25
+            assert order.side == 'SELL'
+            assert sohc.get('6000') is None
+            assert sohc.contains('1000')
+            assert [o.id_ for o in sohc.iter_by_time(done_only=True)] == ['1000', '3000', '2000']
+            assert [o.id_ for o in sohc.between(100000000, 200000000)] == ['1000', '3000', '2000']
+
+    def test_aggregates_are_same_as_collection(self, tmp_path):
+        with self.make_collection(tmp_path) as sohc:
+            for t in [None, 1000, 100000000, 150000000, 300000000]:
+                assert sohc.get_total_value(t) == pytest.approx(self.ohc.get_total_value(t))
+                assert sohc.get_total_amount(t) == pytest.approx(self.ohc.get_total_amount(t))
+                assert sohc.get_avg_price(t) == pytest.approx(self.ohc.get_avg_price(t))
+            assert sohc.get_total_profit(35000.0) == pytest.approx(self.ohc.get_total_profit(35000.0))
+            filtered = sohc.filter_by_mili_unixtime(150000000)
+            assert isinstance(filtered, OrderHistoryCollection)
+            assert {o.id_ for o in filtered.iter_all()} == {'1000', '3000', '4000'}
+
+    def test_update_status_and_clean(self, tmp_path):
+        with self.make_collection(tmp_path) as sohc:
+            order = sohc.update_status('5000', False, False)
+            assert not order.is_active and not order.is_cancelled
+            assert sohc.get_total_amount() == pytest.approx(3.5)
+            with pytest.raises(KeyError):
+                sohc.update_status('6000', False, True)
+            sohc.clean()
+            assert sohc.cancelled_orders == set()
+            assert len(sohc) == 4
+
+    def test_upsert_rows(self, tmp_path):
+        with self.make_collection(tmp_path) as sohc:
+            built = []
+
+            def to_order_history(row):
+                built.append(row['id_'])
+                return OrderHistory(
+                    id_=row['id_'],
+                    symbol=self.symbol,
+                    side='BUY',
+                    price=Price(100, 8, 2),
+                    amount=Amount(1.0, 12, 6),
+                    mili_unixtime=1,
+                    is_active=row['is_active'],
+                    is_cancelled=row['is_cancelled'],
+                )
+
+            rows = [
+                {'id_': '1000', 'is_active': False, 'is_cancelled': False},
+                {'id_': '5000', 'is_active': False, 'is_cancelled': True},
+                {'id_': '6000', 'is_active': True, 'is_cancelled': False},
+            ]
+            assert sohc.upsert_rows(rows, to_order_history) == {'5000', '6000'}
+            assert built == ['6000']
+            assert {o.id_ for o in sohc.cancelled_orders} == {'4000', '5000'}
+
+    def test_shared_file(self, tmp_path):
+        self.make_collection(tmp_path).close()
+        with SQLiteOrderHistoryCollection(self.symbol, str(tmp_path / 'ohc.sqlite')) as sohc:
+            assert len(sohc) == 5
+        with pytest.raises(ValueError):
+            SQLiteOrderHistoryCollection(Symbol('ETH-USDT', 8, 2, 12, 6), str(tmp_path / 'ohc.sqlite'))
+
+    def test_to_json_and_load_json(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.json')
+        with self.make_collection(tmp_path) as sohc:
+            sohc.to_json(filepath)
+        ohc = OrderHistoryCollection(self.symbol).load_json(filepath)
+        assert ohc.done_orders == self.ohc.done_orders
+        with SQLiteOrderHistoryCollection(self.symbol, ':memory:') as sohc:
+            sohc.load_json(filepath)
+            assert sohc.done_orders == self.ohc.done_orders
+            assert sohc.get_total_value() == pytest.approx(self.ohc.get_total_value())
+
+    def test_get_position_and_query(self, tmp_path):
+        with self.make_collection(tmp_path) as sohc:
+            for t in [None, 1000, 150000000, 300000000]:
+                assert sohc.get_position(t) == pytest.approx(self.ohc.get_position(t))
+            for kwargs in [
+                {},
+                {'side': 'BUY'},
+                {'status': 'done'},
+                {'status': ['active', 'cancelled']},
+                {'side': 'SELL', 'price_between': (30000, None)},
+                {'price_between': (15000, 35000), 'time_between': (None, 150000000)},
+                {'time_between': (150000000, 250000000), 'status': 'done'},
+            ]:
+                expected = [o.id_ for o in self.ohc.query(**kwargs)]
+                assert [o.id_ for o in sohc.query(**kwargs)] == expected
+            columns = sohc.query(status='done', columnar=True)
+            assert len(columns) == 3
+            with pytest.raises(ValueError):
+                sohc.query(status='filled')
+
+    def test_add(self, tmp_path):
+        other = OrderHistoryCollection(self.symbol)
+        other.add_order_history([
+            OrderHistory.from_order('5000', self.orders[4], 250000000, is_active=False, is_cancelled=False),
+            OrderHistory.from_order('6000', self.orders[0], 300000000, is_active=True, is_cancelled=False),
+        ])
+        with self.make_collection(tmp_path) as sohc:
+            oc = sohc + other
+            assert isinstance(oc, OrderHistoryCollection)
+            assert len(oc) == 6
+            assert oc.get('5000').is_active is False
+            with SQLiteOrderHistoryCollection(self.symbol, ':memory:') as empty:
+                assert {o.id_ for o in (empty + sohc).iter_all()} == {o.id_ for o in self.orders}
+
+    def test_deserialize_and_text(self, tmp_path):
+        with self.make_collection(tmp_path) as sohc:
+            data = sohc.serialize()
+            oc = sohc.deserialize(data)
+            assert isinstance(oc, OrderHistoryCollection)
+            assert oc.done_orders == self.ohc.done_orders
+            with SQLiteOrderHistoryCollection(self.symbol, ':memory:') as copy:
+                assert copy.deserialize(data, inplace=True) is copy
+                assert len(copy) == 5
+            filepath = str(tmp_path / 'ohc.txt')
+            sohc.to_text(filepath)
+            with open(filepath) as f:
+                text = f.read()
+            assert text == str(sohc)
+            assert text.startswith("=============== ORDER HISTORY COLLECTION")
+            assert all(o.id_ in text for o in self.orders)
+            assert "Cancelled Orders".ljust(20) + " | " + "1" in text
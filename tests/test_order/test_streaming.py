@@ -0,0 +1,129 @@
+import json
+import pytest
+from quantstools.order import (
+    Symbol,
+    Price,
+    Amount,
+    OrderHistory,
+    OrderHistoryCollection,
+)
+from quantstools.order.streaming import SerializedOrderHistoryReader
+
+
+def make_collection(symbol, n):
+    ohc = OrderHistoryCollection(symbol)
+    for i in range(n):
+        ohc.add_order_history(
+            OrderHistory(
+                id_=f'id-{i}',
+                symbol=symbol,
+                side='BUY' if i % 2 else 'SELL',
+                price=Price(100 + i, symbol.digits, symbol.precision),
+                amount=Amount(1.0 + i, symbol.amount_digits, symbol.amount_precision),
+                mili_unixtime=1000 * (n - i),
+                is_active=i % 3 == 0,
+                is_cancelled=i % 3 == 1,
+            )
+        )
+    return ohc
+
+
+class TestSerializedOrderHistoryReader:
+
+    def setup_method(self):
+        self.symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+
+    @pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 16])
+    def test_reads_same_records_as_json_load(self, tmp_path, chunk_size):
+        filepath = str(tmp_path / 'ohc.json')
+        make_collection(self.symbol, 20).to_json(filepath)
+        with open(filepath) as f:
+            expected = json.load(f)
+        records = {}
+        for category, data in SerializedOrderHistoryReader(filepath, chunk_size=chunk_size):
+            records.setdefault(category, []).append(data)
+        assert records == dict((k, v) for k, v in expected.items() if v)
+
+    def test_empty_collection(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.json')
+        OrderHistoryCollection(self.symbol).to_json(filepath)
+        assert list(SerializedOrderHistoryReader(filepath, chunk_size=3)) == []
+
+    def test_progress(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.json')
+        make_collection(self.symbol, 20).to_json(filepath)
+        calls = []
+        list(SerializedOrderHistoryReader(filepath, chunk_size=256, progress=lambda *args: calls.append(args)))
+        assert len(calls) > 1
+        assert calls[-1][0] == calls[-1][1]
+        assert [c[0] for c in calls] == sorted(c[0] for c in calls)
+
+    def test_raises_error_for_invalid_file(self, tmp_path):
+        filepath = str(tmp_path / 'ohc.json')
+        with open(filepath, 'w') as f:
+            f.write('{"done_orders": [{"id_": "1"}')
+        with pytest.raises(ValueError):
+            list(SerializedOrderHistoryReader(filepath, chunk_size=4))
+
+
+class TestLoadJsonStreaming:
+
+    def test_load_json_streaming(self, tmp_path):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        filepath = str(tmp_path / 'ohc.json')
+        ohc = make_collection(symbol, 50)
+        ohc.to_json(filepath)
+        loaded = OrderHistoryCollection(symbol).load_json_streaming(filepath, chunk_size=100, batch_size=7)
+        assert loaded.active_orders == ohc.active_orders
+        assert loaded.done_orders == ohc.done_orders
+        assert loaded.cancelled_orders == ohc.cancelled_orders
+        assert loaded.get_total_value() == pytest.approx(ohc.get_total_value())
+        assert loaded.get_total_amount(mili_unixtime__lte=25000) == pytest.approx(ohc.get_total_amount(mili_unixtime__lte=25000))
+        assert [o.id_ for o in loaded.before(10000)] == [o.id_ for o in ohc.before(10000)]
+
+    def test_load_json_streaming_when_file_does_not_exist(self, tmp_path):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        ohc = OrderHistoryCollection(symbol)
+        assert ohc.load_json_streaming(str(tmp_path / 'missing.json')) is ohc
+
+    def test_merges_like_load_json(self, tmp_path):
+        symbol = Symbol('BTC-USDT', 12, 2, 12, 6)
+        filepath = str(tmp_path / 'ohc.json')
+        journal_filepaths = [str(tmp_path / f'ohc-{i}.jsonl') for i in range(2)]
+        # the file has order 'id-0' as active and 'id-1' as cancelled
+        make_collection(symbol, 10).to_json(filepath)
+
+        def make_existing():
+            existing = make_collection(symbol, 2)
+            existing.update_status('id-0', False, False)
+            existing.update_status('id-1', True, False)
+            return existing
+
+        loaded = []
+        for journal_filepath, load in zip(
+            journal_filepaths,
+            [
+                lambda ohc: ohc.load_json(filepath),
+                lambda ohc: ohc.load_json_streaming(filepath, batch_size=3),
+            ],
+        ):
+            ohc = make_existing()
+            ohc.enable_journal(journal_filepath, snapshot_filepath=None)
+            load(ohc)
+            ohc.disable_journal()
+            loaded.append(ohc)
+        by_load_json, by_streaming = loaded
+        # the done order is not downgraded and the cancelled one replaces the active one
+        assert by_streaming.get('id-0').is_active is False
+        assert by_streaming.get('id-1').is_cancelled is True
+        assert by_streaming.get_total_amount() == pytest.approx(by_load_json.get_total_amount())
+        for get_ids in [
+            lambda ohc: sorted(o.id_ for o in ohc.active_orders),
+            lambda ohc: sorted(o.id_ for o in ohc.done_orders),
+            lambda ohc: sorted(o.id_ for o in ohc.cancelled_orders),
+        ]:
+            assert get_ids(by_streaming) == get_ids(by_load_json)
+        for journal_filepath in journal_filepaths:
+            replayed = make_existing().replay_journal(journal_filepath)
+            assert replayed.get_total_amount() == pytest.approx(by_load_json.get_total_amount())
+            assert len(replayed) == len(by_load_json)